@@ -0,0 +1,114 @@
+"""
+This script writes a copy of a demo dataset with the rgb observations stored as
+one encoded image per frame (see scripts/create_dataset.py --image-encoding),
+then compares the disk size and the training data loading throughput
+(samples/sec) of the raw and the encoded layouts.
+"""
+import argparse
+import os
+import time
+
+import h5py
+import torch
+from torch.utils.data import DataLoader, RandomSampler
+
+from libero.libero.utils.dataset_utils import (
+    IMAGE_ENCODINGS,
+    create_encoded_frames_dataset,
+)
+from libero.lifelong.datasets import SequenceVLDataset, collate_batch, get_dataset
+
+OBS_MODALITY = {
+    "rgb": ["agentview_rgb", "eye_in_hand_rgb"],
+    "depth": [],
+    "low_dim": ["gripper_states", "joint_states"],
+}
+
+
+def copy_group(src_grp, dst_grp, encoding, quality):
+    for key, value in src_grp.attrs.items():
+        dst_grp.attrs[key] = value
+    for name, item in src_grp.items():
+        if isinstance(item, h5py.Group):
+            copy_group(item, dst_grp.create_group(name), encoding, quality)
+        elif name.endswith("_rgb") and item.ndim == 4:
+            create_encoded_frames_dataset(dst_grp, name, item[()], encoding, quality)
+        else:
+            src_grp.copy(item, dst_grp, name=name)
+
+
+def measure_throughput(dataset_path, args):
+    dataset, _ = get_dataset(
+        dataset_path=dataset_path,
+        obs_modality=OBS_MODALITY,
+        seq_len=args.seq_len,
+        decoded_cache_size=args.cache_size,
+    )
+    dataset = SequenceVLDataset(dataset, torch.zeros(768))
+    dataloader = DataLoader(
+        dataset,
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+        sampler=RandomSampler(dataset),
+        collate_fn=collate_batch,
+        persistent_workers=args.num_workers > 0,
+    )
+    data_iter = iter(dataloader)
+    # the first batch includes the worker startup
+    next(data_iter)
+    num_samples = 0
+    start_time = time.time()
+    for _ in range(args.num_batches):
+        try:
+            data = next(data_iter)
+        except StopIteration:
+            data_iter = iter(dataloader)
+            data = next(data_iter)
+        num_samples += len(data["actions"])
+    return num_samples / (time.time() - start_time), dataset
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", type=str, required=True)
+    parser.add_argument(
+        "--encoding", type=str, default="jpeg", choices=list(IMAGE_ENCODINGS.keys())
+    )
+    parser.add_argument("--quality", type=int, default=95)
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--seq-len", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--num-workers", type=int, default=4)
+    parser.add_argument("--num-batches", type=int, default=100)
+    parser.add_argument("--cache-size", type=int, default=512)
+    args = parser.parse_args()
+
+    output = args.output or args.dataset.replace(".hdf5", f"_{args.encoding}.hdf5")
+    if not os.path.exists(output):
+        print(f"[info] writing the {args.encoding} version of the dataset to {output}")
+        with h5py.File(args.dataset, "r") as src_f, h5py.File(output, "w") as dst_f:
+            copy_group(src_f, dst_f, args.encoding, args.quality)
+
+    results = {}
+    for name, path in [("raw", args.dataset), (args.encoding, output)]:
+        samples_per_sec, dataset = measure_throughput(path, args)
+        results[name] = dataset
+        print(
+            f"[info] {name:>5}: {os.path.getsize(path) / 1e6:9.1f} MB | "
+            + f"{samples_per_sec:8.1f} samples/sec"
+        )
+
+    # the decoded images are the same up to the compression error
+    indices = list(range(0, len(results["raw"]), max(1, len(results["raw"]) // 64)))
+    raw_batch = results["raw"].__getitems__(indices)
+    encoded_batch = results[args.encoding].__getitems__(indices)
+    for key in OBS_MODALITY["rgb"]:
+        error = (raw_batch["obs"][key] - encoded_batch["obs"][key]).abs() * 255
+        print(
+            f"[info] {key}: mean pixel error {error.mean().item():.2f}, "
+            + f"max {error.max().item():.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+This script measures the scaling of distributed data-parallel training: it runs
+the Multitask training step (forward, backward, gradient all-reduce and
+optimizer step) of the policy of a run with 1, 2, 4, ... processes and reports
+the throughput and the scaling efficiency relative to a single process. Each
+process uses the same per-process batch size, as in main.py.
+
+    python benchmark_scripts/benchmark_ddp_scaling.py --config experiments/.../run_001
+"""
+import argparse
+import json
+import os
+import socket
+import tempfile
+import time
+
+import robomimic.utils.obs_utils as ObsUtils
+import torch
+import torch.multiprocessing as mp
+from easydict import EasyDict
+
+from libero.lifelong.algos import get_algo_class
+from libero.lifelong.distributed import (
+    all_reduce_mean,
+    cleanup_distributed,
+    init_distributed,
+    is_main_process,
+)
+from libero.lifelong.model_cost import make_dummy_batch
+
+
+def get_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def worker(rank, world_size, port, cfg, args, result_queue):
+    os.environ.update(
+        {
+            "MASTER_ADDR": "127.0.0.1",
+            "MASTER_PORT": str(port),
+            "RANK": str(rank),
+            "LOCAL_RANK": str(rank),
+            "WORLD_SIZE": str(world_size),
+        }
+    )
+    torch.set_num_threads(args.threads)
+    torch.manual_seed(cfg.seed + rank)
+    init_distributed(cfg)
+    ObsUtils.initialize_obs_utils_with_obs_specs({"obs": cfg.data.obs.modality})
+
+    algo = get_algo_class("Multitask")(1, cfg).to(cfg.device)
+    algo.start_task(-1)
+    algo.train()
+    data = make_dummy_batch(cfg, args.batch_size, cfg.data.seq_len)
+
+    for _ in range(args.n_warmup):
+        algo.observe(data)
+    t0 = time.time()
+    for _ in range(args.n_iters):
+        algo.observe(data)
+    step_time = all_reduce_mean((time.time() - t0) / args.n_iters)
+    if is_main_process():
+        result_queue.put(step_time)
+    cleanup_distributed()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--config",
+        type=str,
+        required=True,
+        help="config.json of a run, or the run folder",
+    )
+    parser.add_argument("--world-sizes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--n-iters", type=int, default=20)
+    parser.add_argument("--n-warmup", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=1, help="per process")
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--backend", type=str, default=None)
+    args = parser.parse_args()
+
+    config_path = args.config
+    if os.path.isdir(config_path):
+        config_path = os.path.join(config_path, "config.json")
+    with open(config_path, "r") as f:
+        cfg = EasyDict(json.load(f))
+    cfg.device = args.device
+    cfg.train.distributed = {
+        "backend": args.backend or ("nccl" if args.device.startswith("cuda") else "gloo")
+    }
+    # checkpoints and snapshots are not written, but the algorithm needs a folder
+    cfg.experiment_dir = tempfile.mkdtemp()
+    args.batch_size = args.batch_size or cfg.train.batch_size
+
+    ctx = mp.get_context("spawn")
+    result_queue = ctx.Queue()
+    base_throughput = None
+    for world_size in args.world_sizes:
+        mp.start_processes(
+            worker,
+            args=(world_size, get_free_port(), cfg, args, result_queue),
+            nprocs=world_size,
+            start_method="spawn",
+        )
+        step_time = result_queue.get()
+        throughput = world_size * args.batch_size / step_time
+        if base_throughput is None:
+            base_throughput = throughput / world_size
+        efficiency = throughput / (base_throughput * world_size)
+        print(
+            f"[info] {world_size} processes: {step_time * 1000:8.1f} ms/step | "
+            + f"{throughput:8.1f} samples/sec | scaling efficiency {efficiency:5.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
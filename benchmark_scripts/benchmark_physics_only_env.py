@@ -0,0 +1,73 @@
+"""
+This script checks that the physics-only environment produces the same state
+trajectories as the rendering environment, and reports the steps per second of both.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from libero.libero import benchmark, get_libero_path
+from libero.libero.envs import OffScreenRenderEnv, PhysicsOnlyEnv
+
+
+def rollout(env, init_state, actions):
+    env.reset()
+    env.set_init_state(init_state)
+    states = []
+    start_time = time.time()
+    for action in actions:
+        env.step(action)
+        states.append(env.get_sim_state())
+    elapsed_time = time.time() - start_time
+    return np.array(states), len(actions) / elapsed_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--benchmark_name", type=str, default="libero_10")
+    parser.add_argument("--task_id", type=int, default=0)
+    parser.add_argument("--num_steps", type=int, default=200)
+    parser.add_argument("--camera_size", type=int, default=128)
+    parser.add_argument("--atol", type=float, default=1e-8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    benchmark_instance = benchmark.get_benchmark_dict()[args.benchmark_name]()
+    task = benchmark_instance.get_task(args.task_id)
+    init_states = benchmark_instance.get_task_init_states(args.task_id)
+    env_args = {
+        "bddl_file_name": os.path.join(
+            get_libero_path("bddl_files"), task.problem_folder, task.bddl_file
+        ),
+        "camera_heights": args.camera_size,
+        "camera_widths": args.camera_size,
+    }
+
+    rng = np.random.RandomState(args.seed)
+    actions = rng.uniform(-1.0, 1.0, size=(args.num_steps, 7))
+
+    results = {}
+    for env_class in [OffScreenRenderEnv, PhysicsOnlyEnv]:
+        env = env_class(**env_args)
+        env.seed(args.seed)
+        results[env_class.__name__] = rollout(env, init_states[0], actions)
+        env.close()
+
+    render_states, render_fps = results["OffScreenRenderEnv"]
+    physics_states, physics_fps = results["PhysicsOnlyEnv"]
+    max_diff = np.max(np.abs(render_states - physics_states))
+    print(f"[info] task: {task.language}")
+    print(f"[info] OffScreenRenderEnv: {render_fps:.1f} steps/sec")
+    print(f"[info] PhysicsOnlyEnv:     {physics_fps:.1f} steps/sec")
+    print(f"[info] speedup: {physics_fps / render_fps:.2f}x")
+    print(f"[info] max state difference over {args.num_steps} steps: {max_diff:.3e}")
+    if max_diff > args.atol:
+        print("[error] state trajectories of the two environments do not match!")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
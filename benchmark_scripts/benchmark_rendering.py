@@ -0,0 +1,100 @@
+"""
+This script compares per-camera rendering (what the robosuite camera observables
+do) with the batched multi-camera renderer, for the policy tier and the video tier.
+It reports frames per second and frames per cpu-second, i.e. per core.
+
+Run it with a software or headless backend, e.g.
+    MUJOCO_GL=osmesa PYOPENGL_PLATFORM=osmesa python benchmark_scripts/benchmark_rendering.py
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from libero.libero import benchmark, get_libero_path
+from libero.libero.envs import OffScreenRenderEnv
+from libero.libero.envs.rendering import MultiCameraRenderer
+
+
+def time_render(render_fn, num_frames, frames_per_call):
+    render_fn()
+    start_time = time.time()
+    start_cpu_time = time.process_time()
+    for _ in range(num_frames):
+        render_fn()
+    elapsed_time = time.time() - start_time
+    elapsed_cpu_time = time.process_time() - start_cpu_time
+    total_frames = num_frames * frames_per_call
+    return total_frames / elapsed_time, total_frames / elapsed_cpu_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--benchmark_name", type=str, default="libero_10")
+    parser.add_argument("--task_id", type=int, default=0)
+    parser.add_argument("--num_frames", type=int, default=200)
+    parser.add_argument(
+        "--camera_names", type=str, nargs="+", default=["agentview", "robot0_eye_in_hand"]
+    )
+    parser.add_argument("--camera_size", type=int, default=128)
+    parser.add_argument("--video_size", type=int, default=512)
+    args = parser.parse_args()
+
+    benchmark_instance = benchmark.get_benchmark_dict()[args.benchmark_name]()
+    task = benchmark_instance.get_task(args.task_id)
+    init_states = benchmark_instance.get_task_init_states(args.task_id)
+    env = OffScreenRenderEnv(
+        bddl_file_name=os.path.join(
+            get_libero_path("bddl_files"), task.problem_folder, task.bddl_file
+        ),
+        use_camera_obs=False,
+    )
+    env.reset()
+    env.set_init_state(init_states[0])
+    sim = env.sim
+
+    tiers = {
+        "policy": (args.camera_names, args.camera_size),
+        "video": (args.camera_names[:1], args.video_size),
+    }
+    print(f"[info] MUJOCO_GL={os.environ.get('MUJOCO_GL', 'default')}")
+    print(f"[info] task: {task.language}")
+    for tier, (camera_names, size) in tiers.items():
+        renderer = MultiCameraRenderer(camera_names, size, size)
+        # Both renderers follow the robosuite image convention
+        batched_images = renderer.render(sim)
+        max_diff = max(
+            [
+                np.abs(
+                    batched_images[camera_name].astype(np.int32)
+                    - sim.render(camera_name=camera_name, height=size, width=size)
+                ).max()
+                for camera_name in camera_names
+            ]
+        )
+
+        def render_per_camera():
+            for camera_name in camera_names:
+                sim.render(camera_name=camera_name, height=size, width=size)
+
+        per_camera_fps, per_camera_cpu_fps = time_render(
+            render_per_camera, args.num_frames, len(camera_names)
+        )
+        batched_fps, batched_cpu_fps = time_render(
+            lambda: renderer.render(sim, copy=False), args.num_frames, len(camera_names)
+        )
+        print(f"[info] {tier} tier: {len(camera_names)} camera(s) at {size}x{size}")
+        print(
+            f"[info]   per-camera: {per_camera_fps:.1f} frames/sec, {per_camera_cpu_fps:.1f} frames/cpu-sec"
+        )
+        print(
+            f"[info]   batched:    {batched_fps:.1f} frames/sec, {batched_cpu_fps:.1f} frames/cpu-sec"
+        )
+        print(f"[info]   speedup per core: {batched_cpu_fps / per_camera_cpu_fps:.2f}x")
+        print(f"[info]   max pixel difference: {max_diff}")
+    env.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+This script reports where environment construction and the first reset spend
+their time (bddl parsing, object xml loading, arena merge, MuJoCo compile,
+observables, renderer creation, placement sampling), for every task of the
+selected suites. The spans of all vector env workers are aggregated per task.
+"""
+import argparse
+import json
+import os
+
+from libero.libero import benchmark, get_libero_path
+from libero.libero.envs import OffScreenRenderEnv, SubprocVectorEnv
+from libero.libero.utils.profiling_utils import aggregate_spans
+
+SPAN_NAMES = [
+    "construct",
+    "bddl_parse",
+    "load_model",
+    "load_object_xmls",
+    "arena_merge",
+    "mujoco_compile",
+    "setup_observables",
+    "create_renderer",
+    "first_reset",
+    "placement_sampling",
+]
+
+
+def profile_task(task, num_envs, camera_size):
+    env_args = {
+        "bddl_file_name": os.path.join(
+            get_libero_path("bddl_files"), task.problem_folder, task.bddl_file
+        ),
+        "camera_heights": camera_size,
+        "camera_widths": camera_size,
+    }
+    if num_envs == 1:
+        env = OffScreenRenderEnv(**env_args)
+        env.reset()
+        spans_per_env = [env.profile_spans]
+    else:
+        env = SubprocVectorEnv(
+            [lambda: OffScreenRenderEnv(**env_args) for _ in range(num_envs)]
+        )
+        env.reset()
+        spans_per_env = env.get_env_attr("profile_spans")
+    env.close()
+    return aggregate_spans(spans_per_env)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--suites",
+        type=str,
+        nargs="+",
+        default=["libero_spatial", "libero_object", "libero_goal", "libero_10", "libero_90"],
+    )
+    parser.add_argument("--max-tasks", type=int, default=None)
+    parser.add_argument("--num-envs", type=int, default=1)
+    parser.add_argument("--camera-size", type=int, default=128)
+    parser.add_argument("--output", type=str, default="env_startup_report.json")
+    args = parser.parse_args()
+
+    benchmark_dict = benchmark.get_benchmark_dict()
+    report = {}
+    for suite_name in args.suites:
+        benchmark_instance = benchmark_dict[suite_name]()
+        num_tasks = benchmark_instance.get_num_tasks()
+        if args.max_tasks is not None:
+            num_tasks = min(num_tasks, args.max_tasks)
+        report[suite_name] = {}
+        print(f"[info] {suite_name}: mean seconds per env over {args.num_envs} env(s)")
+        print(" | ".join(["task"] + SPAN_NAMES))
+        for task_id in range(num_tasks):
+            task = benchmark_instance.get_task(task_id)
+            try:
+                summary = profile_task(task, args.num_envs, args.camera_size)
+            except Exception as e:
+                print(f"[warning] failed to profile {task.name}: {e}")
+                continue
+            report[suite_name][task.name] = summary
+            row = [task.name] + [
+                f"{summary[name]['mean']:.3f}" if name in summary else "-"
+                for name in SPAN_NAMES
+            ]
+            if summary.get("first_reset", {}).get("retries", 0) > 0:
+                row.append(f"({summary['first_reset']['retries']} placement retries)")
+            print(" | ".join(row))
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[info] saved the startup report to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+This script measures the import time of LIBERO modules with ``python -X importtime``.
+It is used to keep ``from libero.libero import benchmark`` cheap for data loader
+workers and command-line tools.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+
+DEFAULT_MODULES = [
+    "libero.libero",
+    "libero.libero.benchmark",
+    "libero.libero.envs",
+]
+
+
+def profile_import(module_name):
+    """Import a module in a fresh interpreter and return (total_us, [(cumulative_us, name)])."""
+    repo_root = os.path.join(os.path.dirname(os.path.realpath(__file__)), "../")
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [repo_root] + [p for p in [env.get("PYTHONPATH")] if p]
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to import {module_name}:\n{result.stderr}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        # Format: "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        entries.append((int(cumulative), name.strip()))
+    total = max([cumulative for cumulative, _ in entries], default=0)
+    return total, entries
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", type=str, nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for module_name in args.modules:
+        runs = [profile_import(module_name) for _ in range(args.repeat)]
+        best_total, entries = min(runs, key=lambda x: x[0])
+        print(f"{module_name}: {best_total / 1000.0:.1f} ms (best of {args.repeat})")
+        for cumulative, name in sorted(entries, reverse=True)[: args.top_k]:
+            print(f"\t{cumulative / 1000.0:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+This script profiles the cost of the policy of a training run: GFLOPs and
+parameters, and the per-module CPU latency and memory for the training batch
+shapes and for the get_action shapes of the evaluation. The results are cached
+in model_cost_cache under the libero config path, ~/.libero unless
+LIBERO_CONFIG_PATH is set (see libero/lifelong/model_cost.py), and main.py
+reports the cost of cached models when it starts.
+
+    python benchmark_scripts/profile_model_cost.py --config experiments/.../run_001
+"""
+import argparse
+import json
+import os
+
+import robomimic.utils.obs_utils as ObsUtils
+from easydict import EasyDict
+
+from libero.lifelong.model_cost import get_default_batch_sizes, get_model_cost
+
+
+def print_modules(title, total_ms, modules, top_k):
+    print(f"[info] {title}: {total_ms:.2f} ms")
+    print(
+        f"\t{'module':<40} {'type':<28} {'calls':>6} {'ms':>9} "
+        + f"{'params MB':>10} {'act. MB':>9}"
+    )
+    for entry in sorted(modules, key=lambda x: x["latency_ms"], reverse=True)[:top_k]:
+        print(
+            f"\t{entry['name']:<40} {entry['type']:<28} {entry['calls']:6.1f} "
+            + f"{entry['latency_ms']:9.3f} {entry['params_mb']:10.2f} "
+            + f"{entry['activations_mb']:9.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--config",
+        type=str,
+        required=True,
+        help="config.json of a run, or the run folder",
+    )
+    parser.add_argument("--train-batch-size", type=int, default=None)
+    parser.add_argument("--inference-batch-size", type=int, default=None)
+    parser.add_argument("--n-iters", type=int, default=10)
+    parser.add_argument("--max-depth", type=int, default=2)
+    parser.add_argument("--top-k", type=int, default=15)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    config_path = args.config
+    if os.path.isdir(config_path):
+        config_path = os.path.join(config_path, "config.json")
+    with open(config_path, "r") as f:
+        cfg = EasyDict(json.load(f))
+    ObsUtils.initialize_obs_utils_with_obs_specs({"obs": cfg.data.obs.modality})
+
+    train_batch_size, inference_batch_size = get_default_batch_sizes(cfg)
+    cost = get_model_cost(
+        cfg,
+        train_batch_size=args.train_batch_size or train_batch_size,
+        inference_batch_size=args.inference_batch_size or inference_batch_size,
+        use_cache=not args.no_cache,
+        n_iters=args.n_iters,
+        max_depth=args.max_depth,
+    )
+
+    print(
+        f"[info] {cost['policy_type']} has {cost['gflops']:.1f} GFLOPs "
+        + f"and {cost['mparams']:.1f} MParams"
+    )
+    train = cost["train"]
+    print(
+        f"[info] training step (forward + backward, batch size {train['batch_size']}): "
+        + f"{train['train_step_ms']:.2f} ms"
+    )
+    print_modules(
+        f"training forward (batch size {train['batch_size']})",
+        train["forward_ms"],
+        train["modules"],
+        args.top_k,
+    )
+    inference = cost["inference"]
+    print_modules(
+        f"get_action (batch size {inference['batch_size']})",
+        inference["get_action_ms"],
+        inference["modules"],
+        args.top_k,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 import os
+import time
+
 import yaml
 
 # This is a default path for localizing all the benchmark related files
@@ -35,21 +37,76 @@ def get_default_path_dict(custom_location=None):
     }
 
 
-def get_libero_path(query_key):
-    with open(config_file, "r") as f:
-        config = dict(yaml.load(f.read(), Loader=yaml.FullLoader))
-
-    # Give warnings in case the user needs to access the paths
+# Process-level cache of the parsed config file. The file is only re-read when
+# its modification time changes, and the modification time is checked at most
+# once every _PATH_CONFIG_CHECK_INTERVAL seconds, so repeated lookups do not
+# touch the file system.
+_PATH_CONFIG_CHECK_INTERVAL = 1.0
+_path_config_cache = {"mtime": None, "config": None, "checked": None}
+_warned_missing_paths = set()
+
+
+def _env_override_key(key):
+    """Environment variable that overrides a config key, e.g. LIBERO_BDDL_FILES."""
+    return f"LIBERO_{key.upper()}"
+
+
+def _warn_missing_paths(config):
+    # Give warnings in case the user needs to access the paths, only once per path
+    for key, value in config.items():
+        if (key, value) in _warned_missing_paths:
+            continue
+        _warned_missing_paths.add((key, value))
+        if not os.path.exists(value):
+            print(f"[Warning]: {key} path {value} does not exist!")
+
+
+def get_libero_path_config(reload=False):
+    """Return the path config dict, loading ``config_file`` only when it changed.
+
+    Edits of ``config_file`` are picked up within _PATH_CONFIG_CHECK_INTERVAL
+    seconds, pass reload=True to pick them up immediately.
+
+    Values can be overridden per key with ``LIBERO_<KEY>`` environment variables
+    (e.g. ``LIBERO_DATASETS=/data/libero``).
+    """
+    now = time.monotonic()
+    checked = _path_config_cache["checked"]
+    if (
+        reload
+        or checked is None
+        or now - checked >= _PATH_CONFIG_CHECK_INTERVAL
+    ):
+        mtime = os.stat(config_file).st_mtime_ns
+        if reload or _path_config_cache["mtime"] != mtime:
+            with open(config_file, "r") as f:
+                config = dict(yaml.load(f.read(), Loader=yaml.FullLoader))
+            _path_config_cache["mtime"] = mtime
+            _path_config_cache["config"] = config
+        _path_config_cache["checked"] = now
+    config = dict(_path_config_cache["config"])
     for key in config:
-        if not os.path.exists(config[key]):
-            print(f"[Warning]: {key} path {config[key]} does not exist!")
+        override = os.environ.get(_env_override_key(key))
+        if override is not None:
+            config[key] = override
+    _warn_missing_paths(config)
+    return config
+
 
+def get_libero_path(query_key):
+    config = get_libero_path_config()
     assert (
         query_key in config
     ), f"Key {query_key} not found in config file {config_file}. You need to modify it. Available keys are: {config.keys()}"
     return config[query_key]
 
 
+def get_libero_paths(query_key, relative_paths):
+    """Resolve many paths relative to the same config key with a single lookup."""
+    root = get_libero_path(query_key)
+    return [os.path.join(root, relative_path) for relative_path in relative_paths]
+
+
 def set_libero_default_path(custom_location=os.path.dirname(os.path.abspath(__file__))):
     print(
         f"[Warning] You are changing the default path for Libero config. This will affect all the paths in the config file."
@@ -57,6 +114,8 @@ def set_libero_default_path(custom_location=os.path.dirname(os.path.abspath(__fi
     new_config = get_default_path_dict(custom_location)
     with open(config_file, "w") as f:
         yaml.dump(new_config, f)
+    _path_config_cache["mtime"] = None
+    _path_config_cache["checked"] = None
 
 
 if not os.path.exists(libero_config_path):
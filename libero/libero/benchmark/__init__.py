@@ -1,11 +1,8 @@
 import abc
 import os
-import glob
-import random
-import torch
 
-from typing import List, NamedTuple, Type
-from libero.libero import get_libero_path
+from typing import NamedTuple
+from libero.libero import get_libero_path, get_libero_paths
 from libero.libero.benchmark.libero_suite_task_map import libero_task_map
 
 BENCHMARK_MAPPING = {}
@@ -68,14 +65,11 @@ libero_suites = [
 ]
 
 
-task_maps = {}
-max_len = 0
-for libero_suite in libero_suites:
-    task_maps[libero_suite] = {}
-
+def _make_task_map(libero_suite):
+    task_map = {}
     for task in libero_task_map[libero_suite]:
         language = grab_language_from_filename(task + ".bddl")
-        task_maps[libero_suite][task] = Task(
+        task_map[task] = Task(
             name=task,
             language=language,
             problem="Libero",
@@ -83,9 +77,22 @@ for libero_suite in libero_suites:
             bddl_file=f"{task}.bddl",
             init_states_file=f"{task}.pruned_init",
         )
+    return task_map
+
+
+class _LazyTaskMaps(dict):
+    """Builds the task map of a suite the first time it is accessed."""
 
-        # print(language, "\n", f"{task}.bddl", "\n")
-        # print("")
+    def __missing__(self, libero_suite):
+        if libero_suite not in libero_suites:
+            raise KeyError(libero_suite)
+        task_map = _make_task_map(libero_suite)
+        self[libero_suite] = task_map
+        return task_map
+
+
+task_maps = _LazyTaskMaps()
+max_len = 0
 
 
 task_orders = [
@@ -149,6 +156,12 @@ class Benchmark(abc.ABC):
         )
         return bddl_file_path
 
+    def get_task_bddl_file_paths(self):
+        return get_libero_paths(
+            "bddl_files",
+            [os.path.join(task.problem_folder, task.bddl_file) for task in self.tasks],
+        )
+
     def get_task_demonstration(self, i):
         assert (
             0 <= i and i < self.n_tasks
@@ -163,15 +176,27 @@ class Benchmark(abc.ABC):
     def get_task_emb(self, i):
         return self.task_embs[i]
 
+    def get_task_init_states_paths(self):
+        return get_libero_paths(
+            "init_states",
+            [
+                os.path.join(task.problem_folder, task.init_states_file)
+                for task in self.tasks
+            ],
+        )
+
     def get_task_init_states(self, i):
-        init_states_path = os.path.join(
-            get_libero_path("init_states"),
+        from libero.libero.utils.init_state_utils import load_init_states
+
+        init_states_folder = get_libero_path("init_states")
+        init_states = load_init_states(
+            init_states_folder,
             self.tasks[i].problem_folder,
             self.tasks[i].init_states_file,
         )
-        init_states = torch.load(init_states_path)
-        print(f"loading init states for {self.name} from {init_states_path}")
-        # init_states = torch.load(init_states_path, weights_only=False) # for torch 2.6
+        print(
+            f"loading init states for {self.name} from {os.path.join(init_states_folder, self.tasks[i].problem_folder)}"
+        )
         return init_states
 
     def set_task_embs(self, task_embs):
@@ -1,7 +1,54 @@
-from .bddl_base_domain import TASK_MAPPING
-from .base_object import OBJECTS_DICT
-from .problems import *
-from .robots import *
-from .arenas import *
-from .env_wrapper import OffScreenRenderEnv, SegmentationRenderEnv
-from .venv import SubprocVectorEnv, DummyVectorEnv
+import importlib
+
+# Public names are resolved lazily so that importing a light-weight submodule
+# (e.g. ``libero.libero.envs.bddl_utils``) or ``libero.libero.benchmark`` does
+# not pull in every problem, object and arena module together with robosuite.
+_LAZY_ATTRS = {
+    "TASK_MAPPING": ".bddl_base_domain",
+    "OBJECTS_DICT": ".objects",
+    "Libero_Tabletop_Manipulation": ".problems",
+    "Libero_Coffee_Table_Manipulation": ".problems",
+    "Libero_Floor_Manipulation": ".problems",
+    "Libero_Study_Tabletop_Manipulation": ".problems",
+    "Libero_Living_Room_Tabletop_Manipulation": ".problems",
+    "Libero_Kitchen_Tabletop_Manipulation": ".problems",
+    "MountedPanda": ".robots",
+    "OnTheGroundPanda": ".robots",
+    "TableArena": ".arenas",
+    "EmptyArena": ".arenas",
+    "CoffeeTableArena": ".arenas",
+    "LivingRoomTableArena": ".arenas",
+    "StudyTableArena": ".arenas",
+    "KitchenTableArena": ".arenas",
+    "OffScreenRenderEnv": ".env_wrapper",
+    "SegmentationRenderEnv": ".env_wrapper",
+    "PhysicsOnlyEnv": ".env_wrapper",
+    "MultiTierRenderEnv": ".env_wrapper",
+    "SubprocVectorEnv": ".venv",
+    "DummyVectorEnv": ".venv",
+}
+
+__all__ = list(_LAZY_ATTRS.keys())
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    try:
+        if name == "TASK_MAPPING":
+            # Problem classes register themselves into TASK_MAPPING when imported
+            importlib.import_module(".problems", __name__)
+        module = importlib.import_module(_LAZY_ATTRS[name], __name__)
+    except AttributeError as e:
+        # "from ... import" reports an AttributeError raised here as a missing
+        # name, so errors while importing the submodule must not be one
+        raise ImportError(
+            f"importing {_LAZY_ATTRS[name]} for {name!r} failed: {e!r}"
+        ) from e
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals().keys()) | set(__all__))
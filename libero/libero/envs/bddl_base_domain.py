@@ -8,11 +8,13 @@ from robosuite.models.tasks import ManipulationTask
 from robosuite.utils.placement_samplers import SequentialCompositeSampler
 from robosuite.utils.observables import Observable, sensor
 from robosuite.utils.mjcf_utils import CustomMaterial
+from robosuite.utils.binding_utils import MjRenderContextOffscreen
 import robosuite.macros as macros
 
 import mujoco
 
 import libero.libero.envs.bddl_utils as BDDLUtils
+from libero.libero.utils.profiling_utils import profile_span, profiled
 from libero.libero.envs.robots import *
 from libero.libero.envs.utils import *
 from libero.libero.envs.object_states import *
@@ -75,9 +77,14 @@ class BDDLBaseDomain(SingleArmEnv):
         arena_type="table",
         scene_xml="scenes/libero_base_style.xml",
         scene_properties={},
+        required_obs_keys=None,
+        parsed_problem=None,
         **kwargs,
     ):
-        t0 = time.time()
+        # If specified, only these observables are computed at every step
+        self.required_obs_keys = (
+            None if required_obs_keys is None else set(required_obs_keys)
+        )
         # settings for table top (hardcoded since it's not an essential part of the environment)
         self.workspace_offset = workspace_offset
         # reward configuration
@@ -122,7 +129,11 @@ class BDDLBaseDomain(SingleArmEnv):
         self.custom_asset_dir = os.path.abspath(os.path.join(DIR_PATH, "../assets"))
 
         self.bddl_file_name = bddl_file_name
-        self.parsed_problem = BDDLUtils.robosuite_parse_problem(self.bddl_file_name)
+        # A problem parsed in another process can be passed in to skip parsing
+        if parsed_problem is None:
+            with profile_span("bddl_parse"):
+                parsed_problem = BDDLUtils.robosuite_parse_problem(self.bddl_file_name)
+        self.parsed_problem = parsed_problem
 
         self.obj_of_interest = self.parsed_problem["obj_of_interest"]
 
@@ -162,6 +173,7 @@ class BDDLBaseDomain(SingleArmEnv):
     def seed(self, seed):
         np.random.seed(seed)
 
+    @profiled("predicate_check")
     def reward(self, action=None):
         """
         Reward function for the task.
@@ -294,6 +306,7 @@ class BDDLBaseDomain(SingleArmEnv):
             ],
         )
 
+    @profiled("load_model")
     def _load_model(self):
         """
         Loads an xml model, puts it in self.model
@@ -370,9 +383,10 @@ class BDDLBaseDomain(SingleArmEnv):
 
         self._load_custom_material()
 
-        self._load_fixtures_in_arena(mujoco_arena)
+        with profile_span("load_object_xmls"):
+            self._load_fixtures_in_arena(mujoco_arena)
 
-        self._load_objects_in_arena(mujoco_arena)
+            self._load_objects_in_arena(mujoco_arena)
 
         self._load_sites_in_arena(mujoco_arena)
 
@@ -384,14 +398,19 @@ class BDDLBaseDomain(SingleArmEnv):
         self.fixtures = list(self.fixtures_dict.values())
 
         # task includes arena, robot, and objects of interest
-        self.model = ManipulationTask(
-            mujoco_arena=mujoco_arena,
-            mujoco_robots=[robot.robot_model for robot in self.robots],
-            mujoco_objects=self.objects + self.fixtures,
-        )
+        with profile_span("arena_merge"):
+            self.model = ManipulationTask(
+                mujoco_arena=mujoco_arena,
+                mujoco_robots=[robot.robot_model for robot in self.robots],
+                mujoco_objects=self.objects + self.fixtures,
+            )
+
+            for fixture in self.fixtures:
+                self.model.merge_assets(fixture)
 
-        for fixture in self.fixtures:
-            self.model.merge_assets(fixture)
+    @profiled("mujoco_compile")
+    def _initialize_sim(self, xml_string=None):
+        super()._initialize_sim(xml_string=xml_string)
 
     def _setup_placement_initializer(self, mujoco_arena):
         self.placement_initializer = SequentialCompositeSampler(name="ObjectSampler")
@@ -424,6 +443,12 @@ class BDDLBaseDomain(SingleArmEnv):
                 fixture_body.root_body
             )
 
+    @profiled("observables")
+    def _update_observables(self, force=False):
+        # Camera observables render here
+        super()._update_observables(force=force)
+
+    @profiled("setup_observables")
     def _setup_observables(self):
         """
         Sets up observables to be used for this environment. Creates object-based observables if enabled
@@ -466,6 +491,8 @@ class BDDLBaseDomain(SingleArmEnv):
 
         sensors.append(world_pose_in_gripper)
         names.append("world_pose_in_gripper")
+        # Observables that need to be computed before a given observable
+        dependencies = {"world_pose_in_gripper": [f"{pf}eef_pos", f"{pf}eef_quat"]}
 
         for (i, obj) in enumerate(self.objects):
             obj_sensors, obj_sensor_names = self._create_obj_sensors(
@@ -474,6 +501,14 @@ class BDDLBaseDomain(SingleArmEnv):
 
             sensors += obj_sensors
             names += obj_sensor_names
+            dependencies[f"{obj.name}_to_{pf}eef_pos"] = [
+                f"{obj.name}_pos",
+                f"{obj.name}_quat",
+                "world_pose_in_gripper",
+            ]
+            dependencies[f"{obj.name}_to_{pf}eef_quat"] = [
+                f"{obj.name}_to_{pf}eef_pos"
+            ]
 
         for name, s in zip(names, sensors):
             if name == "world_pose_in_gripper":
@@ -489,8 +524,30 @@ class BDDLBaseDomain(SingleArmEnv):
                     name=name, sensor=s, sampling_rate=self.control_freq
                 )
 
+        if self.required_obs_keys is not None:
+            self._prune_observables(observables, dependencies)
+
         return observables
 
+    def _prune_observables(self, observables, dependencies):
+        """
+        Disable every observable that is neither required nor needed to compute
+        a required one, so that per-step observation cost scales with what's used.
+        """
+        enabled_names = set()
+        queue = [name for name in self.required_obs_keys if name in observables]
+        while len(queue) > 0:
+            name = queue.pop()
+            if name in enabled_names:
+                continue
+            enabled_names.add(name)
+            queue += [d for d in dependencies.get(name, []) if d in observables]
+
+        for name, observable in observables.items():
+            observable.set_enabled(name in enabled_names)
+            # Dependencies are computed but not returned as observations
+            observable.set_active(name in self.required_obs_keys)
+
     def _create_obj_sensors(self, obj_name, modality="object"):
         """
         Helper function to create sensors for a given object. This is abstracted in a separate function call so that we
@@ -733,6 +790,10 @@ class BDDLBaseDomain(SingleArmEnv):
         """
         Resets simulation internal configurations.
         """
+        if self.has_offscreen_renderer and self.sim._render_context_offscreen is None:
+            # Same as in robosuite, created here to time it separately
+            with profile_span("create_renderer"):
+                MjRenderContextOffscreen(self.sim, device_id=self.render_gpu_device_id)
         super()._reset_internal()
 
         # Reset all object positions using initializer sampler if we're not directly loading from an xml
@@ -755,15 +816,16 @@ class BDDLBaseDomain(SingleArmEnv):
             # robosuite didn't provide api for this stepping. we manually do this stepping to increase the speed of resetting simulation.
             mujoco.mj_step1(self.sim.model._model, self.sim.data._data)
 
-            object_placements = self.placement_initializer.sample()
-            object_placements = self.conditional_placement_initializer.sample(
-                self.sim, object_placements
-            )
-            object_placements = (
-                self.conditional_placement_on_objects_initializer.sample(
-                    object_placements
+            with profile_span("placement_sampling"):
+                object_placements = self.placement_initializer.sample()
+                object_placements = self.conditional_placement_initializer.sample(
+                    self.sim, object_placements
+                )
+                object_placements = (
+                    self.conditional_placement_on_objects_initializer.sample(
+                        object_placements
+                    )
                 )
-            )
             for obj_pos, obj_quat, obj in object_placements.values():
                 if obj.name not in list(self.fixtures_dict.keys()):
                     # This is for movable object resetting
@@ -805,7 +867,8 @@ class BDDLBaseDomain(SingleArmEnv):
             action = np.concatenate((action[:3], action[-1:]), axis=-1)
 
         obs, reward, done, info = super().step(action)
-        done = self._check_success()
+        with profile_span("predicate_check"):
+            done = self._check_success()
 
         return obs, reward, done, info
 
@@ -840,7 +903,7 @@ class BDDLBaseDomain(SingleArmEnv):
 
     @property
     def language_instruction(self):
-        return self.parsed_problem["language"]
+        return " ".join(self.parsed_problem["language_instruction"])
 
     def get_object(self, object_name):
         for query_dict in [
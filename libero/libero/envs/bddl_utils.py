@@ -1,10 +1,98 @@
 from bddl.parsing import *
 
+import ast
+import hashlib
 import itertools
+import operator
+import os
+import pickle
+from dataclasses import dataclass, fields
+
 import numpy as np
 
+from libero.libero import libero_config_path
+
 pi = np.pi
 
+# Bump when the parsed representation changes, to invalidate the disk cache
+PARSE_CACHE_VERSION = 1
+
+bddl_cache_folder = os.path.join(libero_config_path, "bddl_cache")
+
+# Parsed problems of this process, keyed by the hash of the bddl file content
+_PARSED_PROBLEMS = {}
+
+_YAW_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+
+def _eval_yaw_node(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return node.value
+    if isinstance(node, ast.Name) and node.id == "pi":
+        return pi
+    if (
+        isinstance(node, ast.Attribute)
+        and node.attr == "pi"
+        and isinstance(node.value, ast.Name)
+        and node.value.id in ["np", "math"]
+    ):
+        return pi
+    if isinstance(node, ast.BinOp) and type(node.op) in _YAW_OPERATORS:
+        return _YAW_OPERATORS[type(node.op)](
+            _eval_yaw_node(node.left), _eval_yaw_node(node.right)
+        )
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _YAW_OPERATORS:
+        return _YAW_OPERATORS[type(node.op)](_eval_yaw_node(node.operand))
+    raise ValueError(f"[error] unsupported yaw rotation expression {ast.dump(node)}")
+
+
+def parse_yaw(value):
+    """Parse a yaw value, either a number or an arithmetic expression of pi."""
+    try:
+        return float(value)
+    except ValueError:
+        return _eval_yaw_node(ast.parse(value, mode="eval").body)
+
+
+@dataclass(frozen=True)
+class ParsedProblem:
+    """
+    Parsed content of a bddl problem file. Lists are stored as tuples. Fields can
+    also be accessed like a dict, e.g. ``parsed_problem["regions"]``.
+    """
+
+    problem_name: str
+    domain_name: str
+    fixtures: dict
+    regions: dict
+    objects: dict
+    scene_properties: dict
+    initial_state: tuple
+    goal_state: tuple
+    language_instruction: tuple
+    obj_of_interest: tuple
+
+    def __getitem__(self, key):
+        if key not in self.keys():
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def keys(self):
+        return [field.name for field in fields(self)]
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
 
 def get_regions(t, regions, group):
     group.pop(0)
@@ -33,7 +121,7 @@ def get_regions(t, regions, group):
             elif attribute[0] == ":yaw_rotation":
                 # print(attribute[1])
                 for value in attribute[1]:
-                    region_dict["yaw_rotation"] = [eval(x) for x in value]
+                    region_dict["yaw_rotation"] = [parse_yaw(x) for x in value]
             elif attribute[0] == ":rgba":
                 assert (
                     len(attribute[1]) == 4
@@ -60,34 +148,23 @@ def get_scenes(t, scene_properties, group):
                 raise NotImplementedError
 
 
-def get_problem_info(problem_filename):
-    domain_name = "unknown"
-    problem_filename = problem_filename
-    tokens = scan_tokens(filename=problem_filename)
-    if isinstance(tokens, list) and tokens.pop(0) == "define":
-        problem_name = "unknown"
-        language_instruction = ""
-        while tokens:
-            group = tokens.pop()
-            t = group[0]
-            if t == "problem":
-                problem_name = group[-1]
-            elif t == ":domain":
-                domain_name = "robosuite"
-            elif t == ":language":
-                group.pop(0)
-                language_instruction = group
+def get_problem_info(problem_filename, parsed_problem=None):
+    if parsed_problem is None:
+        parsed_problem = parse_problem(problem_filename)
     return {
-        "problem_name": problem_name,
-        "domain_name": domain_name,
-        "language_instruction": " ".join(language_instruction),
+        "problem_name": parsed_problem.problem_name,
+        "domain_name": parsed_problem.domain_name,
+        "language_instruction": " ".join(parsed_problem.language_instruction),
     }
 
 
 def robosuite_parse_problem(problem_filename):
+    """Parse a bddl file, cached per process and on disk. Returns a ParsedProblem."""
+    return parse_problem(problem_filename)
+
+
+def _parse_tokens(tokens):
     domain_name = "robosuite"
-    problem_filename = problem_filename
-    tokens = scan_tokens(filename=problem_filename)
     if isinstance(tokens, list) and tokens.pop(0) == "define":
         problem_name = "unknown"
         objects = {}
@@ -155,18 +232,75 @@ def robosuite_parse_problem(problem_filename):
                 package_predicates(group[1], goal_state, "", "goals")
             else:
                 print("%s is not recognized in problem" % t)
-        return {
-            "problem_name": problem_name,
-            "fixtures": fixtures,
-            "regions": regions,
-            "objects": objects,
-            "scene_properties": scene_properties,
-            "initial_state": initial_state,
-            "goal_state": goal_state,
-            "language_instruction": language_instruction,
-            "obj_of_interest": obj_of_interest,
-        }
-    else:
-        raise Exception(
-            f"Problem {behavior_activity} {activity_definition} does not match problem pattern"
+        return ParsedProblem(
+            problem_name=problem_name,
+            domain_name=domain_name,
+            fixtures=_freeze(fixtures),
+            regions=_freeze(regions),
+            objects=_freeze(objects),
+            scene_properties=_freeze(scene_properties),
+            initial_state=_freeze(initial_state),
+            goal_state=_freeze(goal_state),
+            language_instruction=_freeze(language_instruction),
+            obj_of_interest=_freeze(obj_of_interest),
         )
+    else:
+        raise Exception("Problem does not match problem pattern")
+
+
+def _freeze(value):
+    # Lists become tuples so that the cached problem shared by envs can't be modified in place
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return {k: _freeze(v) for k, v in value.items()}
+    return value
+
+
+def get_parse_cache_key(content):
+    return hashlib.sha1(
+        f"{PARSE_CACHE_VERSION}".encode() + b"\0" + content
+    ).hexdigest()
+
+
+def parse_problem(problem_filename, use_cache=True):
+    """
+    Parse a bddl file into a ParsedProblem. Results are cached in this process
+    and in ``bddl_cache_folder``, keyed by the hash of the file content, so that
+    workers building the same task only parse it once.
+    """
+    with open(problem_filename, "rb") as f:
+        content = f.read()
+    key = get_parse_cache_key(content)
+    if use_cache and key in _PARSED_PROBLEMS:
+        return _PARSED_PROBLEMS[key]
+
+    cache_file = os.path.join(bddl_cache_folder, f"{key}.pkl")
+    parsed_problem = None
+    if use_cache and os.path.exists(cache_file):
+        try:
+            with open(cache_file, "rb") as f:
+                parsed_problem = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            parsed_problem = None
+
+    if parsed_problem is None:
+        parsed_problem = _parse_tokens(scan_tokens(string=content.decode("utf-8")))
+        if use_cache:
+            _save_parse_cache_file(cache_file, parsed_problem)
+
+    if use_cache:
+        _PARSED_PROBLEMS[key] = parsed_problem
+    return parsed_problem
+
+
+def _save_parse_cache_file(cache_file, parsed_problem):
+    tmp_file = cache_file + f".{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp_file, "wb") as f:
+            pickle.dump(parsed_problem, f)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        # The parse cache is only a cache, failing to persist it is not an error
+        pass
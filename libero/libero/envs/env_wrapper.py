@@ -1,3 +1,4 @@
+import colorsys
 import os
 import numpy as np
 import robosuite as suite
@@ -6,7 +7,27 @@ import matplotlib.cm as cm
 from robosuite.utils.errors import RandomizationError
 
 import libero.libero.envs.bddl_utils as BDDLUtils
-from libero.libero.envs import *
+import libero.libero.envs.problems
+from libero.libero.envs.bddl_base_domain import TASK_MAPPING
+from libero.libero.utils.profiling_utils import profile_span, record_spans
+
+
+def _make_segmentation_colors(random_colors=False):
+    """Precompute the id -> RGB color table used to visualize segmentations."""
+    if random_colors:
+        hsv = [(1.0 * i / 256, 1, 1.0) for i in range(256)]
+        colors = np.array([colorsys.hsv_to_rgb(*c) for c in hsv])
+        np.random.RandomState(seed=20).shuffle(colors)
+        return (255.0 * colors).astype(np.uint8)
+    # deterministic shuffling of values to map each geom ID to a random int in [0, 255]
+    rstate = np.random.RandomState(seed=2)
+    inds = np.arange(256)
+    rstate.shuffle(inds)
+    return np.array(255.0 * cm.rainbow(inds)).astype(np.uint8)[..., :3]
+
+
+SEGMENTATION_COLORS = _make_segmentation_colors()
+RANDOM_SEGMENTATION_COLORS = _make_segmentation_colors(random_colors=True)
 
 
 class ControlEnv:
@@ -38,65 +59,120 @@ class ControlEnv:
         camera_segmentations=None,
         renderer="mujoco",
         renderer_config=None,
+        obs_keys=None,
+        parsed_problem=None,
+        profile_steps=False,
         **kwargs,
     ):
         assert os.path.exists(
             bddl_file_name
         ), f"[error] {bddl_file_name} does not exist!"
 
-        controller_configs = suite.load_controller_config(default_controller=controller)
-
-        problem_info = BDDLUtils.get_problem_info(bddl_file_name)
-        # Check if we're using a multi-armed environment and use env_configuration argument if so
-
-        # Create environment
-        self.problem_name = problem_info["problem_name"]
-        self.domain_name = problem_info["domain_name"]
-        self.language_instruction = problem_info["language_instruction"]
-        self.env = TASK_MAPPING[self.problem_name](
-            bddl_file_name,
-            robots=robots,
-            controller_configs=controller_configs,
-            gripper_types=gripper_types,
-            initialization_noise=initialization_noise,
-            use_camera_obs=use_camera_obs,
-            has_renderer=has_renderer,
-            has_offscreen_renderer=has_offscreen_renderer,
-            render_camera=render_camera,
-            render_collision_mesh=render_collision_mesh,
-            render_visual_mesh=render_visual_mesh,
-            render_gpu_device_id=render_gpu_device_id,
-            control_freq=control_freq,
-            horizon=horizon,
-            ignore_done=ignore_done,
-            hard_reset=hard_reset,
-            camera_names=camera_names,
-            camera_heights=camera_heights,
-            camera_widths=camera_widths,
-            camera_depths=camera_depths,
-            camera_segmentations=camera_segmentations,
-            renderer=renderer,
-            renderer_config=renderer_config,
-            **kwargs,
-        )
+        # Timed spans of the construction and the first reset, see profiling_utils
+        self.profile_spans = []
+        self._num_resets = 0
+        # Per-step spans, only recorded when profile_steps is set
+        self.step_spans = [] if profile_steps else None
+        with record_spans(self.profile_spans), profile_span("construct"):
+            if obs_keys is not None:
+                # Only keep the cameras and observables that are consumed
+                camera_names = [
+                    camera_name
+                    for camera_name in camera_names
+                    if any(
+                        [
+                            obs_key.startswith(f"{camera_name}_image")
+                            or obs_key.startswith(f"{camera_name}_depth")
+                            or obs_key.startswith(f"{camera_name}_segmentation")
+                            for obs_key in obs_keys
+                        ]
+                    )
+                ]
+                if len(camera_names) == 0:
+                    use_camera_obs = False
+                kwargs["required_obs_keys"] = obs_keys
+
+            controller_configs = suite.load_controller_config(default_controller=controller)
+
+            if parsed_problem is None:
+                parsed_problem = BDDLUtils.parse_problem(bddl_file_name)
+            problem_info = BDDLUtils.get_problem_info(
+                bddl_file_name, parsed_problem=parsed_problem
+            )
+            # Check if we're using a multi-armed environment and use env_configuration argument if so
+
+            # Create environment
+            self.problem_name = problem_info["problem_name"]
+            self.domain_name = problem_info["domain_name"]
+            self.language_instruction = problem_info["language_instruction"]
+            self.env = TASK_MAPPING[self.problem_name](
+                bddl_file_name,
+                robots=robots,
+                controller_configs=controller_configs,
+                gripper_types=gripper_types,
+                initialization_noise=initialization_noise,
+                use_camera_obs=use_camera_obs,
+                has_renderer=has_renderer,
+                has_offscreen_renderer=has_offscreen_renderer,
+                render_camera=render_camera,
+                render_collision_mesh=render_collision_mesh,
+                render_visual_mesh=render_visual_mesh,
+                render_gpu_device_id=render_gpu_device_id,
+                control_freq=control_freq,
+                horizon=horizon,
+                ignore_done=ignore_done,
+                hard_reset=hard_reset,
+                camera_names=camera_names,
+                camera_heights=camera_heights,
+                camera_widths=camera_widths,
+                camera_depths=camera_depths,
+                camera_segmentations=camera_segmentations,
+                renderer=renderer,
+                renderer_config=renderer_config,
+                parsed_problem=parsed_problem,
+                **kwargs,
+            )
 
     @property
     def obj_of_interest(self):
         return self.env.obj_of_interest
 
-    def step(self, action):
+    def _step(self, action):
         return self.env.step(action)
 
-    def reset(self):
+    def step(self, action):
+        if self.step_spans is None:
+            return self._step(action)
+        with record_spans(self.step_spans, origin=0.0), profile_span("env_step"):
+            return self._step(action)
+
+    def pop_step_spans(self):
+        """Return the per-step spans recorded so far and start a new list."""
+        if self.step_spans is None:
+            return []
+        spans, self.step_spans = self.step_spans, []
+        return spans
+
+    def _reset_with_retries(self, info):
+        info["retries"] = 0
         success = False
         while not success:
             try:
                 ret = self.env.reset()
                 success = True
             except RandomizationError:
-                pass
+                info["retries"] += 1
             finally:
                 continue
+        return ret
+
+    def reset(self):
+        if self._num_resets == 0:
+            with record_spans(self.profile_spans), profile_span("first_reset") as info:
+                ret = self._reset_with_retries(info)
+        else:
+            ret = self._reset_with_retries({})
+        self._num_resets += 1
 
         return ret
 
@@ -164,6 +240,98 @@ class OffScreenRenderEnv(ControlEnv):
         super().__init__(**kwargs)
 
 
+class PhysicsOnlyEnv(ControlEnv):
+    """
+    For init state generation, demo verification and low-dim policy evaluation.
+    No GL context is created, and no camera observables or render buffers are allocated.
+    """
+
+    def __init__(self, **kwargs):
+        # This shouldn't be customized
+        kwargs["has_renderer"] = False
+        kwargs["has_offscreen_renderer"] = False
+        kwargs["use_camera_obs"] = False
+        kwargs["camera_names"] = []
+        kwargs["camera_depths"] = False
+        kwargs["camera_segmentations"] = None
+        super().__init__(**kwargs)
+
+
+class MultiTierRenderEnv(ControlEnv):
+    """
+    For evaluation with videos. All policy cameras are rendered in one batched
+    pass at the policy resolution, and video frames are rendered on demand at
+    a higher resolution from the same simulation state, without re-stepping.
+    """
+
+    def __init__(
+        self,
+        camera_names=[
+            "agentview",
+            "robot0_eye_in_hand",
+        ],
+        camera_heights=128,
+        camera_widths=128,
+        video_camera_names=["agentview"],
+        video_heights=512,
+        video_widths=512,
+        **kwargs,
+    ):
+        from libero.libero.envs.rendering import MultiCameraRenderer
+
+        # This shouldn't be customized, images are rendered by this wrapper
+        kwargs["has_renderer"] = False
+        kwargs["has_offscreen_renderer"] = True
+        kwargs["use_camera_obs"] = False
+        super().__init__(
+            camera_names=camera_names,
+            camera_heights=camera_heights,
+            camera_widths=camera_widths,
+            **kwargs,
+        )
+        obs_keys = kwargs.get("obs_keys", None)
+        if obs_keys is not None:
+            camera_names = [
+                camera_name
+                for camera_name in camera_names
+                if f"{camera_name}_image" in obs_keys
+            ]
+        render_gpu_device_id = kwargs.get("render_gpu_device_id", -1)
+        self.policy_renderer = MultiCameraRenderer(
+            camera_names,
+            camera_heights,
+            camera_widths,
+            device_id=render_gpu_device_id,
+        )
+        self.video_renderer = MultiCameraRenderer(
+            video_camera_names,
+            video_heights,
+            video_widths,
+            device_id=render_gpu_device_id,
+        )
+
+    def _add_camera_obs(self, obs):
+        if len(self.policy_renderer.camera_names) > 0:
+            with profile_span("render"):
+                for camera_name, image in self.policy_renderer.render(self.sim).items():
+                    obs[f"{camera_name}_image"] = image
+        return obs
+
+    def _step(self, action):
+        obs, reward, done, info = self.env.step(action)
+        return self._add_camera_obs(obs), reward, done, info
+
+    def reset(self):
+        return self._add_camera_obs(super().reset())
+
+    def regenerate_obs_from_state(self, mujoco_state):
+        return self._add_camera_obs(super().regenerate_obs_from_state(mujoco_state))
+
+    def render_video_frames(self):
+        """Render the video cameras at the video resolution from the current state."""
+        return self.video_renderer.render(self.sim)
+
+
 class SegmentationRenderEnv(OffScreenRenderEnv):
     """
     This wrapper will additionally generate the segmentation mask of objects,
@@ -181,58 +349,98 @@ class SegmentationRenderEnv(OffScreenRenderEnv):
         kwargs["camera_segmentations"] = camera_segmentations
         kwargs["camera_heights"] = camera_heights
         kwargs["camera_widths"] = camera_widths
+        self.segmentation_level = camera_segmentations
         self.segmentation_id_mapping = {}
         self.instance_to_id = {}
         self.segmentation_robot_id = None
+        self.instance_lut = None
+        self.interest_lut = None
+        self.last_obs = None
         super().__init__(**kwargs)
 
     def step(self, action):
-        return self.env.step(action)
+        ret = super().step(action)
+        self.last_obs = ret[0]
+        return ret
 
     def reset(self):
         obs = self.env.reset()
+        self.last_obs = obs
         self.segmentation_id_mapping = {}
 
-        for i, instance_name in enumerate(list(self.env.model.instances_to_ids.keys())):
-            if instance_name == "Panda0":
-                self.segmentation_robot_id = i
+        # the robot instance is named after its model (e.g. MountedPanda0), and
+        # is followed by its gripper and mount instances
+        robot_model = self.env.robots[0].robot_model
+        robot_instances = [robot_model.name] + [
+            model.name for model in robot_model.models
+        ]
+        instance_names = list(self.env.model.instances_to_ids.keys())
+        self.segmentation_robot_id = None
+        if robot_model.name in instance_names:
+            self.segmentation_robot_id = instance_names.index(robot_model.name)
 
-        for i, instance_name in enumerate(list(self.env.model.instances_to_ids.keys())):
-            if instance_name not in ["Panda0", "RethinkMount0", "PandaGripper0"]:
+        for i, instance_name in enumerate(instance_names):
+            if instance_name not in robot_instances:
                 self.segmentation_id_mapping[i] = instance_name
 
         self.instance_to_id = {
             v: k + 1 for k, v in self.segmentation_id_mapping.items()
         }
+        self._build_segmentation_luts()
         return obs
 
-    def get_segmentation_instances(self, segmentation_image):
+    def regenerate_obs_from_state(self, mujoco_state):
+        self.last_obs = super().regenerate_obs_from_state(mujoco_state)
+        return self.last_obs
+
+    def _build_segmentation_luts(self):
+        # Segmentation ids are instance index + 1, and 0 for the background
+        num_ids = len(self.env.model.instances_to_ids) + 1
+        ids = np.arange(num_ids)
+        # Every id above the robot is merged into the robot id
+        if self.segmentation_robot_id is not None:
+            ids = np.minimum(ids, self.segmentation_robot_id + 1)
+        self.instance_lut = ids.astype(np.uint8 if num_ids <= 256 else np.int32)
+        # 1 for obj_of_interest, -1 for background, 0 for other things
+        self.interest_lut = np.zeros(num_ids, dtype=np.int8)
+        for obj in self.obj_of_interest:
+            self.interest_lut[self.instance_to_id[obj]] = 1
+        self.interest_lut[0] = -1
+
+    def _get_segmentation_image(self, segmentation_image, camera_name):
+        if segmentation_image is None:
+            segmentation_image = self.last_obs[
+                f"{camera_name}_segmentation_{self.segmentation_level}"
+            ]
+        return segmentation_image
+
+    def get_segmentation_instances(
+        self, segmentation_image=None, camera_name="agentview"
+    ):
         # get all instances' segmentation separately
-        seg_img_dict = {}
-        segmentation_image[segmentation_image > self.segmentation_robot_id] = (
-            self.segmentation_robot_id + 1
+        segmentation_image = self._get_segmentation_image(
+            segmentation_image, camera_name
         )
-        seg_img_dict["robot"] = segmentation_image * (
-            segmentation_image == self.segmentation_robot_id + 1
-        )
-
+        labels = np.take(self.instance_lut, segmentation_image, mode="clip")
+        seg_img_dict = {}
+        if self.segmentation_robot_id is not None:
+            seg_img_dict["robot"] = labels * (labels == self.segmentation_robot_id + 1)
         for seg_id, instance_name in self.segmentation_id_mapping.items():
-            seg_img_dict[instance_name] = segmentation_image * (
-                segmentation_image == seg_id + 1
-            )
+            seg_img_dict[instance_name] = labels * (labels == seg_id + 1)
         return seg_img_dict
 
-    def get_segmentation_of_interest(self, segmentation_image):
-        # get the combined segmentation of obj of interest
-        # 1 for obj_of_interest
-        # -1.0 for robot
-        # 0 for other things
-        ret_seg = np.zeros_like(segmentation_image)
-        for obj in self.obj_of_interest:
-            ret_seg[segmentation_image == self.instance_to_id[obj]] = 1.0
-        # ret_seg[segmentation_image == self.segmentation_robot_id+1] = -1.0
-        ret_seg[segmentation_image == 0] = -1.0
-        return ret_seg
+    def get_segmentation_of_interest(
+        self, segmentation_image=None, camera_name="agentview"
+    ):
+        """
+        Get the combined segmentation of obj of interest as an int8 mask, with
+        1 for obj_of_interest, -1 for the background and 0 for other things.
+        If no image is given, the last observed segmentation of camera_name is used.
+        """
+        segmentation_image = self._get_segmentation_image(
+            segmentation_image, camera_name
+        )
+        return np.take(self.interest_lut, segmentation_image, mode="clip")
 
     def segmentation_to_rgb(self, seg_im, random_colors=False):
         """
@@ -240,42 +448,24 @@ class SegmentationRenderEnv(OffScreenRenderEnv):
         NOTE: assumes that geom IDs go up to 255 at most - if not,
         multiple geoms might be assigned to the same color.
         """
+        lut = RANDOM_SEGMENTATION_COLORS if random_colors else SEGMENTATION_COLORS
+        if seg_im.ndim == 3:
+            seg_im = seg_im[..., 0]
         # ensure all values lie within [0, 255]
-        seg_im = np.mod(seg_im, 256)
+        return np.take(lut, np.mod(seg_im, 256), axis=0)
 
-        if random_colors:
-            colors = randomize_colors(N=256, bright=True)
-            return (255.0 * colors[seg_im]).astype(np.uint8)
-        else:
-            # deterministic shuffling of values to map each geom ID to a random int in [0, 255]
-            rstate = np.random.RandomState(seed=2)
-            inds = np.arange(256)
-            rstate.shuffle(inds)
-            seg_img = (
-                np.array(255.0 * cm.rainbow(inds[seg_im], 10))
-                .astype(np.uint8)[..., :3]
-                .astype(np.uint8)
-                .squeeze(-2)
-            )
-            print(seg_img.shape)
-            cv2.imshow("Seg Image", seg_img[::-1])
-            cv2.waitKey(1)
-            # use @inds to map each geom ID to a color
-            return seg_img
 
-
-class DemoRenderEnv(ControlEnv):
+class DemoRenderEnv(MultiTierRenderEnv):
     """
-    For visualization and evaluation.
+    For visualization and evaluation. The camera observations are rendered as in
+    MultiTierRenderEnv, and render_video_frames renders the frontview by default.
     """
 
-    def __init__(self, **kwargs):
+    def __init__(self, video_camera_names=["frontview"], **kwargs):
         # This shouldn't be customized
-        kwargs["has_renderer"] = False
-        kwargs["has_offscreen_renderer"] = True
         kwargs["render_camera"] = "frontview"
 
-        super().__init__(**kwargs)
+        super().__init__(video_camera_names=video_camera_names, **kwargs)
 
     def _get_observations(self):
-        return self.env._get_observations()
+        return self._add_camera_obs(self.env._get_observations())
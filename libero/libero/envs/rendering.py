@@ -0,0 +1,111 @@
+"""
+Batched multi-camera rendering.
+
+All requested cameras are rendered side by side into different viewports of
+the same offscreen framebuffer, which is then read back with a single
+``mjr_readPixels`` call. The CPU-side buffer is allocated once and reused for
+every frame and across resets, and the framebuffer is resized again whenever
+a hard reset recreates the render context.
+"""
+import mujoco
+import numpy as np
+import robosuite.macros as macros
+from robosuite.utils.binding_utils import MjRenderContextOffscreen
+
+# 1 keeps the OpenGL convention (origin at the bottom), -1 flips to OpenCV
+IMAGE_CONVENTION_MAPPING = {"opengl": 1, "opencv": -1}
+
+
+class MultiCameraRenderer:
+    """
+    Renders a fixed set of cameras at fixed resolutions in one pass.
+
+    Args:
+        camera_names (list): names of the cameras to render
+        camera_heights (int or list): image height, per camera or shared
+        camera_widths (int or list): image width, per camera or shared
+        device_id (int): GPU of the render context if this renderer creates it,
+            -1 for the default one
+    """
+
+    def __init__(self, camera_names, camera_heights, camera_widths, device_id=-1):
+        self.device_id = device_id
+        self.camera_names = list(camera_names)
+        num_cameras = len(self.camera_names)
+        if not isinstance(camera_heights, (list, tuple)):
+            camera_heights = [camera_heights] * num_cameras
+        if not isinstance(camera_widths, (list, tuple)):
+            camera_widths = [camera_widths] * num_cameras
+        self.camera_heights = list(camera_heights)
+        self.camera_widths = list(camera_widths)
+
+        # Cameras are laid out horizontally in one framebuffer atlas
+        self.x_offsets = np.cumsum([0] + self.camera_widths[:-1]).tolist()
+        self.atlas_width = int(sum(self.camera_widths))
+        self.atlas_height = int(max(self.camera_heights))
+        self._atlas = np.empty((self.atlas_height, self.atlas_width, 3), dtype=np.uint8)
+        self._atlas_viewport = mujoco.MjrRect(0, 0, self.atlas_width, self.atlas_height)
+        self._viewports = [
+            mujoco.MjrRect(x, 0, w, h)
+            for x, w, h in zip(self.x_offsets, self.camera_widths, self.camera_heights)
+        ]
+        self._context = None
+        self._camera_ids = None
+
+    def _prepare_context(self, sim):
+        if sim._render_context_offscreen is None:
+            MjRenderContextOffscreen(sim, device_id=self.device_id)
+        context = sim._render_context_offscreen
+        if context is not self._context:
+            # A hard reset recreates the simulation and its render context
+            self._context = context
+            if (
+                context.con.offWidth < self.atlas_width
+                or context.con.offHeight < self.atlas_height
+            ):
+                context.update_offscreen_size(
+                    max(self.atlas_width, context.con.offWidth),
+                    max(self.atlas_height, context.con.offHeight),
+                )
+            self._camera_ids = [
+                sim.model.camera_name2id(camera_name)
+                for camera_name in self.camera_names
+            ]
+        return context
+
+    def render(self, sim, copy=True):
+        """
+        Render all cameras from the current simulation state.
+
+        Returns:
+            dict: camera name -> (height, width, 3) uint8 image. With copy=False the
+                images are views into a buffer that is overwritten by the next call.
+        """
+        context = self._prepare_context(sim)
+        context.cam.type = mujoco.mjtCamera.mjCAMERA_FIXED
+        for camera_id, viewport in zip(self._camera_ids, self._viewports):
+            context.cam.fixedcamid = camera_id
+            mujoco.mjv_updateScene(
+                sim.model._model,
+                sim.data._data,
+                context.vopt,
+                context.pert,
+                context.cam,
+                mujoco.mjtCatBit.mjCAT_ALL,
+                context.scn,
+            )
+            mujoco.mjr_render(viewport=viewport, scn=context.scn, con=context.con)
+        mujoco.mjr_readPixels(
+            rgb=self._atlas, depth=None, viewport=self._atlas_viewport, con=context.con
+        )
+
+        convention = IMAGE_CONVENTION_MAPPING[macros.IMAGE_CONVENTION]
+        images = {}
+        for camera_name, x, w, h in zip(
+            self.camera_names, self.x_offsets, self.camera_widths, self.camera_heights
+        ):
+            # The framebuffer origin is at the bottom, so the rows of a
+            # camera shorter than the atlas are the first h rows
+            image = self._atlas[:h, x : x + w][::convention]
+            images[camera_name] = image.copy() if copy else image
+        return images
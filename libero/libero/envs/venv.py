@@ -12,6 +12,8 @@ from multiprocessing import Array, Pipe, connection
 from multiprocessing.context import Process
 from typing import Any, Callable, List, Optional, Tuple, Union
 
+from libero.libero.utils.profiling_utils import profiled
+
 
 gym_old_venv_step_type = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
 gym_new_venv_step_type = Tuple[
@@ -282,6 +284,10 @@ def _worker(
                 p.send(env.get_segmentation_of_interest(data))
             elif cmd == "get_sim_state":
                 p.send(env.get_sim_state())
+            elif cmd == "pop_step_spans":
+                p.send(env.pop_step_spans())
+            elif cmd == "render_video_frames":
+                p.send(env.render_video_frames())
             elif cmd == "set_init_state":
                 obs = env.set_init_state(data)
                 p.send(obs)
@@ -340,12 +346,18 @@ class DummyEnvWorker(EnvWorker):
     def check_success(self):
         return self.env.check_success()
 
-    def get_segmentation_of_interest(self, segmentation_image):
+    def get_segmentation_of_interest(self, segmentation_image=None):
         return self.env.get_segmentation_of_interest(segmentation_image)
 
     def get_sim_state(self):
         return self.env.get_sim_state()
 
+    def pop_step_spans(self):
+        return self.env.pop_step_spans()
+
+    def render_video_frames(self):
+        return self.env.render_video_frames()
+
     def set_init_state(self, init_state):
         return self.env.set_init_state(init_state)
 
@@ -418,6 +430,7 @@ class SubprocEnvWorker(EnvWorker):
             remain_conns = [conn for conn in remain_conns if conn not in ready_conns]
         return [workers[conns.index(con)] for con in ready_conns]
 
+    @profiled("ipc_send")
     def send(self, action: Optional[np.ndarray], **kwargs: Any) -> None:
         if action is None:
             if "seed" in kwargs:
@@ -426,6 +439,7 @@ class SubprocEnvWorker(EnvWorker):
         else:
             self.parent_remote.send(["step", action])
 
+    @profiled("ipc_recv")
     def recv(
         self,
     ) -> Union[
@@ -493,14 +507,31 @@ class SubprocEnvWorker(EnvWorker):
         self.parent_remote.send(["check_success", None])
         return self.parent_remote.recv()
 
-    def get_segmentation_of_interest(self, segmentation_image):
+    def send_get_segmentation_of_interest(self, segmentation_image=None):
         self.parent_remote.send(["get_segmentation_of_interest", segmentation_image])
+
+    def get_segmentation_of_interest(self, segmentation_image=None):
+        self.send_get_segmentation_of_interest(segmentation_image)
         return self.parent_remote.recv()
 
     def get_sim_state(self):
         self.parent_remote.send(["get_sim_state", None])
         return self.parent_remote.recv()
 
+    def send_pop_step_spans(self):
+        self.parent_remote.send(["pop_step_spans", None])
+
+    def pop_step_spans(self):
+        self.send_pop_step_spans()
+        return self.parent_remote.recv()
+
+    def send_render_video_frames(self):
+        self.parent_remote.send(["render_video_frames", None])
+
+    def render_video_frames(self):
+        self.send_render_video_frames()
+        return self.parent_remote.recv()
+
     def set_init_state(self, init_state):
         self.parent_remote.send(["set_init_state", init_state])
         obs = self.parent_remote.recv()
@@ -887,7 +918,10 @@ class DummyVectorEnv(BaseVectorEnv):
     def check_success(self):
         return [w.check_success() for w in self.workers]
 
-    def get_segmentation_of_interest(self, segmentation_images):
+    def get_segmentation_of_interest(self, segmentation_images=None):
+        if segmentation_images is None:
+            # Use the last segmentation observed by each env
+            segmentation_images = [None] * len(self.workers)
         return [
             w.get_segmentation_of_interest(img)
             for w, img in zip(self.workers, segmentation_images)
@@ -896,6 +930,12 @@ class DummyVectorEnv(BaseVectorEnv):
     def get_sim_state(self):
         return [w.get_sim_state() for w in self.workers]
 
+    def pop_step_spans(self):
+        return [w.pop_step_spans() for w in self.workers]
+
+    def render_video_frames(self):
+        return [w.render_video_frames() for w in self.workers]
+
     def set_init_state(
         self,
         init_state: Optional[Union[int, List[int], np.ndarray]] = None,
@@ -938,15 +978,32 @@ class SubprocVectorEnv(BaseVectorEnv):
     def check_success(self):
         return [w.check_success() for w in self.workers]
 
-    def get_segmentation_of_interest(self, segmentation_images):
-        return [
-            w.get_segmentation_of_interest(img)
-            for w, img in zip(self.workers, segmentation_images)
-        ]
+    def get_segmentation_of_interest(self, segmentation_images=None):
+        """
+        Compute the masks in all workers in parallel. Without images, each worker
+        uses the last segmentation observed by its env, so that only the compact
+        masks go through the pipes.
+        """
+        if segmentation_images is None:
+            segmentation_images = [None] * len(self.workers)
+        for w, img in zip(self.workers, segmentation_images):
+            w.send_get_segmentation_of_interest(img)
+        return [w.parent_remote.recv() for w in self.workers]
 
     def get_sim_state(self):
         return [w.get_sim_state() for w in self.workers]
 
+    def pop_step_spans(self):
+        for w in self.workers:
+            w.send_pop_step_spans()
+        return [w.parent_remote.recv() for w in self.workers]
+
+    def render_video_frames(self):
+        """Render the video frames of all envs in parallel, see MultiTierRenderEnv."""
+        for w in self.workers:
+            w.send_render_video_frames()
+        return [w.parent_remote.recv() for w in self.workers]
+
     def set_init_state(
         self,
         init_state: Optional[Union[int, List[int], np.ndarray]] = None,
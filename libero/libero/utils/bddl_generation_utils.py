@@ -12,11 +12,15 @@ def get_result(result):
     return "\n".join(result)
 
 
-def save_to_file(result, scene_name, language, folder=""):
-    file_name = os.path.join(
+def get_bddl_file_name(scene_name, language, folder=""):
+    return os.path.join(
         folder,
         f"{scene_name}".upper() + "_" + "_".join(language.lower().split(" ")) + ".bddl",
     )
+
+
+def save_to_file(result, scene_name, language, folder=""):
+    file_name = get_bddl_file_name(scene_name, language, folder=folder)
     with open(file_name, "w") as f:
         f.write(result)
     return file_name
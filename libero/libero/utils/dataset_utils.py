@@ -2,6 +2,59 @@ import h5py
 import numpy as np
 import json
 
+# Per-frame image encodings of the demo datasets, see encode_frames. The frames
+# are stored as variable-length uint8 buffers with the encoding and the frame
+# shape in the dataset attributes.
+IMAGE_ENCODINGS = {"jpeg": ".jpg", "webp": ".webp", "png": ".png"}
+
+
+def encode_frames(frames, encoding="jpeg", quality=95):
+    """Encode (T, H, W, C) uint8 RGB frames into a list of byte buffers."""
+    import cv2
+
+    assert encoding in IMAGE_ENCODINGS, f"[error] unknown image encoding {encoding}"
+    params = {
+        "jpeg": [cv2.IMWRITE_JPEG_QUALITY, quality],
+        "webp": [cv2.IMWRITE_WEBP_QUALITY, quality],
+        "png": [],
+    }[encoding]
+    buffers = []
+    for frame in frames:
+        # opencv encodes BGR images
+        success, buffer = cv2.imencode(
+            IMAGE_ENCODINGS[encoding], np.ascontiguousarray(frame[..., ::-1]), params
+        )
+        assert success, f"[error] failed to encode a frame as {encoding}"
+        buffers.append(buffer.reshape(-1))
+    return buffers
+
+
+def decode_frame(buffer):
+    """Decode a byte buffer written by encode_frames into a (H, W, C) RGB frame."""
+    import cv2
+
+    frame = cv2.imdecode(np.asarray(buffer, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if frame.ndim == 2:
+        return frame[..., None]
+    return frame[..., ::-1]
+
+
+def create_encoded_frames_dataset(grp, name, frames, encoding="jpeg", quality=95):
+    """Store (T, H, W, C) uint8 frames with one encoded buffer per frame."""
+    frames = np.asarray(frames)
+    dataset = grp.create_dataset(
+        name, shape=(len(frames),), dtype=h5py.vlen_dtype(np.uint8)
+    )
+    for i, buffer in enumerate(encode_frames(frames, encoding, quality)):
+        dataset[i] = buffer
+    dataset.attrs["encoding"] = encoding
+    dataset.attrs["frame_shape"] = frames.shape[1:]
+    return dataset
+
+
+def is_encoded_frames(dataset):
+    return "encoding" in dataset.attrs
+
 
 def get_dataset_info(dataset_path, filter_key=None, verbose=True):
     # extract demonstration list from file
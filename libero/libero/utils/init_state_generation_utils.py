@@ -0,0 +1,208 @@
+"""
+Generation of initial states for tasks.
+
+Resets are run in a process pool with rendering disabled. Every sampled
+state is settled with a few zero-action steps, checked against the initial
+predicates of its bddl file, and rejected if movable objects keep moving
+during additional zero-action steps. Valid states are written into the
+suite-level init state store (see ``init_state_utils``).
+"""
+import multiprocessing
+import os
+
+import numpy as np
+
+from libero.libero.utils.init_state_utils import (
+    has_init_state_store,
+    open_init_state_store,
+    write_init_state_store,
+)
+
+# Environment of the current worker process, created once per worker
+_worker_env = None
+
+
+def _make_physics_env(bddl_file_name):
+    from libero.libero.envs.env_wrapper import PhysicsOnlyEnv
+
+    return PhysicsOnlyEnv(bddl_file_name=bddl_file_name)
+
+
+def _init_worker(bddl_file_name):
+    global _worker_env
+    _worker_env = _make_physics_env(bddl_file_name)
+
+
+def get_movable_object_positions(env):
+    return np.array(
+        [
+            env.env.sim.data.body_xpos[env.env.obj_body_id[object_name]]
+            for object_name in env.env.objects_dict.keys()
+        ]
+    )
+
+
+def check_initial_predicates(env):
+    """
+    Evaluate the initial predicates of the bddl file that can be checked on
+    object states. Returns the list of violated predicates.
+    """
+    from libero.libero.envs.predicates import (
+        VALIDATE_PREDICATE_FN_DICT,
+        eval_predicate_fn,
+    )
+
+    object_states_dict = env.env.object_states_dict
+    violated = []
+    for state in env.env.parsed_problem["initial_state"]:
+        predicate_fn_name, object_names = state[0], state[1:]
+        if predicate_fn_name not in VALIDATE_PREDICATE_FN_DICT or any(
+            [object_name not in object_states_dict for object_name in object_names]
+        ):
+            continue
+        if not eval_predicate_fn(
+            predicate_fn_name,
+            *[object_states_dict[object_name] for object_name in object_names],
+        ):
+            violated.append(state)
+    return violated
+
+
+def sample_init_state(
+    env, num_settle_steps=5, num_stability_steps=20, stability_threshold=0.005
+):
+    """
+    Sample one initial state. Returns (state, reason), where reason is None for
+    valid states and otherwise describes why the state was rejected.
+    """
+    env.reset()
+    dummy_action = np.zeros(env.env.action_dim)
+    for _ in range(num_settle_steps):
+        env.step(dummy_action)
+    init_state = env.get_sim_state()
+
+    violated = check_initial_predicates(env)
+    if len(violated) > 0:
+        return init_state, f"violated initial predicates {violated}"
+
+    positions = get_movable_object_positions(env)
+    for _ in range(num_stability_steps):
+        env.step(dummy_action)
+    if len(positions) > 0:
+        displacement = np.max(
+            np.linalg.norm(get_movable_object_positions(env) - positions, axis=-1)
+        )
+        if displacement > stability_threshold:
+            return init_state, f"unstable, objects moved by {displacement:.4f}"
+    return init_state, None
+
+
+def _sample_init_states_worker(worker_args):
+    seed, num_samples, sample_kwargs = worker_args
+    _worker_env.seed(seed)
+    results = []
+    for _ in range(num_samples):
+        results.append(sample_init_state(_worker_env, **sample_kwargs))
+    return results
+
+
+def generate_init_states(
+    bddl_file_name,
+    num_init_states=50,
+    num_workers=None,
+    seed=0,
+    chunk_size=5,
+    max_attempts_ratio=4,
+    verbose=False,
+    **sample_kwargs,
+):
+    """
+    Generate valid initial states of a task with a process pool.
+
+    Args:
+        bddl_file_name (str): path to the bddl file of the task
+        num_init_states (int): number of valid states to generate
+        num_workers (int): number of worker processes, defaults to the cpu count
+        seed (int): base random seed, each chunk of resets uses its own seed
+        chunk_size (int): number of resets per worker call
+        max_attempts_ratio (int): give up after num_init_states * max_attempts_ratio resets
+        sample_kwargs: passed to sample_init_state
+
+    Returns:
+        np.array: valid states of shape (num_init_states, state_dim), fewer rows
+            if the attempts run out. Raises RuntimeError if no state is valid.
+    """
+    num_workers = num_workers or multiprocessing.cpu_count()
+    max_attempts = num_init_states * max_attempts_ratio
+    init_states = []
+    num_attempts = 0
+    num_chunks = 0
+
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(
+        num_workers, initializer=_init_worker, initargs=(bddl_file_name,)
+    ) as pool:
+        while len(init_states) < num_init_states and num_attempts < max_attempts:
+            num_missing = num_init_states - len(init_states)
+            worker_args = []
+            for _ in range(max((num_missing + chunk_size - 1) // chunk_size, num_workers)):
+                worker_args.append((seed + num_chunks, chunk_size, sample_kwargs))
+                num_chunks += 1
+            for results in pool.imap(_sample_init_states_worker, worker_args):
+                for init_state, reason in results:
+                    num_attempts += 1
+                    if reason is None:
+                        init_states.append(init_state)
+                    elif verbose:
+                        print(f"[info] rejected init state: {reason}")
+
+    if len(init_states) == 0:
+        raise RuntimeError(
+            f"[error] no valid init state out of {num_attempts} attempts for {bddl_file_name}"
+        )
+    if len(init_states) < num_init_states:
+        print(
+            f"[warning] only {len(init_states)} valid init states out of {num_attempts} attempts for {bddl_file_name}"
+        )
+    print(
+        f"[info] {len(init_states)} valid init states out of {num_attempts} attempts for {bddl_file_name}"
+    )
+    return np.array(init_states[:num_init_states])
+
+
+def generate_suite_init_states(
+    bddl_folder,
+    init_states_folder,
+    suite_name,
+    task_names,
+    num_init_states=100,
+    num_pruned_states=50,
+    overwrite=False,
+    **kwargs,
+):
+    """
+    Generate the init states of all tasks of a suite and write them into the
+    suite-level init state store, as ``{task}.init`` and ``{task}.pruned_init``.
+    """
+    existing_tasks = set()
+    if not overwrite and has_init_state_store(init_states_folder, suite_name):
+        existing_tasks = set(open_init_state_store(init_states_folder, suite_name)[1])
+
+    for task_name in task_names:
+        if f"{task_name}.init" in existing_tasks:
+            print(f"[info] skipping {task_name}, init states already exist")
+            continue
+        init_states = generate_init_states(
+            os.path.join(bddl_folder, suite_name, f"{task_name}.bddl"),
+            num_init_states=num_init_states,
+            **kwargs,
+        )
+        # Write after every task so that an interrupted generation keeps its progress
+        write_init_state_store(
+            init_states_folder,
+            suite_name,
+            {
+                f"{task_name}.init": init_states,
+                f"{task_name}.pruned_init": init_states[:num_pruned_states],
+            },
+        )
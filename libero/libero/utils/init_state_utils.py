@@ -0,0 +1,163 @@
+"""
+Suite-level storage of initial states.
+
+All init states of a suite are packed into one flat float64 ``.npy`` array
+that is memory-mapped on load, together with a json index mapping each
+init-state file name (e.g. ``TASK.pruned_init``) to its offset, count and
+state dimension in the flat array:
+
+    init_files/<suite>/<suite>.init_states.<content hash>.npy
+    init_files/<suite>/<suite>.init_states.json
+
+The index names the data file it belongs to. A new data file never replaces
+an existing one, so replacing the index is the single atomic step that
+publishes a rewritten store.
+
+Loading a task returns a zero-copy, read-only ``(count, state_dim)`` view.
+Suites without a store fall back to the legacy per-task ``torch.load`` files.
+"""
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+STORE_VERSION = 2
+
+
+def get_store_index_path(init_states_folder, suite_name):
+    return os.path.join(
+        init_states_folder, suite_name, f"{suite_name}.init_states.json"
+    )
+
+
+def has_init_state_store(init_states_folder, suite_name):
+    return os.path.exists(get_store_index_path(init_states_folder, suite_name))
+
+
+@lru_cache(maxsize=16)
+def _open_store(index_path, mtime_ns):
+    # mtime_ns is part of the cache key so that rewritten stores are reloaded
+    with open(index_path, "r") as f:
+        index = json.load(f)
+    assert (
+        index.get("version") == STORE_VERSION
+    ), f"[error] unsupported init state store version in {index_path}, rewrite it with scripts/convert_init_states.py"
+    data_path = os.path.join(os.path.dirname(index_path), index["data_file"])
+    assert os.path.exists(
+        data_path
+    ), f"[error] data file {data_path} of init state store {index_path} is missing"
+    data = np.load(data_path, mmap_mode="r")
+    assert data.shape == (
+        index["size"],
+    ), f"[error] data file {data_path} has shape {data.shape}, the index {index_path} expects ({index['size']},)"
+    return data, index["tasks"]
+
+
+def open_init_state_store(init_states_folder, suite_name):
+    """Return (flat memory-mapped array, index dict) of a suite, cached per process."""
+    index_path = get_store_index_path(init_states_folder, suite_name)
+    return _open_store(index_path, os.stat(index_path).st_mtime_ns)
+
+
+def load_init_states(init_states_folder, suite_name, init_states_file):
+    """
+    Load the init states of one task as an array of shape (count, state_dim).
+    Uses the suite store when available, otherwise the legacy torch file.
+    """
+    if has_init_state_store(init_states_folder, suite_name):
+        data, index = open_init_state_store(init_states_folder, suite_name)
+        if init_states_file in index:
+            entry = index[init_states_file]
+            start = entry["offset"]
+            end = start + entry["count"] * entry["state_dim"]
+            return data[start:end].reshape(entry["count"], entry["state_dim"])
+
+    import torch
+
+    init_states_path = os.path.join(init_states_folder, suite_name, init_states_file)
+    # the legacy files are pickled numpy arrays
+    return torch.load(init_states_path, weights_only=False)
+
+
+def write_init_state_store(init_states_folder, suite_name, init_states_dict, merge=True):
+    """
+    Write {init_states_file: array (count, state_dim)} into the suite store.
+    When merge is True, entries already in the store are kept unless overwritten.
+    """
+    index_path = get_store_index_path(init_states_folder, suite_name)
+    suite_folder = os.path.dirname(index_path)
+    os.makedirs(suite_folder, exist_ok=True)
+
+    all_init_states = {}
+    if merge and has_init_state_store(init_states_folder, suite_name):
+        data, index = open_init_state_store(init_states_folder, suite_name)
+        for name, entry in index.items():
+            start = entry["offset"]
+            end = start + entry["count"] * entry["state_dim"]
+            all_init_states[name] = np.array(data[start:end]).reshape(
+                entry["count"], entry["state_dim"]
+            )
+    for name, init_states in init_states_dict.items():
+        init_states = np.asarray(init_states, dtype=np.float64)
+        assert (
+            init_states.ndim == 2
+        ), f"[error] init states of {name} should be 2D, got shape {init_states.shape}"
+        all_init_states[name] = init_states
+
+    index = {}
+    offset = 0
+    for name in sorted(all_init_states.keys()):
+        count, state_dim = all_init_states[name].shape
+        index[name] = {"offset": offset, "count": count, "state_dim": state_dim}
+        offset += count * state_dim
+
+    flat = np.empty(offset, dtype=np.float64)
+    for name, entry in index.items():
+        start = entry["offset"]
+        flat[start : start + entry["count"] * entry["state_dim"]] = all_init_states[
+            name
+        ].reshape(-1)
+
+    # The data file is named after its content, so it never overwrites the
+    # data of the published store. Replacing the index then publishes both at
+    # once, concurrent readers see either the old or the new store.
+    data_file = (
+        f"{suite_name}.init_states.{hashlib.sha1(flat.tobytes()).hexdigest()[:16]}.npy"
+    )
+    data_path = os.path.join(suite_folder, data_file)
+    previous_data_file = None
+    if os.path.exists(index_path):
+        with open(index_path, "r") as f:
+            previous_data_file = json.load(f).get("data_file")
+    if not os.path.exists(data_path):
+        tmp_data_path = data_path + f".{os.getpid()}.tmp.npy"
+        np.save(tmp_data_path, flat)
+        os.replace(tmp_data_path, data_path)
+    tmp_index_path = index_path + f".{os.getpid()}.tmp"
+    with open(tmp_index_path, "w") as f:
+        json.dump(
+            {
+                "version": STORE_VERSION,
+                "data_file": data_file,
+                "size": offset,
+                "tasks": index,
+            },
+            f,
+            indent=2,
+        )
+    os.replace(tmp_index_path, index_path)
+
+    # Keep the data file of the previous index for readers that opened it just
+    # before the swap, remove older ones
+    prefix = f"{suite_name}.init_states."
+    for file_name in os.listdir(suite_folder):
+        if (
+            file_name.startswith(prefix)
+            and file_name.endswith(".npy")
+            and file_name not in (data_file, previous_data_file)
+            and ".tmp" not in file_name
+        ):
+            os.remove(os.path.join(suite_folder, file_name))
+    return index
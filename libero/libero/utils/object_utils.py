@@ -1,6 +1,11 @@
 # This is a util file for various functions that retrieve object information
+import hashlib
+import inspect
+import json
+import os
 from xml.etree import ElementTree
 
+from libero.libero import libero_config_path
 from libero.libero.envs.objects import OBJECTS_DICT, get_object_fn
 
 EXCEPTION_DICT = {"flat_stove": "flat_stove_burner"}
@@ -16,12 +21,150 @@ def update_exception_dict(object_name, site_name):
     EXCEPTION_DICT[object_name] = site_name
 
 
-def get_affordance_regions(objects, verbose=False):
-    """_summary_
+# Affordance regions computed in this process, keyed by the index key
+_AFFORDANCE_INDEX = {}
+# Source hashes of the object classes, keyed by the class names, so that the
+# source files are only read once per process
+_SOURCE_HASHES = {}
+
+affordance_index_file = os.path.join(libero_config_path, "affordance_index.json")
+
+
+def _hash_file(file_name):
+    with open(file_name, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def invalidate_affordance_index():
+    """
+    Forget the affordance regions and source hashes memoized in this process,
+    e.g. after editing object classes in a running notebook.
+    """
+    _AFFORDANCE_INDEX.clear()
+    _SOURCE_HASHES.clear()
+
+
+def _get_classes_source_hash(objects):
+    """
+    Hash of the source files defining the object classes and their bases. It
+    is computed once per process, see invalidate_affordance_index.
+    """
+    object_classes = [
+        OBJECTS_DICT[object_name.lower()]
+        for object_name in sorted(objects.keys())
+        if object_name.lower() in OBJECTS_DICT
+    ]
+    class_names = tuple(
+        f"{object_class.__module__}.{object_class.__qualname__}"
+        for object_class in object_classes
+    )
+    if class_names in _SOURCE_HASHES:
+        return _SOURCE_HASHES[class_names]
+
+    source_files = set()
+    for object_class in object_classes:
+        for base_class in object_class.__mro__:
+            try:
+                source_files.add(inspect.getsourcefile(base_class))
+            except TypeError:
+                # builtin classes have no source file
+                pass
+    source_hash = hashlib.sha1(json.dumps(list(class_names)).encode())
+    for source_file in sorted(f for f in source_files if f is not None):
+        if os.path.exists(source_file):
+            source_hash.update(source_file.encode())
+            source_hash.update(_hash_file(source_file).encode())
+    _SOURCE_HASHES[class_names] = source_hash.hexdigest()
+    return _SOURCE_HASHES[class_names]
+
+
+def _get_affordance_index_key(objects):
+    key_info = {
+        "sources": _get_classes_source_hash(objects),
+        "objects": sorted(objects.keys()),
+        "exceptions": sorted(EXCEPTION_DICT.items()),
+    }
+    return hashlib.sha1(json.dumps(key_info).encode()).hexdigest()
+
+
+def _is_valid_affordance_index_entry(entry):
+    """An entry is valid if the xml file of every object is unchanged."""
+    if not isinstance(entry, dict) or "xml_hashes" not in entry:
+        return False
+    for xml_file, xml_hash in entry["xml_hashes"].items():
+        if not os.path.exists(xml_file) or _hash_file(xml_file) != xml_hash:
+            return False
+    return True
+
+
+def _load_affordance_index_file():
+    if not os.path.exists(affordance_index_file):
+        return {}
+    try:
+        with open(affordance_index_file, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_affordance_index_file(index):
+    tmp_file = affordance_index_file + f".{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_file, affordance_index_file)
+    except OSError:
+        # The index is only a cache, failing to persist it is not an error
+        pass
+
+
+def get_affordance_regions(objects, verbose=False, use_cache=True):
+    """Get the affordance regions of objects. Results are memoized in-process and
+    persisted in ``affordance_index_file``, keyed by the source of the object classes
+    and validated against the xml file of every object, so that objects are only
+    instantiated when their classes or assets change.
+
+    Args:
+        objects (MujocoObject): a dictionary of objects
+        verbose (bool, optional): Print additional debug information. Defaults to False.
+        use_cache (bool, optional): Use the memoized affordance index. Defaults to True.
+
+    Returns:
+        dict: a dictionary of object names and their affordance regions.
+    """
+    if not use_cache:
+        return compute_affordance_regions(objects, verbose=verbose)
+
+    key = _get_affordance_index_key(objects)
+    if key not in _AFFORDANCE_INDEX:
+        entry = _load_affordance_index_file().get(key, None)
+        if not _is_valid_affordance_index_entry(entry):
+            xml_files = {}
+            regions = compute_affordance_regions(
+                objects, verbose=verbose, xml_files=xml_files
+            )
+            entry = {
+                "regions": regions,
+                "xml_hashes": {
+                    xml_file: _hash_file(xml_file)
+                    for xml_file in set(xml_files.values())
+                    if os.path.exists(xml_file)
+                },
+            }
+            # Only the current entry is kept, so that the file does not grow
+            _save_affordance_index_file({key: entry})
+        _AFFORDANCE_INDEX[key] = entry["regions"]
+    # Return copies so that callers cannot modify the cached index
+    return {k: list(v) for k, v in _AFFORDANCE_INDEX[key].items()}
+
+
+def compute_affordance_regions(objects, verbose=False, xml_files=None):
+    """Instantiate every object and read the affordance regions from its xml.
 
     Args:
         objects (MujocoObject): a dictionary of objects
         verbose (bool, optional): Print additional debug information. Defaults to False.
+        xml_files (dict, optional): If not None, filled with the xml file of every object.
 
     Returns:
         dict: a dictionary of object names and their affordance regions.
@@ -30,6 +173,8 @@ def get_affordance_regions(objects, verbose=False):
     for object_name in objects.keys():
         try:
             obj = get_object_fn(object_name)()
+            if xml_files is not None and getattr(obj, "file", None) is not None:
+                xml_files[object_name] = os.path.abspath(obj.file)
             # print(obj.root.findall(".//site"))
             object_affordance = []
             for site in obj.root.findall(".//site"):
@@ -0,0 +1,147 @@
+"""
+Timed spans for profiling environment construction.
+
+Spans are only recorded while a recorder is active (see ``record_spans``), so
+the instrumentation costs a single list check otherwise. Each span is a dict
+with its name, its start time relative to the recorder and its duration in
+seconds, plus optional extra information (e.g. the number of retries).
+"""
+import functools
+import json
+import time
+from contextlib import contextmanager
+
+# Span lists of the recorders that are currently active in this process
+_ACTIVE_RECORDERS = []
+
+
+def start_recording(spans, origin=None):
+    """
+    Record every span that ends from now on into the spans list. Span start times
+    are relative to origin, which defaults to now. Use origin=0.0 for absolute
+    ``time.perf_counter`` times that can be compared across processes.
+    """
+    origin = time.perf_counter() if origin is None else origin
+    _ACTIVE_RECORDERS.append((origin, spans))
+
+
+def stop_recording(spans):
+    for i, (_, recorder_spans) in enumerate(_ACTIVE_RECORDERS):
+        if recorder_spans is spans:
+            del _ACTIVE_RECORDERS[i]
+            return
+
+
+@contextmanager
+def record_spans(spans=None, origin=None):
+    """Record every span that ends inside this block into the spans list."""
+    spans = [] if spans is None else spans
+    start_recording(spans, origin=origin)
+    try:
+        yield spans
+    finally:
+        stop_recording(spans)
+
+
+@contextmanager
+def profile_span(name, **info):
+    """
+    Time the enclosed block. The yielded dict can be filled with extra
+    information that is stored together with the span.
+    """
+    if len(_ACTIVE_RECORDERS) == 0:
+        yield info
+        return
+    start_time = time.perf_counter()
+    try:
+        yield info
+    finally:
+        end_time = time.perf_counter()
+        for recorder_start_time, spans in _ACTIVE_RECORDERS:
+            spans.append(
+                {
+                    "name": name,
+                    "start": start_time - recorder_start_time,
+                    "duration": end_time - start_time,
+                    **info,
+                }
+            )
+
+
+def profiled(name):
+    """Decorator version of profile_span."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with profile_span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def aggregate_spans(spans_per_env):
+    """
+    Aggregate the spans of several environments, e.g. the workers of a vector env.
+
+    Returns:
+        dict: span name -> {"count", "total", "mean", "max", ...}, in order of first
+            occurrence. Extra numeric information of the spans is summed up.
+    """
+    summary = {}
+    for spans in spans_per_env:
+        for span in spans:
+            entry = summary.setdefault(
+                span["name"], {"count": 0, "total": 0.0, "mean": 0.0, "max": 0.0}
+            )
+            entry["count"] += 1
+            entry["total"] += span["duration"]
+            entry["max"] = max(entry["max"], span["duration"])
+            for key, value in span.items():
+                # Extra numeric information such as retries is summed up
+                if key not in ["name", "start", "duration"] and isinstance(
+                    value, (int, float)
+                ):
+                    entry[key] = entry.get(key, 0) + value
+    for entry in summary.values():
+        entry["mean"] = entry["total"] / entry["count"]
+    return summary
+
+
+def save_chrome_trace(spans_by_process, trace_file):
+    """
+    Save {process name: spans} in the Chrome trace event format, to be opened in
+    chrome://tracing or Perfetto. Spans should be recorded with origin=0.0.
+    """
+    all_starts = [span["start"] for spans in spans_by_process.values() for span in spans]
+    origin = min(all_starts) if len(all_starts) > 0 else 0.0
+    events = []
+    for pid, (process_name, spans) in enumerate(spans_by_process.items()):
+        events.append(
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": pid,
+                "args": {"name": process_name},
+            }
+        )
+        for span in spans:
+            events.append(
+                {
+                    "name": span["name"],
+                    "ph": "X",
+                    "pid": pid,
+                    "tid": 0,
+                    "ts": (span["start"] - origin) * 1e6,
+                    "dur": span["duration"] * 1e6,
+                    "args": {
+                        k: v
+                        for k, v in span.items()
+                        if k not in ["name", "start", "duration"]
+                    },
+                }
+            )
+    with open(trace_file, "w") as f:
+        json.dump({"traceEvents": events}, f)
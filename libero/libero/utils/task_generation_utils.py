@@ -1,6 +1,13 @@
+import hashlib
+import inspect
+import json
+import multiprocessing
 import os
+import time
+import traceback
 from collections import namedtuple
 
+import libero.libero.utils.bddl_generation_utils as bddl_generation_utils
 from libero.libero.utils.mu_utils import get_scene_class
 from libero.libero.utils.bddl_generation_utils import *
 
@@ -51,6 +58,22 @@ def get_suite_generator_func(workspace_name):
         return floor_task_suites_generator
 
 
+def generate_bddl_content(task_info_tuple):
+    """Generate the bddl file content of a registered task."""
+    scene = get_scene_class(task_info_tuple.scene_name)()
+    result = get_suite_generator_func(scene.workspace_name)(
+        language=task_info_tuple.language,
+        xy_region_kwargs_list=scene.xy_region_kwargs_list,
+        affordance_region_kwargs_list=scene.affordance_region_kwargs_list,
+        fixture_object_dict=scene.fixture_object_dict,
+        movable_object_dict=scene.movable_object_dict,
+        objects_of_interest=task_info_tuple.objects_of_interest,
+        init_states=scene.init_states,
+        goal_states=task_info_tuple.goal_states,
+    )
+    return get_result(result)
+
+
 def generate_bddl_from_task_info(folder="/tmp/pddl"):
     results = []
     failures = []
@@ -62,22 +85,9 @@ def generate_bddl_from_task_info(folder="/tmp/pddl"):
         for task_info_tuple in registered_task_info_dict[scene_name]:
             scene_name = task_info_tuple.scene_name
             language = task_info_tuple.language
-            objects_of_interest = task_info_tuple.objects_of_interest
-            goal_states = task_info_tuple.goal_states
-            scene = get_scene_class(scene_name)()
 
             try:
-                result = get_suite_generator_func(scene.workspace_name)(
-                    language=language,
-                    xy_region_kwargs_list=scene.xy_region_kwargs_list,
-                    affordance_region_kwargs_list=scene.affordance_region_kwargs_list,
-                    fixture_object_dict=scene.fixture_object_dict,
-                    movable_object_dict=scene.movable_object_dict,
-                    objects_of_interest=objects_of_interest,
-                    init_states=scene.init_states,
-                    goal_states=goal_states,
-                )
-                result = get_result(result)
+                result = generate_bddl_content(task_info_tuple)
                 bddl_file_name = save_to_file(
                     result, scene_name=scene_name, language=language, folder=folder
                 )
@@ -89,3 +99,154 @@ def generate_bddl_from_task_info(folder="/tmp/pddl"):
                 failures.append((scene_name, language))
     print(f"Succefully generated: {len(results)}")
     return bddl_file_names, failures
+
+
+def _hash_string(s):
+    return hashlib.sha1(s.encode("utf-8")).hexdigest()
+
+
+def _get_task_info_hash(task_info_tuple):
+    return _hash_string(json.dumps(list(task_info_tuple), default=str))
+
+
+def _get_source_hash(scene_name):
+    """
+    Hash of the source files of the scene class, its bases and the bddl
+    templates, so that generated files are regenerated when any of them changes.
+    """
+    source_files = {
+        inspect.getsourcefile(generate_bddl_content),
+        # the templates of every workspace
+        inspect.getsourcefile(bddl_generation_utils),
+    }
+    for scene_class in get_scene_class(scene_name).__mro__:
+        try:
+            source_files.add(inspect.getsourcefile(scene_class))
+        except TypeError:
+            # builtin classes have no source file
+            pass
+    source_hash = hashlib.sha1()
+    for source_file in sorted(f for f in source_files if f is not None):
+        source_hash.update(source_file.encode("utf-8"))
+        source_hash.update(str(_get_file_hash(source_file)).encode("utf-8"))
+    return source_hash.hexdigest()
+
+
+def _get_file_hash(file_name):
+    if not os.path.exists(file_name):
+        return None
+    with open(file_name, "r") as f:
+        return _hash_string(f.read())
+
+
+def _generate_bddl_worker(task_info_tuple):
+    start_time = time.time()
+    try:
+        result = generate_bddl_content(task_info_tuple)
+        error = None
+    except Exception:
+        result = None
+        error = traceback.format_exc()
+    return task_info_tuple, result, error, time.time() - start_time
+
+
+def _save_manifest(manifest, manifest_file):
+    tmp_file = manifest_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_file, manifest_file)
+
+
+def generate_bddl_suite(
+    folder="/tmp/pddl",
+    num_workers=None,
+    resume=True,
+    manifest_name="manifest.json",
+    batch_size=None,
+):
+    """
+    Generate the bddl files of all registered tasks with a process pool.
+
+    A manifest of successes and failures with timings is written to
+    ``folder/manifest_name`` after every ``batch_size`` (by default the number
+    of workers) finished tasks and at the end. With ``resume``, tasks whose
+    registration, scene and template sources and output file are unchanged
+    since the last run are skipped, so an interrupted generation continues
+    where it stopped. Files whose content hash is unchanged are not rewritten.
+
+    Scenes and tasks are registered in the calling process, so workers are
+    forked to inherit the registries.
+
+    Returns:
+        (list, list): generated bddl file names and (scene_name, language) failures.
+    """
+    os.makedirs(folder, exist_ok=True)
+    manifest_file = os.path.join(folder, manifest_name)
+    manifest = {}
+    if resume and os.path.exists(manifest_file):
+        with open(manifest_file, "r") as f:
+            manifest = json.load(f)
+
+    bddl_file_names = []
+    pending_tasks = []
+    source_hashes = {}
+    for scene_name, task_info_list in get_task_info().items():
+        source_hashes[scene_name] = _get_source_hash(scene_name)
+        for task_info_tuple in task_info_list:
+            bddl_file_name = get_bddl_file_name(
+                task_info_tuple.scene_name, task_info_tuple.language, folder=folder
+            )
+            entry = manifest.get(os.path.basename(bddl_file_name))
+            if (
+                entry is not None
+                and entry["status"] == "success"
+                and entry["task_info_hash"] == _get_task_info_hash(task_info_tuple)
+                and entry.get("source_hash") == source_hashes[scene_name]
+                and entry["content_hash"] == _get_file_hash(bddl_file_name)
+            ):
+                bddl_file_names.append(bddl_file_name)
+            else:
+                pending_tasks.append(task_info_tuple)
+    print(
+        f"[info] {len(bddl_file_names)} tasks up to date, generating {len(pending_tasks)} tasks"
+    )
+
+    failures = []
+    num_workers = num_workers or multiprocessing.cpu_count()
+    batch_size = batch_size or num_workers
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(min(num_workers, max(len(pending_tasks), 1))) as pool:
+        for (num_done, (task_info_tuple, result, error, elapsed_time)) in enumerate(
+            pool.imap_unordered(_generate_bddl_worker, pending_tasks), 1
+        ):
+            bddl_file_name = get_bddl_file_name(
+                task_info_tuple.scene_name, task_info_tuple.language, folder=folder
+            )
+            entry = {
+                "scene_name": task_info_tuple.scene_name,
+                "language": task_info_tuple.language,
+                "task_info_hash": _get_task_info_hash(task_info_tuple),
+                "source_hash": source_hashes[task_info_tuple.scene_name],
+                "time": elapsed_time,
+            }
+            if error is None:
+                content_hash = _hash_string(result)
+                if content_hash != _get_file_hash(bddl_file_name):
+                    save_to_file(
+                        result,
+                        scene_name=task_info_tuple.scene_name,
+                        language=task_info_tuple.language,
+                        folder=folder,
+                    )
+                entry.update({"status": "success", "content_hash": content_hash})
+                bddl_file_names.append(bddl_file_name)
+            else:
+                entry.update({"status": "failure", "error": error})
+                failures.append((task_info_tuple.scene_name, task_info_tuple.language))
+            manifest[os.path.basename(bddl_file_name)] = entry
+            if num_done % batch_size == 0:
+                _save_manifest(manifest, manifest_file)
+    _save_manifest(manifest, manifest_file)
+
+    print(f"Succefully generated: {len(bddl_file_names)}")
+    return bddl_file_names, failures
@@ -1,16 +1,95 @@
 import os
+import queue
+import subprocess
+import threading
 import imageio
 import numpy as np
 
 
+def _make_done_overlay_lut(transparency=0.7, tint=(0, 128, 0)):
+    """
+    Precompute the per-channel blending of a frame with the green "done" tint,
+    so that the overlay is a single table lookup instead of per-frame float math.
+    The result matches ``(image * (1 - transparency) + tint * transparency).astype(np.uint8)``.
+    """
+    values = np.arange(256, dtype=np.float64)[:, None]
+    tint = np.array(tint, dtype=np.float64)[None, :]
+    return (values * (1 - transparency) + tint * transparency).astype(np.uint8)
+
+
+_DONE_OVERLAY_LUT = _make_done_overlay_lut()
+_CHANNEL_INDEX = np.arange(3)
+
+
+class _StreamingEncoder:
+    """
+    Encodes frames on a background thread. Frames are pushed to a bounded queue
+    so memory stays O(queue_size) and encoding overlaps with simulation.
+    """
+
+    def __init__(self, video_path, fps, queue_size):
+        self.video_path = video_path
+        self.fps = fps
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.writers = {}
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue
+            idx, img = item
+            try:
+                if idx not in self.writers:
+                    self.writers[idx] = imageio.get_writer(
+                        os.path.join(self.video_path, f"{idx}.mp4"), fps=self.fps
+                    )
+                self.writers[idx].append_data(img)
+            except Exception as e:
+                self.error = e
+        for video_writer in self.writers.values():
+            video_writer.close()
+
+    def put(self, idx, img):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((idx, img))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return sorted(self.writers.keys())
+
+
 class VideoWriter:
-    def __init__(self, video_path, save_video=False, fps=30, single_video=True):
+    def __init__(
+        self,
+        video_path,
+        save_video=False,
+        fps=30,
+        single_video=True,
+        streaming=False,
+        queue_size=64,
+    ):
         self.video_path = video_path
         self.save_video = save_video
         self.fps = fps
         self.image_buffer = {}
         self.last_images = {}
+        self.done_images = {}
         self.single_video = single_video
+        # In streaming mode frames are encoded into per-env videos on a
+        # background thread instead of being buffered until save()
+        self.streaming = streaming
+        self.queue_size = queue_size
+        self.encoder = None
 
     def __enter__(self):
         return self
@@ -18,47 +97,97 @@ class VideoWriter:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.save()
 
-    def append_image(self, img, idx=0):
-        """Directly append an image to the video."""
-        if self.save_video:
+    def _append(self, img, idx):
+        if self.streaming:
+            if self.encoder is None:
+                os.makedirs(self.video_path, exist_ok=True)
+                self.encoder = _StreamingEncoder(
+                    self.video_path, self.fps, self.queue_size
+                )
+            self.encoder.put(idx, img)
+        else:
             if idx not in self.image_buffer:
                 self.image_buffer[idx] = []
             self.image_buffer[idx].append(img)
 
+    def append_image(self, img, idx=0):
+        """Directly append an image to the video."""
+        if self.save_video:
+            self._append(img, idx)
+
     def append_obs(self, obs, done, idx=0, camera_name="agentview_image"):
         """Append a camera observation to the video."""
         if self.save_video:
-            if idx not in self.image_buffer:
-                self.image_buffer[idx] = []
             if idx not in self.last_images:
                 self.last_images[idx] = None
             if not done:
-                self.image_buffer[idx].append(obs[camera_name][::-1])
+                self._append(np.ascontiguousarray(obs[camera_name][::-1]), idx)
             else:
                 if self.last_images[idx] is None:
                     self.last_images[idx] = obs[camera_name][::-1]
-                original_image = np.copy(self.last_images[idx])
-                blank_image = np.ones_like(original_image) * 128
-                blank_image[:, :, 0] = 0
-                blank_image[:, :, -1] = 0
-                transparency = 0.7
-                original_image = (
-                    original_image * (1 - transparency) + blank_image * transparency
-                )
-
-                self.image_buffer[idx].append(original_image.astype(np.uint8))
+                # The overlay of a finished env does not change, compute it once
+                if idx not in self.done_images:
+                    self.done_images[idx] = _DONE_OVERLAY_LUT[
+                        self.last_images[idx], _CHANNEL_INDEX
+                    ]
+                self._append(self.done_images[idx], idx)
 
     def reset(self):
         if self.save_video:
             self.last_images = {}
+            self.done_images = {}
 
     def append_vector_obs(self, obs, dones, camera_name="agentview_image"):
         if self.save_video:
             for i in range(len(obs)):
                 self.append_obs(obs[i], dones[i], i, camera_name)
 
+    def _merge_streamed_videos(self, indices):
+        """
+        Concatenate the per-env videos into video.mp4 without re-encoding them.
+        They share the codec, resolution and fps, so the ffmpeg concat demuxer
+        only copies the encoded streams.
+        """
+        import imageio_ffmpeg
+
+        video_name = os.path.join(self.video_path, f"video.mp4")
+        list_name = os.path.join(self.video_path, f"videos.txt")
+        with open(list_name, "w") as f:
+            for idx in indices:
+                # paths are relative to the list file
+                f.write(f"file '{idx}.mp4'\n")
+        subprocess.run(
+            [
+                imageio_ffmpeg.get_ffmpeg_exe(),
+                "-y",
+                "-loglevel",
+                "error",
+                "-f",
+                "concat",
+                "-safe",
+                "0",
+                "-i",
+                list_name,
+                "-c",
+                "copy",
+                video_name,
+            ],
+            check=True,
+        )
+        os.remove(list_name)
+        for idx in indices:
+            os.remove(os.path.join(self.video_path, f"{idx}.mp4"))
+
     def save(self):
         if self.save_video:
+            if self.streaming:
+                if self.encoder is not None:
+                    indices = self.encoder.close()
+                    self.encoder = None
+                    if self.single_video:
+                        self._merge_streamed_videos(indices)
+                print(f"Saved videos to {self.video_path}.")
+                return
             os.makedirs(self.video_path, exist_ok=True)
             if self.single_video:
                 video_name = os.path.join(self.video_path, f"video.mp4")
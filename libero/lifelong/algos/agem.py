@@ -87,6 +87,9 @@ class AGEM(ER):
         self.optimizer.zero_grad()
         loss = self.policy.compute_loss(data)
         (loss * self.loss_scale).backward()
+        # both gradients are averaged before the projection, so that every
+        # process projects the same way
+        self.sync_gradients()
 
         if self.buffer is not None:
             store_grad(self.policy.parameters, self.grad_xy, self.grad_dims)
@@ -96,6 +99,7 @@ class AGEM(ER):
             buf_data = self.map_tensor_to_device(buf_data)
             buf_loss = self.policy.compute_loss(buf_data)
             buf_loss.backward()
+            self.sync_gradients()
             store_grad(self.policy.parameters, self.grad_er, self.grad_dims)
 
             dot_prod = torch.dot(self.grad_xy, self.grad_er)
@@ -6,8 +6,22 @@ import robomimic.utils.tensor_utils as TensorUtils
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torch.utils.data import DataLoader, RandomSampler
-
+from torch.utils.data import DataLoader
+
+from libero.lifelong.datasets import (
+    DistributedTaskBalancedSampler,
+    ResumableRandomSampler,
+    collate_batch,
+)
+from libero.lifelong.distributed import (
+    all_reduce_gradients,
+    all_reduce_mean,
+    broadcast_module,
+    get_rank,
+    get_world_size,
+    is_distributed,
+    is_main_process,
+)
 from libero.lifelong.metric import *
 from libero.lifelong.models import *
 from libero.lifelong.utils import *
@@ -72,6 +86,161 @@ class Sequential(nn.Module, metaclass=AlgoMeta):
 
         self.policy = get_policy_class(cfg.policy.policy_type)(cfg, cfg.shape_meta)
         self.current_task = -1
+        self.async_evaluator = None
+        self.checkpoint_manager = None
+        # snapshot of an interrupted task, see restore_training_state
+        self.resume_state = None
+
+    def get_algo_state(self):
+        """
+        Algorithm-specific state needed to resume training, e.g. the replay
+        datasets or the EWC Fisher information.
+        """
+        return {}
+
+    def set_algo_state(self, state, datasets):
+        """Restore get_algo_state, datasets are those of all lifelong tasks."""
+        pass
+
+    def save_training_state(
+        self, result_summary, task_id, epoch=0, batch=0, progress=None
+    ):
+        """
+        Snapshot everything needed to resume training at the given task, epoch
+        and batch. progress holds the metrics of the current task so far, it is
+        None at task boundaries. Only the main process of a distributed run
+        writes the snapshot.
+        """
+        if not is_main_process():
+            return
+        # the best checkpoint of the task must be on disk as well
+        self.wait_for_checkpoints()
+        in_task = progress is not None
+        save_training_state(
+            self.experiment_dir,
+            {
+                "task_id": task_id,
+                "epoch": epoch,
+                "batch": batch,
+                "progress": progress,
+                "policy": self.policy.state_dict(),
+                "optimizer": self.optimizer.state_dict() if in_task else None,
+                "scheduler": self.scheduler.state_dict()
+                if in_task and self.scheduler is not None
+                else None,
+                "rng": get_rng_state(),
+                "result_summary": result_summary,
+                "algo_state": self.get_algo_state(),
+            },
+        )
+
+    def restore_training_state(self, state, datasets):
+        """
+        Restore a snapshot at the start of a resumed run and return the task to
+        start from. An interrupted task is resumed by resume_task.
+        """
+        self.policy.load_state_dict(state["policy"])
+        self.set_algo_state(state["algo_state"], datasets)
+        set_rng_state(state["rng"])
+        if state["progress"] is not None:
+            self.resume_state = state
+        return state["task_id"]
+
+    def resume_task(self, task_id):
+        """
+        Called after start_task. If task_id was interrupted, restore its policy,
+        optimizer and scheduler and return its snapshot, otherwise return None.
+        """
+        state, self.resume_state = self.resume_state, None
+        if state is None:
+            return None
+        assert (
+            state["task_id"] == task_id
+        ), f"[error] the snapshot is of task {state['task_id']}, not {task_id}"
+        self.policy.load_state_dict(state["policy"])
+        self.optimizer.load_state_dict(state["optimizer"])
+        if self.scheduler is not None:
+            self.scheduler.load_state_dict(state["scheduler"])
+        print(
+            f"[info] resuming task {task_id} at epoch {state['epoch']}, batch {state['batch']}"
+        )
+        return state
+
+    def get_checkpoint_manager(self):
+        """
+        The checkpoint writer configured by train.checkpoint, created on first
+        use. Returns None for configs without a checkpoint section.
+        """
+        checkpoint_cfg = self.cfg.train.get("checkpoint", None)
+        if checkpoint_cfg is None:
+            return None
+        if self.checkpoint_manager is None:
+            from libero.lifelong.checkpoint_manager import CheckpointManager
+
+            self.checkpoint_manager = CheckpointManager(
+                self.experiment_dir,
+                cfg=self.cfg,
+                save_format=checkpoint_cfg.get("format", "pth"),
+                keep_last=checkpoint_cfg.get("keep_last", None),
+                keep_best=checkpoint_cfg.get("keep_best", None),
+            )
+        return self.checkpoint_manager
+
+    def save_checkpoint(
+        self, model_path, previous_masks=None, group=None, metric=None, weights=None
+    ):
+        """
+        Save the policy, or the given weights (a state dict) instead, in the
+        background if train.checkpoint.async_write is set. Call
+        wait_for_checkpoints before reading the file back. Only the main
+        process of a distributed run saves checkpoints.
+        """
+        if not is_main_process():
+            return
+        model = self.policy if weights is None else weights
+        manager = self.get_checkpoint_manager()
+        if manager is None:
+            torch_save_model(
+                model, model_path, cfg=self.cfg, previous_masks=previous_masks
+            )
+            return
+        manager.save(
+            model,
+            model_path,
+            previous_masks=previous_masks,
+            group=group,
+            metric=metric,
+        )
+        if not self.cfg.train.checkpoint.get("async_write", True):
+            manager.wait()
+
+    def wait_for_checkpoints(self):
+        if self.checkpoint_manager is not None:
+            self.checkpoint_manager.wait()
+
+    def get_async_evaluator(self):
+        """
+        The background evaluation service, if eval.async_eval is set. It is
+        created on first use and kept across tasks, together with its envs.
+        Only the main process of a distributed run evaluates.
+        """
+        if not self.cfg.eval.get("async_eval", False) or not is_main_process():
+            return None
+        # the evaluation process only has the policy weights, not the state
+        # that get_eval_algo needs (e.g. the PackNet masks)
+        assert not hasattr(
+            self, "get_eval_algo"
+        ), f"[error] eval.async_eval is not supported by {self.cfg.lifelong.algo}"
+        if self.async_evaluator is None:
+            from libero.lifelong.async_eval import AsyncEvaluator
+
+            self.async_evaluator = AsyncEvaluator(
+                self.cfg,
+                self.n_tasks,
+                self.policy,
+                num_slots=self.cfg.eval.get("async_eval_slots", 2),
+            )
+        return self.async_evaluator
 
     def end_task(self, dataset, task_id, benchmark, env=None):
         """
@@ -98,6 +267,31 @@ class Sequential(nn.Module, metaclass=AlgoMeta):
                 **self.cfg.train.scheduler.kwargs,
             )
 
+        # the processes of a distributed run start from the same weights
+        broadcast_module(self.policy)
+
+    def get_train_sampler(self, dataset):
+        """
+        The training sampler, which shards the data over the processes of a
+        distributed run.
+        """
+        if is_distributed():
+            return DistributedTaskBalancedSampler(
+                dataset,
+                num_replicas=get_world_size(),
+                rank=get_rank(),
+                seed=self.cfg.seed,
+            )
+        return ResumableRandomSampler(dataset, seed=self.cfg.seed)
+
+    def sync_gradients(self):
+        """
+        Average the gradients over the processes of a distributed run. The
+        algorithms call it after each backward pass, before the gradients are
+        used.
+        """
+        all_reduce_gradients(self.policy.parameters())
+
     def map_tensor_to_device(self, data):
         """Move data to the device specified by self.cfg.device."""
         return TensorUtils.map_tensor(
@@ -112,6 +306,7 @@ class Sequential(nn.Module, metaclass=AlgoMeta):
         self.optimizer.zero_grad()
         loss = self.policy.compute_loss(data)
         (self.loss_scale * loss).backward()
+        self.sync_gradients()
         if self.cfg.train.grad_clip is not None:
             grad_norm = nn.utils.clip_grad_norm_(
                 self.policy.parameters(), self.cfg.train.grad_clip
@@ -137,11 +332,13 @@ class Sequential(nn.Module, metaclass=AlgoMeta):
             self.experiment_dir, f"task{task_id}_model.pth"
         )
 
+        train_sampler = self.get_train_sampler(dataset)
         train_dataloader = DataLoader(
             dataset,
             batch_size=self.cfg.train.batch_size,
             num_workers=self.cfg.train.num_workers,
-            sampler=RandomSampler(dataset),
+            sampler=train_sampler,
+            collate_fn=collate_batch,
             persistent_workers=True,
         )
 
@@ -155,20 +352,99 @@ class Sequential(nn.Module, metaclass=AlgoMeta):
         successes = []
         losses = []
 
+        # continue an interrupted task from its snapshot
+        start_epoch, start_batch, partial_loss = 0, 0, 0.0
+        pending_evaluations = []
+        resume_state = self.resume_task(task_id)
+        if resume_state is not None:
+            progress = resume_state["progress"]
+            pending_evaluations = progress.get("pending_evaluations", [])
+            prev_success_rate = progress["prev_success_rate"]
+            cumulated_counter = progress["cumulated_counter"]
+            idx_at_best_succ = progress["idx_at_best_succ"]
+            successes = progress["successes"]
+            losses = progress["losses"]
+            partial_loss = progress["training_loss"]
+            start_epoch, start_batch = resume_state["epoch"], resume_state["batch"]
+
         task = benchmark.get_task(task_id)
         task_emb = benchmark.get_task_emb(task_id)
+        evaluator = self.get_async_evaluator()
+
+        def submit_evaluation(weights, epoch):
+            evaluator.submit(weights, epoch, [(task_id, task, task_emb)])
+
+        def record_success(epoch, success_rate, eval_time, weights=None):
+            # weights are those of an asynchronous evaluation, the current
+            # policy is saved otherwise
+            nonlocal prev_success_rate, idx_at_best_succ, cumulated_counter
+            successes.append(success_rate)
+
+            if prev_success_rate < success_rate:
+                self.save_checkpoint(model_checkpoint_name, weights=weights)
+                prev_success_rate = success_rate
+                idx_at_best_succ = len(successes) - 1
+
+            cumulated_counter += 1.0
+            ci = confidence_interval(success_rate, self.cfg.eval.n_eval)
+            tmp_successes = np.array(successes)
+            tmp_successes[idx_at_best_succ:] = successes[idx_at_best_succ]
+            if is_main_process():
+                print(
+                    f"[info] Epoch: {epoch:3d} | succ: {success_rate:4.2f} ± {ci:4.2f} | best succ: {prev_success_rate} "
+                    + f"| succ. AoC {tmp_successes.sum()/cumulated_counter:4.2f} | time: {eval_time/60:4.2f}",
+                    flush=True,
+                )
+
+        def snapshot(epoch, batch=0, training_loss=0.0):
+            # the evaluations still running are resubmitted on resume, so that
+            # snapshots do not wait for them
+            pending = []
+            if evaluator is not None:
+                for eval_epoch, success_rates, eval_time, weights in evaluator.poll():
+                    record_success(eval_epoch, success_rates[0], eval_time, weights)
+                pending = evaluator.get_pending()
+            progress = {
+                "prev_success_rate": prev_success_rate,
+                "cumulated_counter": cumulated_counter,
+                "idx_at_best_succ": idx_at_best_succ,
+                "successes": successes,
+                "losses": losses,
+                "training_loss": training_loss,
+                "pending_evaluations": pending,
+            }
+            self.save_training_state(result_summary, task_id, epoch, batch, progress)
+
+        if evaluator is not None:
+            for eval_epoch, weights in pending_evaluations:
+                submit_evaluation(weights, eval_epoch)
+        elif len(pending_evaluations) > 0:
+            print(
+                f"[warning] dropping {len(pending_evaluations)} pending evaluations "
+                + "of the snapshot, eval.async_eval is off"
+            )
+
+        snapshot_every = self.cfg.train.get("snapshot_every", None)
+        snapshot_every_iters = self.cfg.train.get("snapshot_every_iters", None)
 
         # start training
-        for epoch in range(0, self.cfg.train.n_epochs + 1):
+        for epoch in range(start_epoch, self.cfg.train.n_epochs + 1):
 
             t0 = time.time()
+            train_sampler.set_epoch(epoch, start_batch * self.cfg.train.batch_size)
 
             if epoch > 0:  # update
                 self.policy.train()
-                training_loss = 0.0
-                for (idx, data) in enumerate(train_dataloader):
+                training_loss = partial_loss
+                for (idx, data) in enumerate(train_dataloader, start_batch):
                     loss = self.observe(data)
                     training_loss += loss
+                    if (
+                        snapshot_every_iters
+                        and (idx + 1) % snapshot_every_iters == 0
+                        and idx + 1 < len(train_dataloader)
+                    ):
+                        snapshot(epoch, idx + 1, training_loss)
                 training_loss /= len(train_dataloader)
             else:  # just evaluate the zero-shot performance on 0-th epoch
                 training_loss = 0.0
@@ -176,11 +452,14 @@ class Sequential(nn.Module, metaclass=AlgoMeta):
                     loss = self.eval_observe(data)
                     training_loss += loss
                 training_loss /= len(train_dataloader)
+            start_batch, partial_loss = 0, 0.0
+            training_loss = all_reduce_mean(training_loss)
             t1 = time.time()
 
-            print(
-                f"[info] Epoch: {epoch:3d} | train loss: {training_loss:5.2f} | time: {(t1-t0)/60:4.2f}"
-            )
+            if is_main_process():
+                print(
+                    f"[info] Epoch: {epoch:3d} | train loss: {training_loss:5.2f} | time: {(t1-t0)/60:4.2f}"
+                )
 
             if epoch % self.cfg.eval.eval_every == 0:  # evaluate BC loss
                 # every eval_every epoch, we evaluate the agent on the current task,
@@ -191,45 +470,53 @@ class Sequential(nn.Module, metaclass=AlgoMeta):
                 # epoch by also considering the agent's performance on old tasks.
                 losses.append(training_loss)
 
-                t0 = time.time()
-
-                task_str = f"k{task_id}_e{epoch//self.cfg.eval.eval_every}"
-                sim_states = (
-                    result_summary[task_str] if self.cfg.eval.save_sim_states else None
-                )
-                success_rate = evaluate_one_task_success(
-                    cfg=self.cfg,
-                    algo=self,
-                    task=task,
-                    task_emb=task_emb,
-                    task_id=task_id,
-                    sim_states=sim_states,
-                    task_str="",
-                )
-                successes.append(success_rate)
-
-                if prev_success_rate < success_rate:
-                    torch_save_model(self.policy, model_checkpoint_name, cfg=self.cfg)
-                    prev_success_rate = success_rate
-                    idx_at_best_succ = len(losses) - 1
-
-                t1 = time.time()
-
-                cumulated_counter += 1.0
-                ci = confidence_interval(success_rate, self.cfg.eval.n_eval)
-                tmp_successes = np.array(successes)
-                tmp_successes[idx_at_best_succ:] = successes[idx_at_best_succ]
-                print(
-                    f"[info] Epoch: {epoch:3d} | succ: {success_rate:4.2f} ± {ci:4.2f} | best succ: {prev_success_rate} "
-                    + f"| succ. AoC {tmp_successes.sum()/cumulated_counter:4.2f} | time: {(t1-t0)/60:4.2f}",
-                    flush=True,
-                )
+                if evaluator is not None:
+                    submit_evaluation(self.policy, epoch)
+                else:
+                    t0 = time.time()
+
+                    # only the main process of a distributed run evaluates
+                    if is_main_process():
+                        task_str = f"k{task_id}_e{epoch//self.cfg.eval.eval_every}"
+                        sim_states = (
+                            result_summary[task_str]
+                            if self.cfg.eval.save_sim_states
+                            else None
+                        )
+                        success_rate = evaluate_one_task_success(
+                            cfg=self.cfg,
+                            algo=self,
+                            task=task,
+                            task_emb=task_emb,
+                            task_id=task_id,
+                            sim_states=sim_states,
+                            task_str="",
+                        )
+                    else:
+                        success_rate = 0.0
+
+                    t1 = time.time()
+                    record_success(epoch, success_rate, t1 - t0)
+
+            if evaluator is not None:
+                for eval_epoch, success_rates, eval_time, weights in evaluator.poll():
+                    record_success(eval_epoch, success_rates[0], eval_time, weights)
 
             if self.scheduler is not None and epoch > 0:
                 self.scheduler.step()
 
+            if snapshot_every and (epoch + 1) % snapshot_every == 0:
+                snapshot(epoch + 1)
+
+        if evaluator is not None:
+            for eval_epoch, success_rates, eval_time, weights in evaluator.wait_all():
+                record_success(eval_epoch, success_rates[0], eval_time, weights)
+
         # load the best performance agent on the current task
-        self.policy.load_state_dict(torch_load_model(model_checkpoint_name)[0])
+        self.wait_for_checkpoints()
+        if is_main_process():
+            self.policy.load_state_dict(torch_load_model(model_checkpoint_name)[0])
+        broadcast_module(self.policy)
 
         # end learning the current task, some algorithms need post-processing
         self.end_task(dataset, task_id, benchmark)
@@ -240,13 +527,14 @@ class Sequential(nn.Module, metaclass=AlgoMeta):
         auc_checkpoint_name = os.path.join(
             self.experiment_dir, f"task{task_id}_auc.log"
         )
-        torch.save(
-            {
-                "success": successes,
-                "loss": losses,
-            },
-            auc_checkpoint_name,
-        )
+        if is_main_process():
+            torch.save(
+                {
+                    "success": successes,
+                    "loss": losses,
+                },
+                auc_checkpoint_name,
+            )
 
         # pretend that the agent stops learning once it reaches the peak performance
         losses[idx_at_best_succ:] = losses[idx_at_best_succ]
@@ -5,10 +5,14 @@ import robomimic.utils.tensor_utils as TensorUtils
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torch.utils.data import ConcatDataset, RandomSampler
+from torch.utils.data import RandomSampler
 
 from libero.lifelong.algos.base import Sequential
-from libero.lifelong.datasets import TruncatedSequenceDataset
+from libero.lifelong.datasets import (
+    ConcatSequenceDataset,
+    TruncatedSequenceDataset,
+    collate_batch,
+)
 from libero.lifelong.utils import *
 
 
@@ -54,13 +58,14 @@ class ER(Sequential):
                 for dataset in self.datasets
             ]
 
-            buf = ConcatDataset(buffers)
+            buf = ConcatSequenceDataset(buffers)
             self.buffer = cycle(
                 DataLoader(
                     buf,
                     batch_size=self.cfg.train.batch_size,
                     num_workers=self.cfg.train.num_workers,
                     sampler=RandomSampler(buf),
+                    collate_fn=collate_batch,
                     persistent_workers=True,
                 )
             )
@@ -68,6 +73,13 @@ class ER(Sequential):
     def end_task(self, dataset, task_id, benchmark):
         self.datasets.append(dataset)
 
+    def get_algo_state(self):
+        # the replay buffers are rebuilt from the datasets of the finished tasks
+        return {"n_datasets": len(self.datasets)}
+
+    def set_algo_state(self, state, datasets):
+        self.datasets = list(datasets[: state["n_datasets"]])
+
     def observe(self, data):
         if self.buffer is not None:
             buf_data = next(self.buffer)
@@ -78,6 +90,7 @@ class ER(Sequential):
         self.optimizer.zero_grad()
         loss = self.policy.compute_loss(data)
         (self.loss_scale * loss).backward()
+        self.sync_gradients()
         if self.cfg.train.grad_clip is not None:
             grad_norm = nn.utils.clip_grad_norm_(
                 self.policy.parameters(), self.cfg.train.grad_clip
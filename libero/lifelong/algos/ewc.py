@@ -6,6 +6,7 @@ import torch.nn.functional as F
 from torch.utils.data import DataLoader
 
 from libero.lifelong.algos.base import Sequential
+from libero.lifelong.datasets import collate_batch
 from libero.lifelong.utils import *
 
 
@@ -48,6 +49,7 @@ class EWC(Sequential):
             batch_size=self.cfg.train.batch_size,
             shuffle=True,
             num_workers=self.cfg.train.num_workers,
+            collate_fn=collate_batch,
         )
 
         for data in dataloader:
@@ -70,6 +72,13 @@ class EWC(Sequential):
 
         self.checkpoint = self.get_params().data.clone()
 
+    def get_algo_state(self):
+        return {"checkpoint": self.checkpoint, "fish": self.fish}
+
+    def set_algo_state(self, state, datasets):
+        self.checkpoint = state["checkpoint"]
+        self.fish = state["fish"]
+
     def observe(self, data):
         data = self.map_tensor_to_device(data)
         self.optimizer.zero_grad()
@@ -79,6 +88,7 @@ class EWC(Sequential):
             loss += self.cfg.lifelong.e_lambda * self.penalty()
         assert not torch.isnan(loss)
         (loss * self.loss_scale).backward()
+        self.sync_gradients()
         if self.cfg.train.grad_clip is not None:
             grad_norm = nn.utils.clip_grad_norm_(
                 self.policy.parameters(), self.cfg.train.grad_clip
@@ -4,9 +4,15 @@ import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torch.utils.data import ConcatDataset, DataLoader, RandomSampler
+from torch.utils.data import DataLoader
 
 from libero.lifelong.algos.base import Sequential
+from libero.lifelong.datasets import ConcatSequenceDataset, collate_batch
+from libero.lifelong.distributed import (
+    all_reduce_mean,
+    broadcast_module,
+    is_main_process,
+)
 from libero.lifelong.metric import *
 from libero.lifelong.models import *
 from libero.lifelong.utils import *
@@ -22,7 +28,7 @@ class Multitask(Sequential):
 
     def learn_all_tasks(self, datasets, benchmark, result_summary):
         self.start_task(-1)
-        concat_dataset = ConcatDataset(datasets)
+        concat_dataset = ConcatSequenceDataset(datasets)
 
         # learn on all tasks, only used in multitask learning
         model_checkpoint_name = os.path.join(
@@ -30,11 +36,14 @@ class Multitask(Sequential):
         )
         all_tasks = list(range(benchmark.n_tasks))
 
+        # in a distributed run, each process trains on its shard of every task
+        train_sampler = self.get_train_sampler(concat_dataset)
         train_dataloader = DataLoader(
             concat_dataset,
             batch_size=self.cfg.train.batch_size,
             num_workers=self.cfg.train.num_workers,
-            sampler=RandomSampler(concat_dataset),
+            sampler=train_sampler,
+            collate_fn=collate_batch,
             persistent_workers=True,
         )
 
@@ -48,16 +57,122 @@ class Multitask(Sequential):
         successes = []
         losses = []
 
+        # continue an interrupted training from its snapshot, the multitask
+        # training is snapshotted as task 0
+        start_epoch, start_batch, partial_loss = 0, 0, 0.0
+        pending_evaluations = []
+        resume_state = self.resume_task(0)
+        if resume_state is not None:
+            progress = resume_state["progress"]
+            pending_evaluations = progress.get("pending_evaluations", [])
+            prev_success_rate = progress["prev_success_rate"]
+            cumulated_counter = progress["cumulated_counter"]
+            idx_at_best_succ = progress["idx_at_best_succ"]
+            successes = progress["successes"]
+            losses = progress["losses"]
+            partial_loss = progress["training_loss"]
+            start_epoch, start_batch = resume_state["epoch"], resume_state["batch"]
+
+        # evaluation in a background process, see Sequential.get_async_evaluator
+        evaluator = (
+            self.get_async_evaluator() if self.cfg.lifelong.eval_in_train else None
+        )
+
+        def get_epoch_checkpoint_name(epoch):
+            return os.path.join(self.experiment_dir, f"multitask_model_ep{epoch}.pth")
+
+        def submit_evaluation(weights, epoch):
+            evaluator.submit(
+                weights,
+                epoch,
+                [
+                    (i, benchmark.get_task(i), benchmark.get_task_emb(i))
+                    for i in all_tasks
+                ],
+            )
+
+        def record_success(epoch, success_rate, eval_time, weights=None):
+            # weights are those of an asynchronous evaluation, the current
+            # policy is saved otherwise
+            nonlocal prev_success_rate, idx_at_best_succ, cumulated_counter
+            successes.append(success_rate)
+
+            if (
+                self.cfg.lifelong.eval_in_train
+                and self.checkpoint_manager is not None
+            ):
+                # ranks the epoch checkpoints for the keep_best retention
+                self.checkpoint_manager.set_metric(
+                    get_epoch_checkpoint_name(epoch), success_rate
+                )
+
+            if prev_success_rate < success_rate and (not self.cfg.pretrain):
+                self.save_checkpoint(model_checkpoint_name, weights=weights)
+                prev_success_rate = success_rate
+                idx_at_best_succ = len(successes) - 1
+
+            cumulated_counter += 1.0
+            ci = confidence_interval(success_rate, self.cfg.eval.n_eval)
+            tmp_successes = np.array(successes)
+            tmp_successes[idx_at_best_succ:] = successes[idx_at_best_succ]
+
+            if self.cfg.lifelong.eval_in_train:
+                print(
+                    f"[info] Epoch: {epoch:3d} | succ: {success_rate:4.2f} ± {ci:4.2f} | best succ: {prev_success_rate} "
+                    + f"| succ. AoC {tmp_successes.sum()/cumulated_counter:4.2f} | time: {eval_time/60:4.2f}",
+                    flush=True,
+                )
+
+        def snapshot(epoch, batch=0, training_loss=0.0):
+            # the evaluations still running are resubmitted on resume, so that
+            # snapshots do not wait for them
+            pending = []
+            if evaluator is not None:
+                for eval_epoch, success_rates, eval_time, weights in evaluator.poll():
+                    record_success(
+                        eval_epoch, np.mean(success_rates), eval_time, weights
+                    )
+                pending = evaluator.get_pending()
+            progress = {
+                "prev_success_rate": prev_success_rate,
+                "cumulated_counter": cumulated_counter,
+                "idx_at_best_succ": idx_at_best_succ,
+                "successes": successes,
+                "losses": losses,
+                "training_loss": training_loss,
+                "pending_evaluations": pending,
+            }
+            self.save_training_state(result_summary, 0, epoch, batch, progress)
+
+        if evaluator is not None:
+            for eval_epoch, weights in pending_evaluations:
+                submit_evaluation(weights, eval_epoch)
+        elif len(pending_evaluations) > 0 and is_main_process():
+            print(
+                f"[warning] dropping {len(pending_evaluations)} pending evaluations "
+                + "of the snapshot, eval.async_eval is off"
+            )
+
+        snapshot_every = self.cfg.train.get("snapshot_every", None)
+        snapshot_every_iters = self.cfg.train.get("snapshot_every_iters", None)
+
         # start training
-        for epoch in range(0, self.cfg.train.n_epochs + 1):
+        for epoch in range(start_epoch, self.cfg.train.n_epochs + 1):
 
             t0 = time.time()
+            train_sampler.set_epoch(epoch, start_batch * self.cfg.train.batch_size)
             if epoch > 0 or (self.cfg.pretrain):  # update
                 self.policy.train()
-                training_loss = 0.0
-                for (idx, data) in enumerate(train_dataloader):
+                training_loss = partial_loss
+                for (idx, data) in enumerate(train_dataloader, start_batch):
                     loss = self.observe(data)
                     training_loss += loss
+                    if (
+                        snapshot_every_iters
+                        and (idx + 1) % snapshot_every_iters == 0
+                        and idx + 1 < len(train_dataloader)
+                    ):
+                        snapshot(epoch, idx + 1, training_loss)
                 training_loss /= len(train_dataloader)
             else:  # just evaluate the zero-shot performance on 0-th epoch
                 training_loss = 0.0
@@ -65,60 +180,67 @@ class Multitask(Sequential):
                     loss = self.eval_observe(data)
                     training_loss += loss
                 training_loss /= len(train_dataloader)
+            start_batch, partial_loss = 0, 0.0
+            training_loss = all_reduce_mean(training_loss)
             t1 = time.time()
 
-            print(
-                f"[info] Epoch: {epoch:3d} | train loss: {training_loss:5.2f} | time: {(t1-t0)/60:4.2f}"
-            )
+            if is_main_process():
+                print(
+                    f"[info] Epoch: {epoch:3d} | train loss: {training_loss:5.2f} | time: {(t1-t0)/60:4.2f}"
+                )
 
             if epoch % self.cfg.eval.eval_every == 0:  # evaluate BC loss
                 t0 = time.time()
                 self.policy.eval()
 
-                model_checkpoint_name_ep = os.path.join(
-                    self.experiment_dir, f"multitask_model_ep{epoch}.pth"
+                self.save_checkpoint(
+                    get_epoch_checkpoint_name(epoch), group="multitask_model_ep"
                 )
-                torch_save_model(self.policy, model_checkpoint_name_ep, cfg=self.cfg)
                 losses.append(training_loss)
 
                 # for multitask learning, we provide an option whether to evaluate
                 # the agent once every eval_every epochs on all tasks, note that
                 # this can be quite computationally expensive. Nevertheless, we
                 # save the checkpoints, so users can always evaluate afterwards.
-                if self.cfg.lifelong.eval_in_train:
-                    success_rates = evaluate_multitask_training_success(
-                        self.cfg, self, benchmark, all_tasks
-                    )
-                    success_rate = np.mean(success_rates)
+                if evaluator is not None:
+                    submit_evaluation(self.policy, epoch)
                 else:
-                    success_rate = 0.0
-                successes.append(success_rate)
-
-                if prev_success_rate < success_rate and (not self.cfg.pretrain):
-                    torch_save_model(self.policy, model_checkpoint_name, cfg=self.cfg)
-                    prev_success_rate = success_rate
-                    idx_at_best_succ = len(losses) - 1
-
-                t1 = time.time()
-
-                cumulated_counter += 1.0
-                ci = confidence_interval(success_rate, self.cfg.eval.n_eval)
-                tmp_successes = np.array(successes)
-                tmp_successes[idx_at_best_succ:] = successes[idx_at_best_succ]
-
-                if self.cfg.lifelong.eval_in_train:
-                    print(
-                        f"[info] Epoch: {epoch:3d} | succ: {success_rate:4.2f} ± {ci:4.2f} | best succ: {prev_success_rate} "
-                        + f"| succ. AoC {tmp_successes.sum()/cumulated_counter:4.2f} | time: {(t1-t0)/60:4.2f}",
-                        flush=True,
+                    # only the main process of a distributed run evaluates
+                    if self.cfg.lifelong.eval_in_train and is_main_process():
+                        success_rates = evaluate_multitask_training_success(
+                            self.cfg, self, benchmark, all_tasks
+                        )
+                        success_rate = np.mean(success_rates)
+                    else:
+                        success_rate = 0.0
+
+                    t1 = time.time()
+                    record_success(epoch, success_rate, t1 - t0)
+
+            if evaluator is not None:
+                for eval_epoch, success_rates, eval_time, weights in evaluator.poll():
+                    record_success(
+                        eval_epoch, np.mean(success_rates), eval_time, weights
                     )
 
             if self.scheduler is not None and epoch > 0:
                 self.scheduler.step()
 
+            if snapshot_every and (epoch + 1) % snapshot_every == 0:
+                snapshot(epoch + 1)
+
+        if evaluator is not None:
+            for eval_epoch, success_rates, eval_time, weights in evaluator.wait_all():
+                record_success(eval_epoch, np.mean(success_rates), eval_time, weights)
+
         # load the best policy if there is any
+        self.wait_for_checkpoints()
         if self.cfg.lifelong.eval_in_train:
-            self.policy.load_state_dict(torch_load_model(model_checkpoint_name)[0])
+            if is_main_process():
+                self.policy.load_state_dict(
+                    torch_load_model(model_checkpoint_name)[0]
+                )
+            broadcast_module(self.policy)
         self.end_task(concat_dataset, -1, benchmark)
 
         # return the metrics regarding forward transfer
@@ -127,13 +249,14 @@ class Multitask(Sequential):
         auc_checkpoint_name = os.path.join(
             self.experiment_dir, f"multitask_auc.log"
         )
-        torch.save(
-            {
-                "success": successes,
-                "loss": losses,
-            },
-            auc_checkpoint_name,
-        )
+        if is_main_process():
+            torch.save(
+                {
+                    "success": successes,
+                    "loss": losses,
+                },
+                auc_checkpoint_name,
+            )
 
         if self.cfg.lifelong.eval_in_train:
             loss_at_best_succ = losses[idx_at_best_succ]
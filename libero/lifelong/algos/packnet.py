@@ -7,6 +7,12 @@ from torch.utils.data import DataLoader
 
 from libero.libero.benchmark import *
 from libero.lifelong.algos.base import Sequential
+from libero.lifelong.datasets import collate_batch
+from libero.lifelong.distributed import (
+    all_reduce_mean,
+    broadcast_module,
+    is_main_process,
+)
 from libero.lifelong.metric import *
 from libero.lifelong.utils import *
 
@@ -28,6 +34,13 @@ class PackNet(Sequential):
                 previous_masks[module_idx] = mask
         self.previous_masks = previous_masks
 
+    def get_algo_state(self):
+        return {"previous_masks": self.previous_masks}
+
+    def set_algo_state(self, state, datasets):
+        self.previous_masks = state["previous_masks"]
+        self.current_masks = self.previous_masks
+
     def pruning_mask(self, weights, previous_mask, layer_idx):
         """
         Ranks weights by magnitude. Sets all below kth to 0.
@@ -134,6 +147,7 @@ class PackNet(Sequential):
         self.optimizer.zero_grad()
         loss = self.policy.compute_loss(data)
         (loss * self.loss_scale).backward()
+        self.sync_gradients()
         if self.cfg.train.grad_clip is not None:
             grad_norm = nn.utils.clip_grad_norm_(
                 self.policy.parameters(), self.cfg.train.grad_clip
@@ -152,7 +166,8 @@ class PackNet(Sequential):
 
         # Do final finetuning to improve results on pruned network.
         if self.cfg.lifelong.post_prune_epochs:
-            print("[info] start finetuning after pruning ...")
+            if is_main_process():
+                print("[info] start finetuning after pruning ...")
             # Note: here we do not apply start_task() to keep the 0 value in the
             # mask stay 0 and only update the param where mask=current_task+1
             # re-initialize the optimizer and scheduler
@@ -172,40 +187,46 @@ class PackNet(Sequential):
                 self.experiment_dir, f"task{task_id}_model.pth"
             )
 
+            train_sampler = self.get_train_sampler(dataset)
             train_dataloader = DataLoader(
                 dataset,
                 batch_size=self.cfg.train.batch_size,
                 num_workers=self.cfg.train.num_workers,
-                shuffle=True,
+                sampler=train_sampler,
+                collate_fn=collate_batch,
             )
 
             prev_success_rate = -1.0
             best_state_dict = self.policy.state_dict()  # currently save the best model
-            torch_save_model(
-                self.policy,
-                model_checkpoint_name,
-                cfg=self.cfg,
-                previous_masks=self.previous_masks,
+            self.save_checkpoint(
+                model_checkpoint_name, previous_masks=self.previous_masks
             )
 
             # this is just a fake summary object that works for placeholders
             sim_states = [[] for _ in range(self.cfg.eval.n_eval)]
             for epoch in range(0, self.cfg.lifelong.post_prune_epochs + 1):
                 t0 = time.time()
+                train_sampler.set_epoch(epoch)
                 self.policy.train()
                 training_loss = 0.0
                 for (idx, data) in enumerate(train_dataloader):
                     loss = self.observe(data)
                     training_loss += loss
                 training_loss /= len(train_dataloader)
+                training_loss = all_reduce_mean(training_loss)
                 t1 = time.time()
 
-                print(
-                    f"[info] Post epoch: {epoch:3d} | train loss: {training_loss:5.2f} | time: {(t1-t0)/60:4.2f}"
-                )
+                if is_main_process():
+                    print(
+                        f"[info] Post epoch: {epoch:3d} | train loss: {training_loss:5.2f} | time: {(t1-t0)/60:4.2f}"
+                    )
                 time.sleep(0.1)
 
-                if epoch % self.cfg.lifelong.post_eval_every == 0:  # evaluate BC loss
+                # only the main process of a distributed run evaluates
+                if (
+                    epoch % self.cfg.lifelong.post_eval_every == 0
+                    and is_main_process()
+                ):  # evaluate BC loss
                     self.policy.eval()
 
                     t0 = time.time()
@@ -225,11 +246,8 @@ class PackNet(Sequential):
 
                     if prev_success_rate < success_rate:
                         # we do not record the success rate
-                        torch_save_model(
-                            self.policy,
-                            model_checkpoint_name,
-                            cfg=self.cfg,
-                            previous_masks=self.previous_masks,
+                        self.save_checkpoint(
+                            model_checkpoint_name, previous_masks=self.previous_masks
                         )
                         prev_success_rate = success_rate
 
@@ -245,7 +263,12 @@ class PackNet(Sequential):
                 if self.scheduler is not None:
                     self.scheduler.step()
 
-            self.policy.load_state_dict(torch_load_model(model_checkpoint_name)[0])
+            self.wait_for_checkpoints()
+            if is_main_process():
+                self.policy.load_state_dict(
+                    torch_load_model(model_checkpoint_name)[0]
+                )
+            broadcast_module(self.policy)
 
     def get_eval_algo(self, task_id):
         # TODO: find a better way to do this
@@ -0,0 +1,181 @@
+"""
+Asynchronous success-rate evaluation during training.
+
+The trainer copies the policy weights into one of a few shared-memory slots
+and returns to training right away. A separate evaluation process, with a
+persistent env pool per task, loads the weights, rolls them out and sends the
+success rates back. Requests are processed in submission order, so the
+trainer can consume results as they arrive with the same best-checkpoint
+logic as the synchronous evaluation. The trainer has moved on by the time a
+result arrives, so each result comes with a copy of the evaluated weights,
+which the trainer saves through its own checkpoint writer when they are the
+best so far.
+"""
+import atexit
+import queue
+import time
+
+import numpy as np
+import robomimic.utils.obs_utils as ObsUtils
+import torch
+import torch.multiprocessing as mp
+
+from libero.lifelong.metric import create_eval_env, evaluate_one_task_success
+from libero.lifelong.utils import safe_device
+
+
+def _evaluation_worker(cfg, n_tasks, weight_slots, request_queue, result_queue):
+    # Only the policy is needed for rollouts
+    from libero.lifelong.algos.base import Sequential
+
+    # The observation modalities are process-global state in robomimic
+    ObsUtils.initialize_obs_utils_with_obs_specs({"obs": cfg.data.obs.modality})
+    algo = safe_device(Sequential(n_tasks, cfg), cfg.device)
+    env_num = min(cfg.eval.num_procs, cfg.eval.n_eval) if cfg.eval.use_mp else 1
+    envs = {}
+    try:
+        while True:
+            request = request_queue.get()
+            if request is None:
+                break
+            slot, epoch, tasks = request
+            algo.policy.load_state_dict(weight_slots[slot])
+            # The slot can be reused by the trainer once the weights are loaded
+            result_queue.put(("loaded", slot))
+
+            t0 = time.time()
+            success_rates = []
+            for task_id, task, task_emb in tasks:
+                if task.name not in envs:
+                    envs[task.name] = create_eval_env(cfg, task, env_num)
+                success_rates.append(
+                    evaluate_one_task_success(
+                        cfg=cfg,
+                        algo=algo,
+                        task=task,
+                        task_emb=task_emb,
+                        task_id=task_id,
+                        env=envs[task.name],
+                    )
+                )
+            result_queue.put(
+                ("result", (epoch, np.array(success_rates), time.time() - t0))
+            )
+    finally:
+        for env in envs.values():
+            env.close()
+
+
+class AsyncEvaluator:
+    """
+    Evaluation service running in its own process.
+
+    Args:
+        cfg: experiment config
+        n_tasks (int): number of lifelong tasks, to build the policy
+        policy (nn.Module): the trained policy, used to allocate the weight slots
+        num_slots (int): number of weight snapshots that can be pending at once,
+            submit blocks when they are all in use
+    """
+
+    def __init__(self, cfg, n_tasks, policy, num_slots=2):
+        ctx = mp.get_context("spawn")
+        self.weight_slots = [
+            {
+                k: v.detach().cpu().clone().share_memory_()
+                for k, v in policy.state_dict().items()
+            }
+            for _ in range(num_slots)
+        ]
+        self.free_slots = list(range(num_slots))
+        self.request_queue = ctx.Queue()
+        self.result_queue = ctx.Queue()
+        self.results = []
+        # (epoch, weights) of the submitted evaluations without a result, in
+        # submission order. At most num_slots + 1 are pending at once.
+        self.pending = []
+        # Not a daemon, as the evaluation process starts its own env workers
+        self.process = ctx.Process(
+            target=_evaluation_worker,
+            args=(
+                cfg,
+                n_tasks,
+                self.weight_slots,
+                self.request_queue,
+                self.result_queue,
+            ),
+        )
+        self.process.start()
+        atexit.register(self.close)
+
+    def _handle(self, message):
+        kind, data = message
+        if kind == "loaded":
+            self.free_slots.append(data)
+        else:
+            # the weights kept for the request are returned with its result
+            epoch, weights = self.pending.pop(0)
+            self.results.append((*data, weights))
+
+    def _receive(self, block):
+        while True:
+            try:
+                message = self.result_queue.get(
+                    block=block, timeout=10 if block else None
+                )
+                break
+            except queue.Empty:
+                if not block:
+                    return False
+                assert self.process.is_alive(), "[error] the evaluation process has died"
+        self._handle(message)
+        return True
+
+    def submit(self, policy, epoch, tasks):
+        """
+        Snapshot the policy weights and queue their evaluation.
+
+        Args:
+            policy (nn.Module or dict): the policy, or its state dict
+            epoch (int): returned with the result
+            tasks (list): (task_id, task, task_emb) tuples, the result is their mean success rate
+        """
+        assert self.process.is_alive(), "[error] the evaluation process has died"
+        while len(self.free_slots) == 0:
+            self._receive(block=True)
+        slot = self.free_slots.pop(0)
+        state_dict = policy if isinstance(policy, dict) else policy.state_dict()
+        with torch.no_grad():
+            for k, v in state_dict.items():
+                self.weight_slots[slot][k].copy_(v)
+        # kept until the result arrives, so that snapshots can resubmit them
+        # and the trainer can save them
+        weights = {k: v.clone() for k, v in self.weight_slots[slot].items()}
+        self.pending.append((epoch, weights))
+        tasks = [(task_id, task, task_emb.cpu()) for task_id, task, task_emb in tasks]
+        self.request_queue.put((slot, epoch, tasks))
+
+    def get_pending(self):
+        """The (epoch, weights) of the evaluations without a result, in submission order."""
+        return list(self.pending)
+
+    def poll(self):
+        """
+        Return the (epoch, success_rates, eval_time, weights) results that have
+        arrived, in order. weights is the evaluated state dict.
+        """
+        while self._receive(block=False):
+            pass
+        results, self.results = self.results, []
+        return results
+
+    def wait_all(self):
+        """Block until every submitted evaluation is done and return their results."""
+        while len(self.pending) > 0:
+            self._receive(block=True)
+        return self.poll()
+
+    def close(self):
+        if self.process.is_alive():
+            self.request_queue.put(None)
+            self.process.join()
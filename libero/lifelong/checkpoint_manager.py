@@ -0,0 +1,212 @@
+"""
+Asynchronous checkpoint writing.
+
+The state dict is copied into reusable (pinned, when cuda is available) CPU
+buffers, and the file is written on a background thread, to a temporary file
+that is renamed into place, so that training only waits for the device to
+host copy. The config is stored once per run in ``RUN_CONFIG_FILE`` and
+checkpoints only reference it. Checkpoints saved with a group (e.g. the
+per-epoch multitask checkpoints) can be pruned to the last-K and best-K.
+Checkpoints can be saved as safetensors files, which ``torch_load_model``
+loads without unpickling.
+"""
+import os
+import pickle
+import queue
+import threading
+
+import torch
+
+from libero.lifelong.utils import (
+    PREVIOUS_MASKS_PREFIX,
+    RUN_CONFIG_FILE,
+    get_checkpoint_path,
+)
+
+
+class CheckpointManager:
+    """
+    Args:
+        experiment_dir (str): folder of the run, where the config is stored
+        cfg: experiment config, written once to experiment_dir
+        save_format (str): "pth" or "safetensors"
+        keep_last (int): number of most recent checkpoints to keep per group, None keeps all
+        keep_best (int): number of best checkpoints (by metric) to keep per group, None keeps all
+        max_pending (int): number of checkpoints that can wait to be written, save
+            blocks when they are all pending
+    """
+
+    def __init__(
+        self,
+        experiment_dir,
+        cfg=None,
+        save_format="pth",
+        keep_last=None,
+        keep_best=None,
+        max_pending=2,
+    ):
+        assert save_format in [
+            "pth",
+            "safetensors",
+        ], f"[error] unknown checkpoint format {save_format}"
+        if save_format == "safetensors":
+            import safetensors.torch  # fail early if it is not installed
+
+        self.experiment_dir = experiment_dir
+        self.save_format = save_format
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.max_pending = max_pending
+
+        self.cfg_file = None
+        if cfg is not None:
+            self.cfg_file = RUN_CONFIG_FILE
+            config_path = os.path.join(experiment_dir, RUN_CONFIG_FILE)
+            with open(config_path + ".tmp", "wb") as f:
+                pickle.dump(cfg, f)
+            os.replace(config_path + ".tmp", config_path)
+
+        self.free_buffers = queue.Queue()
+        self.num_buffers = 0
+        # group name -> list of {"path", "metric"} in save order
+        self.groups = {}
+        self.lock = threading.Lock()
+        self.jobs = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _get_buffers(self, state_dict):
+        try:
+            buffers = self.free_buffers.get_nowait()
+        except queue.Empty:
+            if self.num_buffers < self.max_pending:
+                self.num_buffers += 1
+                buffers = {}
+            else:
+                # wait until a pending checkpoint has been written
+                buffers = self.free_buffers.get()
+        for k, v in state_dict.items():
+            if k not in buffers or buffers[k].shape != v.shape or buffers[k].dtype != v.dtype:
+                buffers[k] = torch.empty(
+                    v.shape, dtype=v.dtype, pin_memory=torch.cuda.is_available()
+                )
+        for k in list(buffers.keys()):
+            if k not in state_dict:
+                del buffers[k]
+        return buffers
+
+    def save(self, model, checkpoint_path, previous_masks=None, group=None, metric=None):
+        """
+        Queue a checkpoint of the model. Returns the path it will be written to,
+        which has the extension of the save format.
+
+        Args:
+            model (nn.Module or dict): the model, or its state dict
+            group (str): checkpoints of the same group are subject to the retention policy
+            metric (float): higher is better, can also be set later with set_metric
+        """
+        if self.error is not None:
+            raise self.error
+        checkpoint_path = get_checkpoint_path(checkpoint_path, self.save_format)
+        state_dict = model if isinstance(model, dict) else model.state_dict()
+        buffers = self._get_buffers(state_dict)
+        with torch.no_grad():
+            for k, v in state_dict.items():
+                buffers[k].copy_(v.detach(), non_blocking=True)
+        copy_done = None
+        if torch.cuda.is_available():
+            # the writer thread waits for the copies instead of the trainer
+            copy_done = torch.cuda.Event()
+            copy_done.record()
+        if previous_masks is not None:
+            previous_masks = {
+                k: v.detach().cpu().clone() for k, v in previous_masks.items()
+            }
+        if group is not None:
+            with self.lock:
+                entries = self.groups.setdefault(group, [])
+                entries[:] = [e for e in entries if e["path"] != checkpoint_path]
+                entries.append({"path": checkpoint_path, "metric": metric})
+        self.jobs.put((checkpoint_path, buffers, previous_masks, copy_done, group))
+        return checkpoint_path
+
+    def set_metric(self, checkpoint_path, metric):
+        """Set the metric of a grouped checkpoint, e.g. once its evaluation arrives."""
+        checkpoint_path = get_checkpoint_path(checkpoint_path, self.save_format)
+        with self.lock:
+            for entries in self.groups.values():
+                for entry in entries:
+                    if entry["path"] == checkpoint_path:
+                        entry["metric"] = metric
+
+    def _write(self, checkpoint_path, state_dict, previous_masks):
+        tmp_path = checkpoint_path + ".tmp"
+        if self.save_format == "safetensors":
+            import safetensors.torch
+
+            tensors = dict(state_dict)
+            if previous_masks is not None:
+                for k, v in previous_masks.items():
+                    tensors[f"{PREVIOUS_MASKS_PREFIX}{k}"] = v
+            metadata = {} if self.cfg_file is None else {"cfg_file": self.cfg_file}
+            safetensors.torch.save_file(tensors, tmp_path, metadata=metadata)
+        else:
+            torch.save(
+                {
+                    "state_dict": state_dict,
+                    "cfg_file": self.cfg_file,
+                    "previous_masks": previous_masks,
+                },
+                tmp_path,
+            )
+        os.replace(tmp_path, checkpoint_path)
+
+    def _apply_retention(self, group):
+        with self.lock:
+            entries = self.groups[group]
+            if self.keep_last is None and self.keep_best is None:
+                return
+            keep = set()
+            if self.keep_last is not None:
+                keep.update([e["path"] for e in entries[-self.keep_last :]])
+            if self.keep_best is not None:
+                scored = [e for e in entries if e["metric"] is not None]
+                scored = sorted(scored, key=lambda e: e["metric"], reverse=True)
+                keep.update([e["path"] for e in scored[: self.keep_best]])
+                # checkpoints that have not been scored yet are kept
+                keep.update([e["path"] for e in entries if e["metric"] is None])
+            removed = [e for e in entries if e["path"] not in keep]
+            self.groups[group] = [e for e in entries if e["path"] in keep]
+        for entry in removed:
+            if os.path.exists(entry["path"]):
+                os.remove(entry["path"])
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                break
+            checkpoint_path, buffers, previous_masks, copy_done, group = job
+            try:
+                if copy_done is not None:
+                    copy_done.synchronize()
+                self._write(checkpoint_path, buffers, previous_masks)
+                if group is not None:
+                    self._apply_retention(group)
+            except Exception as e:
+                self.error = e
+            self.free_buffers.put(buffers)
+            self.jobs.task_done()
+
+    def wait(self):
+        """Block until every queued checkpoint is written."""
+        self.jobs.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self.wait()
+        self.jobs.put(None)
+        self.thread.join()
@@ -1,11 +1,27 @@
 import copy
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
 
+import h5py
 import numpy as np
-import robomimic.utils.file_utils as FileUtils
 import robomimic.utils.obs_utils as ObsUtils
 from PIL import Image
 from robomimic.utils.dataset import SequenceDataset
-from torch.utils.data import Dataset
+import torch
+from torch.utils.data import ConcatDataset, Dataset, Sampler, default_collate
+
+from libero.libero import libero_config_path
+from libero.libero.utils.dataset_utils import decode_frame, is_encoded_frames
+
+# Bump when the cached dataset metadata changes, to invalidate the cache files
+DATASET_METADATA_VERSION = 1
+
+dataset_metadata_folder = os.path.join(libero_config_path, "dataset_cache")
+
+# Dataset metadata of this process, keyed by (path, size, mtime)
+_DATASET_METADATA = {}
 
 """
     Helper function from Robomimic to read hdf5 demonstrations into sequence dataset
@@ -24,6 +40,7 @@ def get_dataset(
     frame_stack=1,
     filter_key=None,
     hdf5_cache_mode="low_dim",
+    decoded_cache_size=512,
     *args,
     **kwargs
 ):
@@ -34,13 +51,19 @@ def get_dataset(
     all_obs_keys = []
     for modality_name, modality_list in obs_modality.items():
         all_obs_keys += modality_list
-    shape_meta = FileUtils.get_shape_metadata_from_dataset(
-        dataset_path=dataset_path, all_obs_keys=all_obs_keys, verbose=False
-    )
+    metadata = get_dataset_metadata(dataset_path)
+    shape_meta = get_shape_metadata(metadata, all_obs_keys)
+
+    # datasets with encoded image observations are decoded on read
+    dataset_kwargs = {"metadata": metadata}
+    dataset_class = CachedSequenceDataset
+    if len(metadata["encoded_obs_keys"]) > 0:
+        dataset_class = EncodedSequenceDataset
+        dataset_kwargs["decoded_cache_size"] = decoded_cache_size
 
     seq_len = seq_len
     filter_key = filter_key
-    dataset = SequenceDataset(
+    dataset = dataset_class(
         hdf5_path=dataset_path,
         obs_keys=shape_meta["all_obs_keys"],
         dataset_keys=["actions"],
@@ -55,16 +78,469 @@ def get_dataset(
         hdf5_use_swmr=False,
         hdf5_normalize_obs=None,
         filter_by_attribute=filter_key,  # can optionally provide a filter key here
+        **dataset_kwargs,
     )
     return dataset, shape_meta
 
 
+def _read_dataset_metadata(dataset_path):
+    with h5py.File(dataset_path, "r") as f:
+        demos = list(f["data"].keys())
+        inds = np.argsort([int(elem[5:]) for elem in demos])
+        demos = [demos[i] for i in inds]
+        first_demo = f[f"data/{demos[0]}"]
+
+        obs_shapes = {}
+        encoded_obs_keys = []
+        for k, dataset in first_demo["obs"].items():
+            if is_encoded_frames(dataset):
+                obs_shapes[k] = tuple(dataset.attrs["frame_shape"])
+                encoded_obs_keys.append(k)
+            else:
+                obs_shapes[k] = dataset.shape[1:]
+        # low-dim observations and actions, as robomimic keeps them in memory
+        low_dim_keys = [
+            f"obs/{k}"
+            for k in obs_shapes
+            if k not in encoded_obs_keys and len(obs_shapes[k]) == 1
+        ] + ["actions"]
+
+        demo_lengths = {}
+        low_dim = {}
+        for ep in demos:
+            demo_lengths[ep] = int(f[f"data/{ep}"].attrs["num_samples"])
+            low_dim[ep] = {
+                k: f[f"data/{ep}/{k}"][()].astype("float32") for k in low_dim_keys
+            }
+        filter_keys = {}
+        if "mask" in f:
+            for fk in f["mask"]:
+                filter_keys[fk] = [elem.decode("utf-8") for elem in f[f"mask/{fk}"][()]]
+
+    return {
+        "ac_dim": low_dim[demos[0]]["actions"].shape[1],
+        "obs_shapes": obs_shapes,
+        "encoded_obs_keys": encoded_obs_keys,
+        "demos": demos,
+        "demo_lengths": demo_lengths,
+        "filter_keys": filter_keys,
+        "low_dim": low_dim,
+    }
+
+
+def get_dataset_metadata(dataset_path, use_cache=True):
+    """
+    Structure of a demo dataset: action dim, raw obs shapes (the frame shape for
+    encoded observations), sorted demos, demo lengths, filter keys, and the
+    low-dim observations and actions of every demo. It is cached in this process
+    and in ``dataset_metadata_folder``, keyed by the dataset path and validated
+    with the file size and modification time, so that launches do not scan the
+    hdf5 files again.
+    """
+    dataset_path = os.path.abspath(os.path.expanduser(dataset_path))
+    stat = os.stat(dataset_path)
+    key = (dataset_path, stat.st_size, stat.st_mtime_ns)
+    if use_cache and key in _DATASET_METADATA:
+        return _DATASET_METADATA[key]
+
+    cache_file = os.path.join(
+        dataset_metadata_folder,
+        hashlib.sha1(dataset_path.encode()).hexdigest() + ".pkl",
+    )
+    metadata = None
+    if use_cache and os.path.exists(cache_file):
+        try:
+            with open(cache_file, "rb") as f:
+                cached = pickle.load(f)
+            if cached["key"] == (DATASET_METADATA_VERSION,) + key:
+                metadata = cached["metadata"]
+        except (OSError, EOFError, KeyError, pickle.UnpicklingError):
+            metadata = None
+
+    if metadata is None:
+        metadata = _read_dataset_metadata(dataset_path)
+        if use_cache:
+            _save_dataset_metadata(
+                cache_file,
+                {"key": (DATASET_METADATA_VERSION,) + key, "metadata": metadata},
+            )
+
+    if use_cache:
+        _DATASET_METADATA[key] = metadata
+    return metadata
+
+
+def _save_dataset_metadata(cache_file, cached):
+    tmp_file = cache_file + f".{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp_file, "wb") as f:
+            pickle.dump(cached, f)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        # The metadata is only a cache, failing to persist it is not an error
+        pass
+
+
+def get_shape_metadata(metadata, all_obs_keys):
+    """
+    The shape metadata of robomimic's get_shape_metadata_from_dataset, from the
+    dataset metadata.
+    """
+    all_shapes = OrderedDict()
+    for k in sorted(all_obs_keys):
+        all_shapes[k] = ObsUtils.get_processed_shape(
+            obs_modality=ObsUtils.OBS_KEYS_TO_MODALITIES[k],
+            input_shape=metadata["obs_shapes"][k],
+        )
+    return {
+        "ac_dim": metadata["ac_dim"],
+        "all_shapes": all_shapes,
+        "all_obs_keys": all_obs_keys,
+        "use_images": ObsUtils.has_modality("rgb", all_obs_keys),
+    }
+
+
+class CachedSequenceDataset(SequenceDataset):
+    """
+    robomimic SequenceDataset that builds its demo index and its low-dim
+    in-memory data from the dataset metadata (see get_dataset_metadata) rather
+    than from the hdf5 file.
+    """
+
+    def __init__(self, hdf5_path, *args, metadata=None, **kwargs):
+        self.metadata = (
+            get_dataset_metadata(hdf5_path) if metadata is None else metadata
+        )
+        super().__init__(hdf5_path, *args, **kwargs)
+
+    def load_demo_info(self, filter_by_attribute=None, demos=None):
+        # same as robomimic, with the demo lengths from the metadata
+        if demos is not None:
+            self.demos = demos
+        elif filter_by_attribute is not None:
+            self.demos = list(self.metadata["filter_keys"][filter_by_attribute])
+        else:
+            self.demos = list(self.metadata["demos"])
+
+        inds = np.argsort([int(elem[5:]) for elem in self.demos])
+        self.demos = [self.demos[i] for i in inds]
+        self.n_demos = len(self.demos)
+
+        self._index_to_demo_id = dict()
+        self._demo_id_to_start_indices = dict()
+        self._demo_id_to_demo_length = dict()
+
+        self.total_num_sequences = 0
+        for ep in self.demos:
+            demo_length = self.metadata["demo_lengths"][ep]
+            self._demo_id_to_start_indices[ep] = self.total_num_sequences
+            self._demo_id_to_demo_length[ep] = demo_length
+
+            num_sequences = demo_length
+            if not self.pad_frame_stack:
+                num_sequences -= self.n_frame_stack - 1
+            if not self.pad_seq_length:
+                num_sequences -= self.seq_length - 1
+
+            if self.pad_seq_length:
+                assert demo_length >= 1
+                num_sequences = max(num_sequences, 1)
+            else:
+                assert num_sequences >= 1
+
+            for _ in range(num_sequences):
+                self._index_to_demo_id[self.total_num_sequences] = ep
+                self.total_num_sequences += 1
+
+    def load_dataset_in_memory(
+        self, demo_list, hdf5_file, obs_keys, dataset_keys, load_next_obs
+    ):
+        low_dim = self.metadata["low_dim"]
+        keys = [f"obs/{k}" for k in obs_keys] + list(dataset_keys)
+        if load_next_obs or not all(
+            [k in low_dim[ep] for ep in demo_list for k in keys]
+        ):
+            return super().load_dataset_in_memory(
+                demo_list, hdf5_file, obs_keys, dataset_keys, load_next_obs
+            )
+        all_data = dict()
+        for ep in demo_list:
+            all_data[ep] = {
+                "attrs": {"num_samples": self.metadata["demo_lengths"][ep]},
+                "obs": {k: low_dim[ep][f"obs/{k}"] for k in obs_keys},
+            }
+            for k in dataset_keys:
+                all_data[ep][k] = low_dim[ep][k]
+        return all_data
+
+
+class FrameLRUCache:
+    """Least recently used cache of decoded frames."""
+
+    def __init__(self, max_frames):
+        self.max_frames = max_frames
+        self.frames = OrderedDict()
+
+    def get(self, key):
+        frame = self.frames.get(key)
+        if frame is not None:
+            self.frames.move_to_end(key)
+        return frame
+
+    def put(self, key, frame):
+        if self.max_frames <= 0:
+            return
+        self.frames[key] = frame
+        self.frames.move_to_end(key)
+        while len(self.frames) > self.max_frames:
+            self.frames.popitem(last=False)
+
+
+class EncodedFrames:
+    """
+    Array-like view of a dataset of encoded frames, which decodes the frames it is
+    indexed with (an int, a slice or an array of ints).
+    """
+
+    def __init__(self, dataset, cache, cache_key):
+        self.dataset = dataset
+        self.cache = cache
+        self.cache_key = cache_key
+        self.shape = (len(dataset),) + tuple(dataset.attrs["frame_shape"])
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            index = np.arange(*index.indices(len(self)))
+        index = np.asarray(index)
+        decoded = {}
+        missing = []
+        for frame in np.unique(index).tolist():
+            image = self.cache.get((self.cache_key, frame))
+            if image is None:
+                missing.append(frame)
+            else:
+                decoded[frame] = image
+        if len(missing) > 0:
+            for frame, buffer in zip(missing, self.dataset[np.array(missing)]):
+                decoded[frame] = decode_frame(buffer)
+                self.cache.put((self.cache_key, frame), decoded[frame])
+        if index.size == 0:
+            return np.empty(index.shape + self.shape[1:], dtype=np.uint8)
+        frames = np.stack([decoded[frame] for frame in index.reshape(-1).tolist()])
+        return frames.reshape(index.shape + self.shape[1:])
+
+
+class EncodedSequenceDataset(CachedSequenceDataset):
+    """
+    robomimic SequenceDataset for demo datasets whose image observations are
+    stored with one encoded image per frame (see scripts/create_dataset.py).
+    Frames are decoded when they are read, i.e. in the DataLoader workers, and
+    the most recently decoded frames are kept in a small LRU cache.
+    """
+
+    def __init__(
+        self, hdf5_path, *args, metadata=None, decoded_cache_size=512, **kwargs
+    ):
+        metadata = get_dataset_metadata(hdf5_path) if metadata is None else metadata
+        self.encoded_obs_keys = set(metadata["encoded_obs_keys"])
+        self.decoded_frames = FrameLRUCache(decoded_cache_size)
+        super().__init__(hdf5_path, *args, metadata=metadata, **kwargs)
+
+    def load_dataset_in_memory(
+        self, demo_list, hdf5_file, obs_keys, dataset_keys, load_next_obs
+    ):
+        encoded_keys = [k for k in obs_keys if k in self.encoded_obs_keys]
+        assert not (
+            load_next_obs and len(encoded_keys) > 0
+        ), "[error] next_obs is not supported with encoded observations"
+        all_data = super().load_dataset_in_memory(
+            demo_list,
+            hdf5_file,
+            [k for k in obs_keys if k not in self.encoded_obs_keys],
+            dataset_keys,
+            load_next_obs,
+        )
+        for ep in demo_list:
+            for k in encoded_keys:
+                frames = EncodedFrames(
+                    hdf5_file[f"data/{ep}/obs/{k}"], FrameLRUCache(0), None
+                )
+                all_data[ep]["obs"][k] = frames[:].astype("float32")
+        return all_data
+
+    def get_dataset_for_ep(self, ep, key):
+        if "/" in key:
+            key1, key2 = key.split("/")
+            in_memory = self.hdf5_cache_mode == "all" or (
+                self.hdf5_cache_mode == "low_dim" and key2 in self.obs_keys_in_memory
+            )
+            if key2 in self.encoded_obs_keys and not in_memory:
+                return EncodedFrames(
+                    self.hdf5_file[f"data/{ep}/{key}"], self.decoded_frames, (ep, key)
+                )
+        return super().get_dataset_for_ep(ep, key)
+
+
+def collate_batch(batch):
+    """
+    Collate function for the datasets below, whose __getitems__ already returns
+    collated batches. Lists of samples are collated as usual.
+    """
+    if isinstance(batch, dict):
+        return batch
+    return default_collate(batch)
+
+
+def concat_batches(batches, inverse):
+    """
+    Concatenate collated batches, then reorder the samples so that sample i of
+    the result is sample inverse[i] of the concatenation.
+    """
+    if isinstance(batches[0], dict):
+        return {k: concat_batches([b[k] for b in batches], inverse) for k in batches[0]}
+    return torch.cat(batches, dim=0)[inverse]
+
+
+def _group_indices(group_ids):
+    """
+    Split the positions of a batch by group. Returns [(group, positions)] and the
+    inverse permutation that restores the batch order after concat_batches.
+    """
+    group_ids = np.asarray(group_ids)
+    order = np.argsort(group_ids, kind="stable")
+    groups, starts = np.unique(group_ids[order], return_index=True)
+    splits = np.split(order, starts[1:])
+    inverse = torch.from_numpy(np.argsort(order, kind="stable"))
+    return list(zip(groups, splits)), inverse
+
+
+class SequenceBatchReader:
+    """
+    Gathers a whole minibatch of robomimic SequenceDataset windows at once: the
+    window rows of every sample are computed with numpy, then each key is read
+    with a single fancy index from a per-key array of all demos concatenated.
+    Keys that robomimic does not keep in memory (e.g. images with the "low_dim"
+    cache mode) are read from the hdf5 file once per demo in the batch.
+    Frame stack and sequence padding repeat the edge frames, as robomimic does.
+    """
+
+    def __init__(self, sequence_dataset):
+        ds = sequence_dataset
+        self.sequence_dataset = ds
+        self.demos = list(ds.demos)
+        demo_pos = {demo: i for i, demo in enumerate(self.demos)}
+        self.demo_lengths = np.array(
+            [ds._demo_id_to_demo_length[demo] for demo in self.demos], dtype=np.int64
+        )
+        self.demo_start_indices = np.array(
+            [ds._demo_id_to_start_indices[demo] for demo in self.demos], dtype=np.int64
+        )
+        self.demo_offsets = np.concatenate([[0], np.cumsum(self.demo_lengths)[:-1]])
+        self.index_to_demo = np.array(
+            [demo_pos[ds._index_to_demo_id[i]] for i in range(len(ds))], dtype=np.int64
+        )
+        # start at offset index if not padding for frame stacking
+        self.demo_index_offset = 0 if ds.pad_frame_stack else ds.n_frame_stack - 1
+        self.flat_data = {}
+
+    @staticmethod
+    def is_supported(sequence_dataset):
+        ds = sequence_dataset
+        return (
+            ds.hdf5_cache_mode != "all"
+            and ds.goal_mode is None
+            and not ds.load_next_obs
+            and not ds.hdf5_normalize_obs
+        )
+
+    def _get_flat_data(self, key):
+        if key not in self.flat_data:
+            ds = self.sequence_dataset
+            self.flat_data[key] = np.concatenate(
+                [np.asarray(ds.get_dataset_for_ep(demo, key)) for demo in self.demos]
+            )
+        return self.flat_data[key]
+
+    def _in_memory(self, key):
+        ds = self.sequence_dataset
+        if ds.hdf5_cache_mode not in ["all", "low_dim"]:
+            return False
+        return "/" not in key or key.split("/")[1] in ds.obs_keys_in_memory
+
+    def _gather(self, key, demo_ids, frames):
+        if self._in_memory(key):
+            rows = self.demo_offsets[demo_ids][:, None] + frames
+            return self._get_flat_data(key)[rows]
+        out = None
+        for demo_id in np.unique(demo_ids):
+            selected = demo_ids == demo_id
+            # h5py fancy indexing needs increasing unique indices
+            unique_frames, inverse = np.unique(frames[selected], return_inverse=True)
+            data = self.sequence_dataset.get_dataset_for_ep(
+                self.demos[demo_id], key
+            )[unique_frames]
+            if out is None:
+                out = np.empty(frames.shape + data.shape[1:], dtype=data.dtype)
+            out[selected] = data[inverse.reshape(-1)].reshape(
+                frames[selected].shape + data.shape[1:]
+            )
+        return out
+
+    def _get_sequence(self, keys, demo_ids, index_in_demo, num_frames_to_stack):
+        ds = self.sequence_dataset
+        steps = np.arange(-num_frames_to_stack, ds.seq_length)
+        frames = index_in_demo[:, None] + steps[None, :]
+        demo_lengths = self.demo_lengths[demo_ids][:, None]
+        pad_mask = (frames >= 0) & (frames < demo_lengths)
+        frames = np.clip(frames, 0, demo_lengths - 1)
+        seq = {
+            k: self._gather(k, demo_ids, frames).astype(np.float32, copy=False)
+            for k in keys
+        }
+        return seq, pad_mask[:, :, None]
+
+    def get_batch(self, indices):
+        ds = self.sequence_dataset
+        indices = np.asarray(indices, dtype=np.int64)
+        demo_ids = self.index_to_demo[indices]
+        index_in_demo = (
+            indices - self.demo_start_indices[demo_ids] + self.demo_index_offset
+        )
+
+        batch, pad_mask = self._get_sequence(ds.dataset_keys, demo_ids, index_in_demo, 0)
+        if ds.get_pad_mask:
+            batch["pad_mask"] = pad_mask
+        obs, pad_mask = self._get_sequence(
+            [f"obs/{k}" for k in ds.obs_keys],
+            demo_ids,
+            index_in_demo,
+            ds.n_frame_stack - 1,
+        )
+        obs = {k.split("/")[1]: v for k, v in obs.items()}
+        if ds.get_pad_mask:
+            obs["pad_mask"] = pad_mask
+        # the robomimic processing (e.g. HWC uint8 to CHW float images) is batched
+        batch["obs"] = ObsUtils.process_obs_dict(obs)
+        return {
+            k: torch.from_numpy(np.ascontiguousarray(v))
+            if isinstance(v, np.ndarray)
+            else {kk: torch.from_numpy(np.ascontiguousarray(vv)) for kk, vv in v.items()}
+            for k, v in batch.items()
+        }
+
+
 class SequenceVLDataset(Dataset):
     def __init__(self, sequence_dataset, task_emb):
         self.sequence_dataset = sequence_dataset
         self.task_emb = task_emb
         self.n_demos = self.sequence_dataset.n_demos
         self.total_num_sequences = self.sequence_dataset.total_num_sequences
+        # created on first use, so that each DataLoader worker builds its own
+        self.batch_reader = None
 
     def __len__(self):
         return len(self.sequence_dataset)
@@ -74,6 +550,19 @@ class SequenceVLDataset(Dataset):
         return_dict["task_emb"] = self.task_emb
         return return_dict
 
+    def __getitems__(self, indices):
+        """Return the collated batch of the samples at indices, see collate_batch."""
+        if not SequenceBatchReader.is_supported(self.sequence_dataset):
+            return default_collate([self[idx] for idx in indices])
+        if self.batch_reader is None:
+            self.batch_reader = SequenceBatchReader(self.sequence_dataset)
+        batch = self.batch_reader.get_batch(indices)
+        # the task embedding is broadcast to the batch rather than copied
+        batch["task_emb"] = self.task_emb.unsqueeze(0).expand(
+            len(indices), *self.task_emb.shape
+        )
+        return batch
+
 
 class GroupedTaskDataset(Dataset):
     def __init__(self, sequence_datasets, task_embs):
@@ -86,6 +575,11 @@ class GroupedTaskDataset(Dataset):
         )
         self.lengths = [len(x) for x in self.sequence_datasets]
         self.task_group_size = len(self.sequence_datasets)
+        # used to read whole batches of each task
+        self.vl_datasets = [
+            SequenceVLDataset(x, task_emb)
+            for (x, task_emb) in zip(self.sequence_datasets, self.task_embs)
+        ]
 
         # create a map that maps the current idx of dataloader to original task data idx
         # imagine we have task 1,2,3, with sizes 3,5,4, then the idx looks like
@@ -126,6 +620,18 @@ class GroupedTaskDataset(Dataset):
         return_dict["task_emb"] = self.task_embs[oti]
         return return_dict
 
+    def __getitems__(self, indices):
+        """Return the collated batch of the samples at indices, see collate_batch."""
+        original_indices = [self.__get_original_task_idx(idx) for idx in indices]
+        groups, inverse = _group_indices([oti for _, oti in original_indices])
+        batches = [
+            self.vl_datasets[oti].__getitems__(
+                [original_indices[p][0] for p in positions]
+            )
+            for oti, positions in groups
+        ]
+        return concat_batches(batches, inverse)
+
 
 class TruncatedSequenceDataset(Dataset):
     def __init__(self, sequence_dataset, buffer_size):
@@ -137,3 +643,161 @@ class TruncatedSequenceDataset(Dataset):
 
     def __getitem__(self, idx):
         return self.sequence_dataset.__getitem__(idx)
+
+    def __getitems__(self, indices):
+        if hasattr(self.sequence_dataset, "__getitems__"):
+            return self.sequence_dataset.__getitems__(indices)
+        return default_collate([self[idx] for idx in indices])
+
+
+class ConcatSequenceDataset(ConcatDataset):
+    """ConcatDataset that forwards whole batches to the __getitems__ of its datasets."""
+
+    def __getitems__(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        dataset_ids = np.searchsorted(self.cumulative_sizes, indices, side="right")
+        groups, inverse = _group_indices(dataset_ids)
+        batches = []
+        for dataset_id, positions in groups:
+            start = 0 if dataset_id == 0 else self.cumulative_sizes[dataset_id - 1]
+            sub_indices = (indices[positions] - start).tolist()
+            dataset = self.datasets[dataset_id]
+            if hasattr(dataset, "__getitems__"):
+                batches.append(dataset.__getitems__(sub_indices))
+            else:
+                batches.append(default_collate([dataset[i] for i in sub_indices]))
+        return concat_batches(batches, inverse)
+
+
+def get_demo_strata(dataset):
+    """
+    Group the sample indices of a task dataset by demonstration, e.g. for stratified
+    sampling. Datasets without a demo index form a single group.
+
+    Returns:
+        list: one int64 array of sample indices per demonstration
+    """
+    if isinstance(dataset, SequenceVLDataset):
+        ds = dataset.sequence_dataset
+        if not hasattr(ds, "_demo_id_to_start_indices"):
+            return [np.arange(len(dataset), dtype=np.int64)]
+        starts = [ds._demo_id_to_start_indices[demo] for demo in ds.demos]
+        ends = starts[1:] + [len(ds)]
+        return [
+            np.arange(start, end, dtype=np.int64)
+            for start, end in zip(starts, ends)
+            if end > start
+        ]
+    if isinstance(dataset, GroupedTaskDataset):
+        original_to_idx = {v: k for k, v in dataset.map_dict.items()}
+        strata = []
+        for oti, vl_dataset in enumerate(dataset.vl_datasets):
+            for stratum in get_demo_strata(vl_dataset):
+                strata.append(
+                    np.array(
+                        [original_to_idx[(oi, oti)] for oi in stratum], dtype=np.int64
+                    )
+                )
+        return strata
+    return [np.arange(len(dataset), dtype=np.int64)]
+
+
+class ResumableRandomSampler(Sampler):
+    """
+    A random sampler whose order only depends on the seed and the epoch, so that
+    an interrupted epoch can be resumed at the same position.
+    """
+
+    def __init__(self, data_source, seed=0):
+        self.data_source = data_source
+        self.seed = seed
+        self.epoch = 0
+        self.start_index = 0
+
+    def set_epoch(self, epoch, start_index=0):
+        """The next iteration goes over epoch's order, skipping the first start_index samples."""
+        self.epoch = epoch
+        self.start_index = start_index
+
+    def __iter__(self):
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+        indices = torch.randperm(len(self.data_source), generator=generator)
+        start_index, self.start_index = self.start_index, 0
+        return iter(indices[start_index:].tolist())
+
+    def __len__(self):
+        return len(self.data_source)
+
+
+class DistributedTaskBalancedSampler(Sampler):
+    """
+    Shards a ConcatDataset of task datasets over the processes of a distributed
+    run. Every epoch, the shuffled samples of each task are dealt out to the
+    processes in turn, and each process interleaves its tasks in proportion to
+    their sizes, so that every process, and every batch, sees all tasks in the
+    same proportions. Like ResumableRandomSampler, the order only depends on the
+    seed and the epoch.
+
+    Args:
+        data_source (ConcatDataset): the task datasets, any other dataset is one task
+        num_replicas (int): number of processes
+        rank (int): index of this process
+    """
+
+    def __init__(self, data_source, num_replicas=1, rank=0, seed=0):
+        self.data_source = data_source
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.seed = seed
+        self.epoch = 0
+        self.start_index = 0
+        if isinstance(data_source, ConcatDataset):
+            self.task_sizes = [len(d) for d in data_source.datasets]
+        else:
+            self.task_sizes = [len(data_source)]
+        # shards are padded with their first samples to the same length
+        self.num_samples = -(-len(data_source) // num_replicas)
+
+    def set_epoch(self, epoch, start_index=0):
+        """
+        The next iteration goes over epoch's order, skipping the first start_index
+        samples of this process.
+        """
+        self.epoch = epoch
+        self.start_index = start_index
+
+    def get_indices(self):
+        """The sample indices of this process for the epoch."""
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+        offsets = torch.rand(
+            len(self.task_sizes), generator=generator, dtype=torch.float64
+        )
+        indices = []
+        keys = []
+        start = 0
+        for task_id, size in enumerate(self.task_sizes):
+            perm = torch.randperm(size, generator=generator) + start
+            # the dealing continues from task to task, so that the shard sizes
+            # differ by at most one sample
+            shard = perm[(torch.arange(size) + start) % self.num_replicas == self.rank]
+            indices.append(shard)
+            # the j-th sample of a task shard of size n is placed at (j + u) / n
+            keys.append(
+                (torch.arange(len(shard), dtype=torch.float64) + offsets[task_id])
+                / max(len(shard), 1)
+            )
+            start += size
+        indices = torch.cat(indices)
+        indices = indices[torch.argsort(torch.cat(keys), stable=True)]
+        padding = self.num_samples - len(indices)
+        return torch.cat([indices, indices[:padding]])
+
+    def __iter__(self):
+        indices = self.get_indices()
+        start_index, self.start_index = self.start_index, 0
+        return iter(indices[start_index:].tolist())
+
+    def __len__(self):
+        return self.num_samples
@@ -0,0 +1,136 @@
+"""
+Distributed data-parallel training.
+
+Runs launched with torchrun (WORLD_SIZE > 1) train one process per device. The
+processes start from the same policy weights, read disjoint shards of the data
+(see DistributedTaskBalancedSampler) and average their gradients with
+``all_reduce_gradients`` after every backward pass, so the algorithms keep
+calling ``self.policy.compute_loss`` directly rather than going through a
+DistributedDataParallel wrapper. Checkpoints, snapshots and evaluations are
+only done by the main process.
+
+    torchrun --nproc_per_node 4 libero/lifelong/main.py lifelong=multitask ...
+"""
+import datetime
+import os
+
+import torch
+import torch.distributed as dist
+from torch._utils import _flatten_dense_tensors, _unflatten_dense_tensors
+
+
+def is_distributed():
+    return dist.is_available() and dist.is_initialized()
+
+
+def get_rank():
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size():
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main_process():
+    return get_rank() == 0
+
+
+def init_distributed(cfg):
+    """
+    Join the process group if the run was launched with torchrun, and use the
+    device of the local rank. Configured by train.distributed.
+
+    Returns:
+        bool: whether the run is distributed
+    """
+    if int(os.environ.get("WORLD_SIZE", "1")) <= 1:
+        return False
+    distributed_cfg = cfg.train.get("distributed", None) or {}
+    backend = distributed_cfg.get("backend", None)
+    if backend is None:
+        backend = "nccl" if torch.cuda.is_available() else "gloo"
+    # the other processes wait in the gradient all-reduce while the main
+    # process evaluates, so the timeout has to cover an evaluation
+    timeout = datetime.timedelta(minutes=distributed_cfg.get("timeout_min", 60))
+    if backend == "nccl":
+        local_rank = int(os.environ.get("LOCAL_RANK", "0"))
+        torch.cuda.set_device(local_rank)
+        cfg.device = f"cuda:{local_rank}"
+    dist.init_process_group(backend=backend, timeout=timeout)
+    if is_main_process():
+        print(
+            f"[info] distributed training with {get_world_size()} processes, "
+            + f"backend {backend}"
+        )
+    return True
+
+
+def cleanup_distributed():
+    if is_distributed():
+        dist.destroy_process_group()
+
+
+def barrier():
+    if is_distributed():
+        dist.barrier()
+
+
+def broadcast_object(obj, src=0):
+    """Return the obj of the src process in every process."""
+    if not is_distributed():
+        return obj
+    objects = [obj]
+    dist.broadcast_object_list(objects, src=src)
+    return objects[0]
+
+
+def broadcast_module(module, src=0):
+    """Copy the parameters and buffers of the module of the src process to every process."""
+    if not is_distributed():
+        return
+    with torch.no_grad():
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            dist.broadcast(tensor.data, src=src)
+
+
+def all_reduce_mean(value):
+    """Average a python number over the processes."""
+    if not is_distributed():
+        return value
+    tensor = torch.tensor(
+        [float(value)],
+        dtype=torch.float64,
+        device="cuda" if dist.get_backend() == "nccl" else "cpu",
+    )
+    dist.all_reduce(tensor)
+    return tensor.item() / get_world_size()
+
+
+def all_reduce_gradients(parameters):
+    """
+    Average the gradients of the parameters over the processes, with a single
+    all-reduce of the flattened gradients. Missing gradients count as zeros, so
+    that every process reduces the same tensors, and stay None if they are
+    missing in every process.
+    """
+    if not is_distributed():
+        return
+    parameters = [p for p in parameters if p.requires_grad]
+    if len(parameters) == 0:
+        return
+    has_grad = torch.tensor(
+        [float(p.grad is not None) for p in parameters],
+        dtype=parameters[0].dtype,
+        device=parameters[0].device,
+    )
+    grads = [torch.zeros_like(p) if p.grad is None else p.grad for p in parameters]
+    flat_grads = _flatten_dense_tensors(grads + [has_grad])
+    dist.all_reduce(flat_grads)
+    flat_grads /= get_world_size()
+    synced_grads = _unflatten_dense_tensors(flat_grads, grads + [has_grad])
+    has_grad = synced_grads[-1].tolist()
+    for p, synced, synced_has_grad in zip(parameters, synced_grads[:-1], has_grad):
+        if p.grad is not None:
+            p.grad.copy_(synced)
+        elif synced_has_grad > 0:
+            p.grad = synced.clone()
@@ -21,14 +21,16 @@ from pathlib import Path
 
 from libero.libero import get_libero_path
 from libero.libero.benchmark import get_benchmark
-from libero.libero.envs import OffScreenRenderEnv, SubprocVectorEnv
+from libero.libero.envs import MultiTierRenderEnv, SubprocVectorEnv
+from libero.libero.envs.bddl_utils import parse_problem
+from libero.libero.utils.init_state_utils import load_init_states
 from libero.libero.utils.time_utils import Timer
 from libero.libero.utils.video_utils import VideoWriter
 from libero.lifelong.algos import *
-from libero.lifelong.datasets import get_dataset, SequenceVLDataset, GroupedTaskDataset
 from libero.lifelong.metric import (
     evaluate_loss,
     evaluate_success,
+    get_required_obs_keys,
     raw_obs_to_tensor_obs,
 )
 from libero.lifelong.utils import (
@@ -36,7 +38,6 @@ from libero.lifelong.utils import (
     safe_device,
     torch_load_model,
     NpEncoder,
-    compute_flops,
 )
 
 from libero.lifelong.main import get_task_embs
@@ -98,6 +99,7 @@ def parse_args():
     parser.add_argument("--load_task", type=int)
     parser.add_argument("--device_id", type=int)
     parser.add_argument("--save-videos", action="store_true")
+    parser.add_argument("--video-size", type=int, default=512)
     # parser.add_argument('--save_dir',  type=str, required=True)
     args = parser.parse_args()
     args.device_id = "cuda:" + str(args.device_id)
@@ -191,24 +193,8 @@ def main():
 
     ### ======================= start evaluation ============================
 
-    # 1. evaluate dataset loss
-    try:
-        dataset, shape_meta = get_dataset(
-            dataset_path=os.path.join(
-                cfg.folder, benchmark.get_task_demonstration(args.task_id)
-            ),
-            obs_modality=cfg.data.obs.modality,
-            initialize_obs_utils=True,
-            seq_len=cfg.data.seq_len,
-        )
-        dataset = GroupedTaskDataset(
-            [dataset], task_embs[args.task_id : args.task_id + 1]
-        )
-    except:
-        print(
-            f"[error] failed to load task {args.task_id} name {benchmark.get_task_names()[args.task_id]}"
-        )
-        sys.exit(0)
+    # 1. only the observation specs are needed for rollouts, not the demonstrations
+    ObsUtils.initialize_obs_utils_with_obs_specs({"obs": cfg.data.obs.modality})
 
     algo.eval()
 
@@ -231,27 +217,36 @@ def main():
         f"{args.benchmark}_{args.algo}_{args.policy}_{args.seed}_load{args.load_task}_on{args.task_id}_videos",
     )
 
-    with Timer() as t, VideoWriter(video_folder, args.save_videos) as video_writer:
+    with Timer() as t, VideoWriter(
+        video_folder, args.save_videos, streaming=True
+    ) as video_writer:
         env_args = {
             "bddl_file_name": os.path.join(
                 cfg.bddl_folder, task.problem_folder, task.bddl_file
             ),
+            # parsed once here and shipped to the env workers
+            "parsed_problem": parse_problem(
+                os.path.join(cfg.bddl_folder, task.problem_folder, task.bddl_file)
+            ),
             "camera_heights": cfg.data.img_h,
             "camera_widths": cfg.data.img_w,
+            "obs_keys": get_required_obs_keys(cfg),
+            # the videos are rendered from the agentview camera on demand
+            "video_heights": args.video_size,
+            "video_widths": args.video_size,
         }
 
         env_num = 20
         env = SubprocVectorEnv(
-            [lambda: OffScreenRenderEnv(**env_args) for _ in range(env_num)]
+            [lambda: MultiTierRenderEnv(**env_args) for _ in range(env_num)]
         )
         env.reset()
         env.seed(cfg.seed)
         algo.reset()
 
-        init_states_path = os.path.join(
+        init_states = load_init_states(
             cfg.init_states_folder, task.problem_folder, task.init_states_file
         )
-        init_states = torch.load(init_states_path)
         indices = np.arange(env_num) % init_states.shape[0]
         init_states_ = init_states[indices]
 
@@ -271,9 +266,10 @@ def main():
                 data = raw_obs_to_tensor_obs(obs, task_emb, cfg)
                 actions = algo.policy.get_action(data)
                 obs, reward, done, info = env.step(actions)
-                video_writer.append_vector_obs(
-                    obs, dones, camera_name="agentview_image"
-                )
+                if args.save_videos:
+                    video_writer.append_vector_obs(
+                        env.render_video_frames(), dones, camera_name="agentview"
+                    )
 
                 # check whether succeed
                 for k in range(env_num):
@@ -22,15 +22,23 @@ from libero.libero.benchmark import get_benchmark
 from libero.lifelong.algos import get_algo_class, get_algo_list
 from libero.lifelong.models import get_policy_list
 from libero.lifelong.datasets import GroupedTaskDataset, SequenceVLDataset, get_dataset
+from libero.lifelong.distributed import (
+    broadcast_object,
+    cleanup_distributed,
+    get_rank,
+    init_distributed,
+    is_main_process,
+)
 from libero.lifelong.metric import evaluate_loss, evaluate_success
+from libero.lifelong.model_cost import load_model_cost
 from libero.lifelong.utils import (
     NpEncoder,
-    compute_flops,
     control_seed,
     safe_device,
     torch_load_model,
     create_experiment_dir,
     get_task_embs,
+    load_training_state,
 )
 
 
@@ -50,8 +58,12 @@ def main(hydra_cfg):
     pp.pprint("Available policies:")
     pp.pprint(get_policy_list())
 
-    # control seed
-    control_seed(cfg.seed)
+    # join the process group when launched with torchrun
+    if init_distributed(cfg):
+        cfg.use_wandb = cfg.use_wandb and is_main_process()
+
+    # control seed, the processes of a distributed run draw different augmentations
+    control_seed(cfg.seed + get_rank())
 
     # prepare lifelong learning
     cfg.folder = cfg.folder or get_libero_path("datasets")
@@ -127,8 +139,12 @@ def main(hydra_cfg):
     print(" # sequences: " + " ".join(f"({x})" for x in n_sequences))
     print("=======================================================================\n")
 
-    # prepare experiment and update the config
-    create_experiment_dir(cfg)
+    # prepare experiment and update the config, the main process picks the run folder
+    if is_main_process():
+        create_experiment_dir(cfg)
+    cfg.experiment_dir, cfg.experiment_name = broadcast_object(
+        (cfg.get("experiment_dir"), cfg.get("experiment_name"))
+    )
     cfg.shape_meta = shape_meta
 
     if cfg.use_wandb:
@@ -137,6 +153,7 @@ def main(hydra_cfg):
 
     result_summary = {
         "L_conf_mat": np.zeros((n_manip_tasks, n_manip_tasks)),  # loss confusion matrix
+        "L_ci_conf_mat": np.zeros((n_manip_tasks, n_manip_tasks)),  # loss 95% CI
         "S_conf_mat": np.zeros((n_manip_tasks, n_manip_tasks)),  # success confusion matrix
         "L_fwd": np.zeros((n_manip_tasks,)),  # loss AUC, how fast the agent learns
         "S_fwd": np.zeros((n_manip_tasks,)),  # success AUC, how fast the agent succeeds
@@ -167,23 +184,44 @@ def main(hydra_cfg):
             sys.exit(0)
 
     print(f"[info] start lifelong learning with algo {cfg.lifelong.algo}")
-    GFLOPs, MParams = compute_flops(algo, datasets[0], cfg)
-    print(f"[info] policy has {GFLOPs:.1f} GFLOPs and {MParams:.1f} MParams\n")
+    # profiling the policy is opt-in, see benchmark_scripts/profile_model_cost.py
+    model_cost = load_model_cost(cfg)
+    if model_cost is not None:
+        print(
+            f"[info] policy has {model_cost['gflops']:.1f} GFLOPs "
+            + f"and {model_cost['mparams']:.1f} MParams\n"
+        )
 
     # save the experiment config file, so we can resume or replay later
-    with open(os.path.join(cfg.experiment_dir, "config.json"), "w") as f:
-        json.dump(cfg, f, cls=NpEncoder, indent=4)
+    if is_main_process():
+        with open(os.path.join(cfg.experiment_dir, "config.json"), "w") as f:
+            json.dump(cfg, f, cls=NpEncoder, indent=4)
+
+    # continue from the last training state snapshot of the run
+    start_task_id = 0
+    if cfg.train.get("resume", False):
+        training_state = load_training_state(cfg.experiment_dir)
+        if training_state is None:
+            print(
+                f"[warning] no training state in {cfg.experiment_dir}, starting from scratch"
+            )
+        else:
+            result_summary = training_state["result_summary"]
+            start_task_id = algo.restore_training_state(training_state, datasets)
+            print(f"[info] resuming {cfg.experiment_dir} from task {start_task_id}")
 
     if cfg.lifelong.algo == "Multitask":
 
-        algo.train()
-        s_fwd, l_fwd = algo.learn_all_tasks(datasets, benchmark, result_summary)
-        result_summary["L_fwd"][-1] = l_fwd
-        result_summary["S_fwd"][-1] = s_fwd
+        if start_task_id == 0:
+            algo.train()
+            s_fwd, l_fwd = algo.learn_all_tasks(datasets, benchmark, result_summary)
+            result_summary["L_fwd"][-1] = l_fwd
+            result_summary["S_fwd"][-1] = s_fwd
+            algo.save_training_state(result_summary, task_id=1)
 
         # evalute on all seen tasks at the end if eval.eval is true
-        if cfg.eval.eval:
-            L = evaluate_loss(cfg, algo, benchmark, datasets)
+        if cfg.eval.eval and is_main_process():
+            L, L_ci = evaluate_loss(cfg, algo, benchmark, datasets, return_ci=True)
             S = evaluate_success(
                 cfg=cfg,
                 algo=algo,
@@ -193,6 +231,7 @@ def main(hydra_cfg):
             )
 
             result_summary["L_conf_mat"][-1] = L
+            result_summary["L_ci_conf_mat"][-1] = L_ci
             result_summary["S_conf_mat"][-1] = S
 
             if cfg.use_wandb:
@@ -207,11 +246,12 @@ def main(hydra_cfg):
                 wandb.run.summary.update()
 
             print(("[All task loss ] " + " %4.2f |" * n_tasks) % tuple(L))
+            print(("[All task loss±] " + " %4.2f |" * n_tasks) % tuple(L_ci))
             print(("[All task succ.] " + " %4.2f |" * n_tasks) % tuple(S))
 
             torch.save(result_summary, os.path.join(cfg.experiment_dir, f"result.pt"))
     else:
-        for i in range(n_tasks):
+        for i in range(start_task_id, n_tasks):
             print(f"[info] start training on task {i}")
             algo.train()
 
@@ -224,8 +264,10 @@ def main(hydra_cfg):
             t1 = time.time()
 
             # evalute on all seen tasks at the end of learning each task
-            if cfg.eval.eval:
-                L = evaluate_loss(cfg, algo, benchmark, datasets[: i + 1])
+            if cfg.eval.eval and is_main_process():
+                L, L_ci = evaluate_loss(
+                    cfg, algo, benchmark, datasets[: i + 1], return_ci=True
+                )
                 t2 = time.time()
                 S = evaluate_success(
                     cfg=cfg,
@@ -236,6 +278,7 @@ def main(hydra_cfg):
                 )
                 t3 = time.time()
                 result_summary["L_conf_mat"][i][: i + 1] = L
+                result_summary["L_ci_conf_mat"][i][: i + 1] = L_ci
                 result_summary["S_conf_mat"][i][: i + 1] = S
 
                 if cfg.use_wandb:
@@ -255,14 +298,23 @@ def main(hydra_cfg):
                     + f"eval success time {(t3-t2)/60:.1f}"
                 )
                 print(("[Task %2d loss ] " + " %4.2f |" * (i + 1)) % (i, *L))
+                print(("[Task %2d loss±] " + " %4.2f |" * (i + 1)) % (i, *L_ci))
                 print(("[Task %2d succ.] " + " %4.2f |" * (i + 1)) % (i, *S))
                 torch.save(
                     result_summary, os.path.join(cfg.experiment_dir, f"result.pt")
                 )
 
+            algo.save_training_state(result_summary, task_id=i + 1)
+
+    if algo.async_evaluator is not None:
+        algo.async_evaluator.close()
+    if algo.checkpoint_manager is not None:
+        algo.checkpoint_manager.close()
+
     print("[info] finished learning\n")
     if cfg.use_wandb:
         wandb.finish()
+    cleanup_distributed()
 
 
 if __name__ == "__main__":
@@ -1,5 +1,7 @@
+import collections
 import copy
 import gc
+import json
 import numpy as np
 import os
 import robomimic.utils.obs_utils as ObsUtils
@@ -8,9 +10,23 @@ import time
 import torch
 import torch.multiprocessing as mp
 import torch.nn.functional as F
-from torch.utils.data import DataLoader
 
-from libero.libero.envs import OffScreenRenderEnv, SubprocVectorEnv, DummyVectorEnv
+from libero.libero.envs import (
+    MultiTierRenderEnv,
+    PhysicsOnlyEnv,
+    SubprocVectorEnv,
+    DummyVectorEnv,
+)
+from libero.libero.envs.bddl_utils import parse_problem
+from libero.libero.utils.init_state_utils import load_init_states
+from libero.lifelong.datasets import collate_batch, get_demo_strata
+from libero.libero.utils.profiling_utils import (
+    aggregate_spans,
+    profile_span,
+    save_chrome_trace,
+    start_recording,
+    stop_recording,
+)
 from libero.libero.utils.time_utils import Timer
 from libero.libero.utils.video_utils import VideoWriter
 from libero.lifelong.utils import *
@@ -49,14 +65,89 @@ def raw_obs_to_tensor_obs(obs, task_emb, cfg):
     return data
 
 
+def get_required_obs_keys(cfg):
+    """
+    The environment observation keys consumed by the policy.
+    """
+    obs_keys = []
+    for modality_list in cfg.data.obs.modality.values():
+        obs_keys += [cfg.data.obs_key_mapping[obs_name] for obs_name in modality_list]
+    return obs_keys
+
+
+def create_eval_env(cfg, task, env_num):
+    """
+    Create the vector env used to evaluate a task.
+    """
+    profile = cfg.eval.get("profile", False)
+
+    # initiate evaluation envs
+    env_args = {
+        "bddl_file_name": os.path.join(
+            cfg.bddl_folder, task.problem_folder, task.bddl_file
+        ),
+        # parsed once here and shipped to the env workers
+        "parsed_problem": parse_problem(
+            os.path.join(cfg.bddl_folder, task.problem_folder, task.bddl_file)
+        ),
+        "camera_heights": cfg.data.img_h,
+        "camera_widths": cfg.data.img_w,
+        "obs_keys": get_required_obs_keys(cfg),
+        "profile_steps": profile,
+    }
+
+    # Try to handle the frame buffer issue
+    env_creation = False
+
+    # low-dim policies do not need any rendering, the others render the policy
+    # cameras in one pass and the video frames on demand
+    if cfg.eval.get("physics_only", False):
+        env_class = PhysicsOnlyEnv
+    else:
+        env_class = MultiTierRenderEnv
+        env_args["video_heights"] = cfg.eval.get("video_size", 512)
+        env_args["video_widths"] = cfg.eval.get("video_size", 512)
+
+    count = 0
+    while not env_creation and count < 5:
+        try:
+            if env_num == 1:
+                env = DummyVectorEnv(
+                    [lambda: env_class(**env_args) for _ in range(env_num)]
+                )
+            else:
+                env = SubprocVectorEnv(
+                    [lambda: env_class(**env_args) for _ in range(env_num)]
+                )
+            env_creation = True
+        except:
+            time.sleep(5)
+            count += 1
+    if count >= 5:
+        raise Exception("Failed to create environment")
+    return env
+
+
 def evaluate_one_task_success(
-    cfg, algo, task, task_emb, task_id, sim_states=None, task_str=""
+    cfg,
+    algo,
+    task,
+    task_emb,
+    task_id,
+    sim_states=None,
+    task_str="",
+    env=None,
+    video_folder=None,
 ):
     """
     Evaluate a single task's success rate
-    sim_states: if not None, will keep track of all simulated states during
-                evaluation, mainly for visualization and debugging purpose
-    task_str:   the key to access sim_states dictionary
+    sim_states:   if not None, will keep track of all simulated states during
+                  evaluation, mainly for visualization and debugging purpose
+    task_str:     the key to access sim_states dictionary
+    env:          if not None, an env created by create_eval_env that is reused
+                  and not closed
+    video_folder: if not None, the rollouts are recorded from the video camera
+                  at cfg.eval.video_size and saved there
     """
     with Timer() as t:
         if cfg.lifelong.algo == "PackNet":  # need preprocess weights for PackNet
@@ -66,46 +157,27 @@ def evaluate_one_task_success(
         env_num = min(cfg.eval.num_procs, cfg.eval.n_eval) if cfg.eval.use_mp else 1
         eval_loop_num = (cfg.eval.n_eval + env_num - 1) // env_num
 
-        # initiate evaluation envs
-        env_args = {
-            "bddl_file_name": os.path.join(
-                cfg.bddl_folder, task.problem_folder, task.bddl_file
-            ),
-            "camera_heights": cfg.data.img_h,
-            "camera_widths": cfg.data.img_w,
-        }
-
-        env_num = min(cfg.eval.num_procs, cfg.eval.n_eval) if cfg.eval.use_mp else 1
-        eval_loop_num = (cfg.eval.n_eval + env_num - 1) // env_num
-
-        # Try to handle the frame buffer issue
-        env_creation = False
+        # per-step timing of the evaluation loop, see save_eval_profile
+        profile = cfg.eval.get("profile", False)
 
-        count = 0
-        while not env_creation and count < 5:
-            try:
-                if env_num == 1:
-                    env = DummyVectorEnv(
-                        [lambda: OffScreenRenderEnv(**env_args) for _ in range(env_num)]
-                    )
-                else:
-                    env = SubprocVectorEnv(
-                        [lambda: OffScreenRenderEnv(**env_args) for _ in range(env_num)]
-                    )
-                env_creation = True
-            except:
-                time.sleep(5)
-                count += 1
-        if count >= 5:
-            raise Exception("Failed to create environment")
+        # initiate evaluation envs, unless a persistent env is passed in
+        owns_env = env is None
+        if owns_env:
+            env = create_eval_env(cfg, task, env_num)
 
         ### Evaluation loop
         # get fixed init states to control the experiment randomness
-        init_states_path = os.path.join(
+        init_states = load_init_states(
             cfg.init_states_folder, task.problem_folder, task.init_states_file
         )
-        init_states = torch.load(init_states_path)
         num_success = 0
+        if profile:
+            main_spans = []
+            worker_spans = [[] for _ in range(env_num)]
+            start_recording(main_spans, origin=0.0)
+        video_writer = VideoWriter(
+            video_folder, save_video=video_folder is not None, streaming=True
+        )
         for i in range(eval_loop_num):
             env.reset()
             indices = np.arange(i * env_num, (i + 1) * env_num) % init_states.shape[0]
@@ -130,10 +202,21 @@ def evaluate_one_task_success(
             while steps < cfg.eval.max_steps:
                 steps += 1
 
-                data = raw_obs_to_tensor_obs(obs, task_emb, cfg)
-                actions = algo.policy.get_action(data)
+                with profile_span("obs_conversion"):
+                    data = raw_obs_to_tensor_obs(obs, task_emb, cfg)
+                with profile_span("policy_inference"):
+                    actions = algo.policy.get_action(data)
+                    if profile and torch.cuda.is_available():
+                        # count the queued gpu work in this span
+                        torch.cuda.synchronize()
+
+                with profile_span("vector_env_step"):
+                    obs, reward, done, info = env.step(actions)
 
-                obs, reward, done, info = env.step(actions)
+                if video_writer.save_video:
+                    video_writer.append_vector_obs(
+                        env.render_video_frames(), dones, camera_name="agentview"
+                    )
 
                 # record the sim states for replay purpose
                 if task_str != "":
@@ -153,14 +236,60 @@ def evaluate_one_task_success(
             for k in range(env_num):
                 if i * env_num + k < cfg.eval.n_eval:
                     num_success += int(dones[k])
+            video_writer.reset()
+
+            if profile:
+                for k, spans in enumerate(env.pop_step_spans()):
+                    worker_spans[k] += spans
+
+        if profile:
+            stop_recording(main_spans)
+            if env_num == 1:
+                # the env runs in this process, its spans are already in main_spans
+                worker_spans = []
+            save_eval_profile(cfg, task_id, main_spans, worker_spans)
+        video_writer.save()
 
         success_rate = num_success / cfg.eval.n_eval
-        env.close()
-        gc.collect()
+        if owns_env:
+            env.close()
+            gc.collect()
     print(f"[info] evaluate task {task_id} takes {t.get_elapsed_time():.1f} seconds")
     return success_rate
 
 
+def save_eval_profile(cfg, task_id, main_spans, worker_spans):
+    """
+    Save the per-step timing of one evaluated task as a json summary and a
+    Chrome trace, and print the mean time per step of each stage.
+    """
+    summary = {
+        "main": aggregate_spans([main_spans]),
+        "workers": aggregate_spans(worker_spans),
+    }
+    profile_folder = os.path.join(cfg.get("experiment_dir", "."), "eval_profiles")
+    os.makedirs(profile_folder, exist_ok=True)
+    with open(os.path.join(profile_folder, f"task{task_id}_summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    spans_by_process = {"main": main_spans}
+    for k, spans in enumerate(worker_spans):
+        spans_by_process[f"env worker {k}"] = spans
+    save_chrome_trace(
+        spans_by_process, os.path.join(profile_folder, f"task{task_id}_trace.json")
+    )
+
+    num_steps = max(summary["main"].get("vector_env_step", {}).get("count", 0), 1)
+    for process_name, process_summary in summary.items():
+        for name, entry in process_summary.items():
+            # worker spans are summed over all workers, report the per-worker mean
+            per_step = entry["total"] / num_steps
+            if process_name == "workers":
+                per_step /= max(len(worker_spans), 1)
+            print(
+                f"[info] task {task_id} {process_name} {name}: {per_step * 1000:.2f} ms/step"
+            )
+
+
 def evaluate_success(cfg, algo, benchmark, task_ids, result_summary=None):
     """
     Evaluate the success rate for all task in task_ids.
@@ -172,8 +301,22 @@ def evaluate_success(cfg, algo, benchmark, task_ids, result_summary=None):
         task_emb = benchmark.get_task_emb(i)
         task_str = f"k{task_ids[-1]}_p{i}"
         curr_summary = result_summary[task_str] if result_summary is not None else None
+        # physics only envs have no cameras to record
+        video_folder = (
+            os.path.join(cfg.experiment_dir, "eval_videos", task_str)
+            if cfg.eval.get("save_videos", False)
+            and not cfg.eval.get("physics_only", False)
+            else None
+        )
         success_rate = evaluate_one_task_success(
-            cfg, algo, task_i, task_emb, i, sim_states=curr_summary, task_str=task_str
+            cfg,
+            algo,
+            task_i,
+            task_emb,
+            i,
+            sim_states=curr_summary,
+            task_str=task_str,
+            video_folder=video_folder,
         )
         successes.append(success_rate)
     return np.array(successes)
@@ -193,30 +336,191 @@ def evaluate_multitask_training_success(cfg, algo, benchmark, task_ids):
     return np.array(successes)
 
 
+LOSS_EVAL_SUBSETS_FILE = "loss_eval_subsets.pt"
+
+# (experiment_dir, task_id) -> {"indices", "batches", "nbytes"}, the pre-collated
+# loss eval subsets, least recently used first
+_LOSS_EVAL_CACHE = collections.OrderedDict()
+
+
+def sample_stratified_subset(strata, subset_size, rng):
+    """
+    Sample subset_size indices from the strata (index arrays), proportionally to
+    their sizes. Within a stratum the indices are evenly spaced with a random
+    offset, so that every part of each demonstration is covered.
+    """
+    sizes = np.array([len(stratum) for stratum in strata], dtype=np.float64)
+    subset_size = min(subset_size, int(sizes.sum()))
+    quotas = sizes / sizes.sum() * subset_size
+    counts = np.floor(quotas).astype(np.int64)
+    # the remaining samples go to the largest fractional parts
+    remainder = subset_size - counts.sum()
+    counts[np.argsort(counts - quotas, kind="stable")[:remainder]] += 1
+    indices = []
+    for stratum, count in zip(strata, counts):
+        if count == 0:
+            continue
+        positions = (np.arange(count) + rng.random()) * len(stratum) / count
+        indices.append(stratum[positions.astype(np.int64)])
+    return np.sort(np.concatenate(indices))
+
+
+def get_loss_eval_subset(cfg, dataset, task_id):
+    """
+    The fixed subset of sequences of a task on which the loss is evaluated. It is
+    sampled once, stratified over demonstrations, and stored in
+    experiment_dir/LOSS_EVAL_SUBSETS_FILE, so that every evaluation of the task,
+    including the ones after resuming, uses the same sequences.
+    """
+    subset_size = cfg.eval.get("loss_subset_size", None)
+    if subset_size is None or subset_size >= len(dataset):
+        return np.arange(len(dataset), dtype=np.int64)
+
+    subsets_path = os.path.join(cfg.experiment_dir, LOSS_EVAL_SUBSETS_FILE)
+    subsets = torch.load(subsets_path) if os.path.exists(subsets_path) else {}
+    subset = subsets.get(task_id)
+    if subset is not None and (
+        subset["dataset_size"] == len(dataset) and subset["subset_size"] == subset_size
+    ):
+        return subset["indices"].numpy()
+    if subset is not None:
+        print(f"[warning] resampling the loss eval subset of task {task_id}")
+
+    rng = np.random.default_rng([cfg.seed, task_id])
+    indices = sample_stratified_subset(get_demo_strata(dataset), subset_size, rng)
+    subsets[task_id] = {
+        "indices": torch.from_numpy(indices),
+        "dataset_size": len(dataset),
+        "subset_size": subset_size,
+    }
+    torch.save(subsets, subsets_path + ".tmp")
+    os.replace(subsets_path + ".tmp", subsets_path)
+    return indices
+
+
+def _compact_batch(data):
+    # rgb observations are stored as uint8, which they are exactly up to the
+    # /255 scaling, to keep the cached subsets 4x smaller
+    for key in data["obs"]:
+        if ObsUtils.key_is_obs_modality(key, "rgb"):
+            data["obs"][key] = (data["obs"][key] * 255).round().to(torch.uint8)
+    return data
+
+
+def _expand_batch(data):
+    for key in data["obs"]:
+        if data["obs"][key].dtype == torch.uint8:
+            data["obs"][key] = data["obs"][key].float() / 255.0
+    return data
+
+
+def _nbytes(data):
+    if isinstance(data, torch.Tensor):
+        return data.numel() * data.element_size()
+    if isinstance(data, dict):
+        return sum(_nbytes(v) for v in data.values())
+    return 0
+
+
+def _collate_subset(dataset, indices, batch_size):
+    for start in range(0, len(indices), batch_size):
+        batch_indices = [int(idx) for idx in indices[start : start + batch_size]]
+        if hasattr(dataset, "__getitems__"):
+            yield dataset.__getitems__(batch_indices)
+        else:
+            yield collate_batch([dataset[idx] for idx in batch_indices])
+
+
+def get_loss_eval_batches(cfg, dataset, task_id):
+    """
+    Return the collated batches of the loss eval subset of a task. With
+    cfg.eval.loss_cache set to "cpu" or "device", they are collated once and kept
+    there for the following evaluations, within a budget of
+    cfg.eval.loss_cache_mb over all tasks. The least recently used subsets are
+    evicted first.
+    """
+    indices = get_loss_eval_subset(cfg, dataset, task_id)
+    batch_size = cfg.eval.get("loss_batch_size", cfg.eval.batch_size)
+    cache_mode = cfg.eval.get("loss_cache", None)
+    if cache_mode is None:
+        return _collate_subset(dataset, indices, batch_size)
+
+    assert cache_mode in ["cpu", "device"], f"[error] unknown loss_cache {cache_mode}"
+    key = (cfg.experiment_dir, task_id)
+    cached = _LOSS_EVAL_CACHE.get(key)
+    if cached is not None and np.array_equal(cached["indices"], indices):
+        _LOSS_EVAL_CACHE.move_to_end(key)
+        return cached["batches"]
+    _LOSS_EVAL_CACHE.pop(key, None)
+
+    if cache_mode == "device":
+        to_cache = lambda x: safe_device(x, device=cfg.device)
+    else:
+        to_cache = lambda x: x.contiguous()
+    batches = [
+        TensorUtils.map_tensor(_compact_batch(data), to_cache)
+        for data in _collate_subset(dataset, indices, batch_size)
+    ]
+    nbytes = sum(_nbytes(data) for data in batches)
+    budget = cfg.eval.get("loss_cache_mb", 1024) * 1e6
+    while len(_LOSS_EVAL_CACHE) > 0 and (
+        sum(entry["nbytes"] for entry in _LOSS_EVAL_CACHE.values()) + nbytes > budget
+    ):
+        _LOSS_EVAL_CACHE.popitem(last=False)
+    if nbytes <= budget:
+        _LOSS_EVAL_CACHE[key] = {
+            "indices": indices,
+            "batches": batches,
+            "nbytes": nbytes,
+        }
+    return batches
+
+
+# Whether the missing bf16 support was reported, only warn once per process
+_LOSS_AUTOCAST_WARNED = []
+
+
 @torch.no_grad()
-def evaluate_loss(cfg, algo, benchmark, datasets):
+def evaluate_loss(cfg, algo, benchmark, datasets, return_ci=False):
     """
-    Evaluate the loss on all datasets.
+    Evaluate the loss on all datasets, on the fixed subset of sequences of each
+    task given by cfg.eval.loss_subset_size (all the sequences when null).
+
+    Returns:
+        np.array: mean loss per dataset, and with return_ci, also the half width
+            of the 95% confidence interval of each mean over the sequences
     """
     algo.eval()
+    use_autocast = cfg.eval.get("loss_autocast", False) and "cuda" in str(cfg.device)
+    # fp16 changes the losses too much to compare them, only autocast with bf16
+    if use_autocast and not torch.cuda.is_bf16_supported():
+        if not _LOSS_AUTOCAST_WARNED:
+            print("[warning] eval.loss_autocast needs bf16 support, evaluating in fp32")
+            _LOSS_AUTOCAST_WARNED.append(True)
+        use_autocast = False
     losses = []
+    cis = []
     for i, dataset in enumerate(datasets):
         if cfg.lifelong.algo == "PackNet":  # need preprocess weights for PackNet
             algo = algo.get_eval_algo(task_id=i)
 
-        dataloader = DataLoader(
-            dataset,
-            batch_size=cfg.eval.batch_size,
-            num_workers=cfg.eval.num_workers,
-            shuffle=False,
-        )
-        test_loss = 0
-        for data in dataloader:
+        sequence_losses = []
+        for data in get_loss_eval_batches(cfg, dataset, i):
             data = TensorUtils.map_tensor(
                 data, lambda x: safe_device(x, device=cfg.device)
             )
-            loss = algo.policy.compute_loss(data)
-            test_loss += loss.item()
-        test_loss /= len(dataloader)
-        losses.append(test_loss)
+            data = _expand_batch(data)
+            with torch.autocast(
+                device_type="cuda", dtype=torch.bfloat16, enabled=use_autocast
+            ):
+                loss = algo.policy.compute_loss(data, reduction="none")
+            loss = loss.float()
+            # one loss per sequence, averaged over the time steps
+            sequence_losses.append(loss.reshape(loss.shape[0], -1).mean(dim=1))
+        sequence_losses = torch.cat(sequence_losses).cpu().numpy()
+        losses.append(sequence_losses.mean())
+        n = len(sequence_losses)
+        cis.append(1.96 * sequence_losses.std(ddof=1) / np.sqrt(n) if n > 1 else 0.0)
+    if return_ci:
+        return np.array(losses), np.array(cis)
     return np.array(losses)
@@ -0,0 +1,288 @@
+"""
+Cost profiling of the policies: FLOPs and parameters, plus the per-module CPU
+latency and memory of a training forward pass and of ``get_action``.
+
+Profiling builds, runs and times a copy of the policy, so it is not part of
+training launches: run benchmark_scripts/profile_model_cost.py instead. The
+results are cached in ``model_cost_folder``, i.e. ``model_cost_cache`` in the
+libero config path (``~/.libero`` unless ``LIBERO_CONFIG_PATH`` is set), keyed
+by the policy class, the policy and data config, the shape meta and the
+profiled batch sizes, so ``main.py`` can report the cost of a model that has
+been profiled before without any work.
+"""
+import copy
+import hashlib
+import json
+import os
+import pickle
+import time
+
+import torch
+
+from libero.libero import libero_config_path
+from libero.lifelong.models import get_policy_class
+from libero.lifelong.utils import NpEncoder
+
+MODEL_COST_VERSION = 1
+model_cost_folder = os.path.join(libero_config_path, "model_cost_cache")
+
+
+def get_default_batch_sizes(cfg):
+    """The training batch size and the number of parallel envs in evaluation."""
+    env_num = min(cfg.eval.num_procs, cfg.eval.n_eval) if cfg.eval.use_mp else 1
+    return cfg.train.batch_size, env_num
+
+
+def get_model_cost_key(cfg, train_batch_size, inference_batch_size):
+    policy_class = get_policy_class(cfg.policy.policy_type)
+    description = json.dumps(
+        {
+            "version": MODEL_COST_VERSION,
+            "policy_class": f"{policy_class.__module__}.{policy_class.__qualname__}",
+            "policy": cfg.policy,
+            "seq_len": cfg.data.seq_len,
+            "obs_modality": cfg.data.obs.modality,
+            "shape_meta": cfg.shape_meta,
+            "train_batch_size": train_batch_size,
+            "inference_batch_size": inference_batch_size,
+        },
+        sort_keys=True,
+        cls=NpEncoder,
+    )
+    return hashlib.sha1(description.encode()).hexdigest()
+
+
+def _get_cache_file(cfg, train_batch_size, inference_batch_size):
+    key = get_model_cost_key(cfg, train_batch_size, inference_batch_size)
+    return os.path.join(model_cost_folder, key + ".pkl")
+
+
+def load_model_cost(cfg, train_batch_size=None, inference_batch_size=None):
+    """Return the cached cost of the policy of cfg, or None if it was not profiled."""
+    default_train_batch_size, default_inference_batch_size = get_default_batch_sizes(
+        cfg
+    )
+    cache_file = _get_cache_file(
+        cfg,
+        train_batch_size or default_train_batch_size,
+        inference_batch_size or default_inference_batch_size,
+    )
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file, "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def _save_model_cost(cache_file, cost):
+    tmp_file = cache_file + f".{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp_file, "wb") as f:
+            pickle.dump(cost, f)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        pass
+
+
+def make_dummy_batch(cfg, batch_size, seq_len=None):
+    """
+    A random training batch with the shapes of cfg.shape_meta, with a time
+    dimension of seq_len, or without a time dimension (get_action inputs) if
+    seq_len is None.
+    """
+    time_shape = (batch_size,) if seq_len is None else (batch_size, seq_len)
+    obs = {}
+    for name, shape in cfg.shape_meta["all_shapes"].items():
+        if name in cfg.data.obs.modality.rgb or name in cfg.data.obs.modality.depth:
+            obs[name] = torch.rand(*time_shape, *shape)
+        else:
+            obs[name] = torch.randn(*time_shape, *shape)
+    return {
+        "obs": obs,
+        "actions": torch.rand(*time_shape, cfg.shape_meta["ac_dim"]) * 2 - 1,
+        "task_emb": torch.randn(
+            batch_size, cfg.policy.language_encoder.network_kwargs.input_size
+        ),
+    }
+
+
+def _copy_batch(data):
+    # preprocess_input replaces the observations of the batch in place
+    return {**data, "obs": dict(data["obs"])}
+
+
+def count_flops(policy, data):
+    """GFLOPs (2 x MACs, as counted by thop) and millions of parameters of a forward pass."""
+    from thop import profile
+
+    model = copy.deepcopy(policy)
+    macs, params = profile(model, inputs=(data,), verbose=False)
+    del model
+    return macs * 2 / 1e9, params / 1e6
+
+
+def _tensor_bytes(x):
+    if isinstance(x, torch.Tensor):
+        return x.numel() * x.element_size()
+    if isinstance(x, (list, tuple)):
+        return sum(_tensor_bytes(v) for v in x)
+    if isinstance(x, dict):
+        return sum(_tensor_bytes(v) for v in x.values())
+    return 0
+
+
+def profile_modules(policy, fn, n_iters=10, n_warmup=2, max_depth=2):
+    """
+    Time fn() and every submodule of the policy down to max_depth, with forward
+    hooks. Module latencies include their children.
+
+    Returns:
+        float: mean latency of fn in ms
+        list: per module {"name", "type", "calls", "latency_ms", "params_mb",
+            "activations_mb"}, latency and activations are per fn() call
+    """
+    stats = {}
+    handles = []
+    start_times = {}
+
+    def pre_hook(name):
+        def hook(module, inputs):
+            start_times.setdefault(name, []).append(time.perf_counter())
+
+        return hook
+
+    def post_hook(name):
+        def hook(module, inputs, output):
+            entry = stats[name]
+            entry["time"] += time.perf_counter() - start_times[name].pop()
+            entry["calls"] += 1
+            entry["activation_bytes"] += _tensor_bytes(output)
+
+        return hook
+
+    for name, module in policy.named_modules():
+        depth = 0 if name == "" else name.count(".") + 1
+        if depth == 0 or depth > max_depth:
+            continue
+        stats[name] = {
+            "type": type(module).__name__,
+            "params_mb": sum(p.numel() * p.element_size() for p in module.parameters())
+            / 1e6,
+            "time": 0.0,
+            "calls": 0,
+            "activation_bytes": 0,
+        }
+        handles.append(module.register_forward_pre_hook(pre_hook(name)))
+        handles.append(module.register_forward_hook(post_hook(name)))
+
+    try:
+        for _ in range(n_warmup):
+            fn()
+        for entry in stats.values():
+            entry.update({"time": 0.0, "calls": 0, "activation_bytes": 0})
+        t0 = time.perf_counter()
+        for _ in range(n_iters):
+            fn()
+        total_ms = (time.perf_counter() - t0) / n_iters * 1000
+    finally:
+        for handle in handles:
+            handle.remove()
+
+    modules = [
+        {
+            "name": name,
+            "type": entry["type"],
+            "calls": entry["calls"] / n_iters,
+            "latency_ms": entry["time"] / n_iters * 1000,
+            "params_mb": entry["params_mb"],
+            "activations_mb": entry["activation_bytes"] / n_iters / 1e6,
+        }
+        for name, entry in stats.items()
+        if entry["calls"] > 0
+    ]
+    return total_ms, modules
+
+
+def profile_model_cost(
+    cfg, train_batch_size, inference_batch_size, n_iters=10, max_depth=2
+):
+    """
+    Profile the policy of cfg, built on CPU with random weights, with random
+    inputs of the training shapes (forward, and forward and backward of
+    compute_loss) and of the get_action shapes.
+    """
+    cfg = copy.deepcopy(cfg)
+    cfg.device = "cpu"
+    policy = get_policy_class(cfg.policy.policy_type)(cfg, cfg.shape_meta)
+    gflops, mparams = count_flops(policy, make_dummy_batch(cfg, 1, cfg.data.seq_len))
+
+    train_data = make_dummy_batch(cfg, train_batch_size, cfg.data.seq_len)
+    policy.train()
+    forward = lambda: policy(policy.preprocess_input(_copy_batch(train_data)))
+    forward_ms, train_modules = profile_modules(
+        policy, forward, n_iters=n_iters, max_depth=max_depth
+    )
+
+    def train_step():
+        policy.zero_grad()
+        loss = policy.compute_loss(_copy_batch(train_data))
+        loss.backward()
+
+    train_step()
+    t0 = time.perf_counter()
+    for _ in range(n_iters):
+        train_step()
+    train_step_ms = (time.perf_counter() - t0) / n_iters * 1000
+
+    # the policies keep a history of latents of up to seq_len steps, which is
+    # filled by the warmup calls
+    inference_data = make_dummy_batch(cfg, inference_batch_size)
+    policy.reset()
+    get_action_ms, inference_modules = profile_modules(
+        policy,
+        lambda: policy.get_action(_copy_batch(inference_data)),
+        n_iters=n_iters,
+        n_warmup=cfg.data.seq_len,
+        max_depth=max_depth,
+    )
+    return {
+        "policy_type": cfg.policy.policy_type,
+        "gflops": gflops,
+        "mparams": mparams,
+        "train": {
+            "batch_size": train_batch_size,
+            "forward_ms": forward_ms,
+            "train_step_ms": train_step_ms,
+            "modules": train_modules,
+        },
+        "inference": {
+            "batch_size": inference_batch_size,
+            "get_action_ms": get_action_ms,
+            "modules": inference_modules,
+        },
+    }
+
+
+def get_model_cost(
+    cfg,
+    train_batch_size=None,
+    inference_batch_size=None,
+    use_cache=True,
+    **kwargs,
+):
+    """Cached version of profile_model_cost, see load_model_cost."""
+    default_train_batch_size, default_inference_batch_size = get_default_batch_sizes(
+        cfg
+    )
+    train_batch_size = train_batch_size or default_train_batch_size
+    inference_batch_size = inference_batch_size or default_inference_batch_size
+    if use_cache:
+        cost = load_model_cost(cfg, train_batch_size, inference_batch_size)
+        if cost is not None:
+            return cost
+    cost = profile_model_cost(cfg, train_batch_size, inference_batch_size, **kwargs)
+    _save_model_cost(_get_cache_file(cfg, train_batch_size, inference_batch_size), cost)
+    return cost
@@ -72,6 +72,9 @@ class BasePolicy(nn.Module, metaclass=PolicyMeta):
         )
         self.img_aug = DataAugGroup((color_aug, translation_aug))
 
+        # language-derived tensors reused by get_action, see get_inference_context
+        self.inference_context = None
+
     def forward(self, data):
         """
         The forward function for training.
@@ -118,8 +121,47 @@ class BasePolicy(nn.Module, metaclass=PolicyMeta):
         loss = self.policy_head.loss_fn(dist, data["actions"], reduction)
         return loss
 
+    def compute_inference_context(self, data):
+        """
+        The tensors of get_action that only depend on data["task_emb"] (B, E),
+        e.g. the language tokens or the FiLM parameters of the image encoders.
+        """
+        return {}
+
+    def get_inference_context(self, data):
+        """
+        The inference context of the task of data. It is computed by the first
+        get_action after reset() or after a task switch, and reused by the
+        other control steps of the episode.
+        """
+        task_emb = data["task_emb"]
+        context = self.inference_context
+        if (
+            context is None
+            or context["task_emb"].shape != task_emb.shape
+            or not torch.equal(context["task_emb"], task_emb)
+        ):
+            context = {"task_emb": task_emb, **self.compute_inference_context(data)}
+            self.inference_context = context
+        return context
+
+    def get_film_params(self, task_emb):
+        """The FiLM parameters of each image encoder, see ResnetEncoder."""
+        return {
+            img_name: self.image_encoders[img_name]["encoder"].get_film_params(
+                task_emb
+            )
+            for img_name in self.image_encoders.keys()
+        }
+
+    def train(self, mode=True):
+        # the context depends on the weights, which change in training
+        if mode:
+            self.inference_context = None
+        return super().train(mode)
+
     def reset(self):
         """
         Clear all "history" of the policy if there exists any.
         """
-        pass
+        self.inference_context = None
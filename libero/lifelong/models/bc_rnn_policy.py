@@ -141,27 +141,46 @@ class BCRNNPolicy(BasePolicy):
         self.eval_h0 = None
         self.eval_c0 = None
 
-    def forward(self, data, train_mode=True):
+    def compute_inference_context(self, data):
+        return {
+            "lang_h": self.language_encoder(data),  # (B, H)
+            "film_params": self.get_film_params(data["task_emb"]),
+        }
+
+    def forward(self, data, train_mode=True, context=None):
+        """
+        context: the inference context of get_action (see
+        BasePolicy.get_inference_context), whose inputs have T = 1
+        """
         # 1. encode image
         encoded = []
         for img_name in self.image_encoders.keys():
             x = data["obs"][img_name]
             B, T, C, H, W = x.shape
-            e = self.image_encoders[img_name]["encoder"](
-                x.reshape(B * T, C, H, W),
-                langs=data["task_emb"]
-                .reshape(B, 1, -1)
-                .repeat(1, T, 1)
-                .reshape(B * T, -1),
-            ).view(B, T, -1)
-            encoded.append(e)
+            if context is None:
+                e = self.image_encoders[img_name]["encoder"](
+                    x.reshape(B * T, C, H, W),
+                    langs=data["task_emb"]
+                    .reshape(B, 1, -1)
+                    .repeat(1, T, 1)
+                    .reshape(B * T, -1),
+                )
+            else:
+                e = self.image_encoders[img_name]["encoder"](
+                    x.reshape(B * T, C, H, W),
+                    film_params=context["film_params"][img_name],
+                )
+            encoded.append(e.view(B, T, -1))
 
         # 2. add joint states, gripper info, etc.
         encoded.append(self.extra_encoder(data["obs"]))  # add (B, T, H_extra)
         encoded = torch.cat(encoded, -1)  # (B, T, H_all)
 
         # 3. language encoding
-        lang_h = self.language_encoder(data)  # (B, H)
+        if context is None:
+            lang_h = self.language_encoder(data)  # (B, H)
+        else:
+            lang_h = context["lang_h"]
         encoded = torch.cat(
             [encoded, lang_h.unsqueeze(1).expand(-1, encoded.shape[1], -1)], dim=-1
         )
@@ -202,10 +221,11 @@ class BCRNNPolicy(BasePolicy):
         self.eval()
         data = self.preprocess_input(data, train_mode=False)
         with torch.no_grad():
-            dist = self.forward(data)
+            dist = self.forward(data, context=self.get_inference_context(data))
         action = dist.sample().detach().cpu()
         return action.view(action.shape[0], -1).numpy()
 
     def reset(self):
+        super().reset()
         self.eval_h0 = None
         self.eval_c0 = None
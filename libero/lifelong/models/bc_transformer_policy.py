@@ -253,13 +253,26 @@ class BCTransformerPolicy(BasePolicy):
         x = x.reshape(*sh)
         return x[:, :, 0]  # (B, T, E)
 
-    def spatial_encode(self, data):
+    def compute_inference_context(self, data):
+        return {
+            "text_encoded": self.language_encoder(data),  # (B, E)
+            "film_params": self.get_film_params(data["task_emb"]),
+        }
+
+    def spatial_encode(self, data, context=None):
+        """
+        context: the inference context of get_action (see
+        BasePolicy.get_inference_context), whose inputs have T = 1
+        """
         # 1. encode extra
         extra = self.extra_encoder(data["obs"])  # (B, T, num_extra, E)
 
         # 2. encode language, treat it as action token
         B, T = extra.shape[:2]
-        text_encoded = self.language_encoder(data)  # (B, E)
+        if context is None:
+            text_encoded = self.language_encoder(data)  # (B, E)
+        else:
+            text_encoded = context["text_encoded"]
         text_encoded = text_encoded.view(B, 1, 1, -1).expand(
             -1, T, -1, -1
         )  # (B, T, 1, E)
@@ -269,14 +282,20 @@ class BCTransformerPolicy(BasePolicy):
         for img_name in self.image_encoders.keys():
             x = data["obs"][img_name]
             B, T, C, H, W = x.shape
-            img_encoded = self.image_encoders[img_name]["encoder"](
-                x.reshape(B * T, C, H, W),
-                langs=data["task_emb"]
-                .reshape(B, 1, -1)
-                .repeat(1, T, 1)
-                .reshape(B * T, -1),
-            ).view(B, T, 1, -1)
-            encoded.append(img_encoded)
+            if context is None:
+                img_encoded = self.image_encoders[img_name]["encoder"](
+                    x.reshape(B * T, C, H, W),
+                    langs=data["task_emb"]
+                    .reshape(B, 1, -1)
+                    .repeat(1, T, 1)
+                    .reshape(B * T, -1),
+                )
+            else:
+                img_encoded = self.image_encoders[img_name]["encoder"](
+                    x.reshape(B * T, C, H, W),
+                    film_params=context["film_params"][img_name],
+                )
+            encoded.append(img_encoded.view(B, T, 1, -1))
         encoded = torch.cat(encoded, -2)  # (B, T, num_modalities, E)
         return encoded
 
@@ -290,7 +309,7 @@ class BCTransformerPolicy(BasePolicy):
         self.eval()
         with torch.no_grad():
             data = self.preprocess_input(data, train_mode=False)
-            x = self.spatial_encode(data)
+            x = self.spatial_encode(data, self.get_inference_context(data))
             self.latent_queue.append(x)
             if len(self.latent_queue) > self.max_seq_len:
                 self.latent_queue.pop(0)
@@ -301,4 +320,5 @@ class BCTransformerPolicy(BasePolicy):
         return action.view(action.shape[0], -1).numpy()
 
     def reset(self):
+        super().reset()
         self.latent_queue = []
@@ -145,7 +145,17 @@ class BCViLTPolicy(BasePolicy):
             x, self.encoders[0].h, self.encoders[1].w
         )
 
-    def spatial_encode(self, data):
+    def compute_inference_context(self, data):
+        return {
+            "text_encoded_spatial": self.language_encoder_spatial(data),  # (B, E)
+            "text_encoded_temporal": self.language_encoder_temporal(data),  # (B, E')
+        }
+
+    def spatial_encode(self, data, context=None):
+        """
+        context: the inference context of get_action (see
+        BasePolicy.get_inference_context)
+        """
         # 1. encode image
         img_encoded = []
         for img_name in self.image_encoders.keys():
@@ -162,7 +172,10 @@ class BCViLTPolicy(BasePolicy):
         B, T = img_encoded.shape[:2]
 
         # 2. encode task_emb
-        text_encoded = self.language_encoder_spatial(data)  # (B, E)
+        if context is None:
+            text_encoded = self.language_encoder_spatial(data)  # (B, E)
+        else:
+            text_encoded = context["text_encoded_spatial"]
         text_encoded = text_encoded.view(B, 1, 1, -1).expand(
             -1, T, -1, -1
         )  # (B, T, 1, E)
@@ -191,7 +204,10 @@ class BCViLTPolicy(BasePolicy):
         extra = self.extra_encoder(data["obs"])  # (B, T, num_extra, E')
 
         # 7. encode language, treat it as action token
-        text_encoded_ = self.language_encoder_temporal(data)  # (B, E')
+        if context is None:
+            text_encoded_ = self.language_encoder_temporal(data)  # (B, E')
+        else:
+            text_encoded_ = context["text_encoded_temporal"]
         text_encoded_ = text_encoded_.view(B, 1, 1, -1).expand(
             -1, T, -1, -1
         )  # (B, T, 1, E')
@@ -219,7 +235,7 @@ class BCViLTPolicy(BasePolicy):
         self.eval()
         with torch.no_grad():
             data = self.preprocess_input(data, train_mode=False)
-            x = self.spatial_encode(data)
+            x = self.spatial_encode(data, self.get_inference_context(data))
             self.latent_queue.append(x)
             if len(self.latent_queue) > self.max_seq_len:
                 self.latent_queue.pop(0)
@@ -230,4 +246,5 @@ class BCViLTPolicy(BasePolicy):
         return action.view(action.shape[0], -1).numpy()
 
     def reset(self):
+        super().reset()
         self.latent_queue = []
@@ -221,40 +221,45 @@ class ResnetEncoder(nn.Module):
         self.projection_layer = SpatialProjection(output_shape[1:], output_size)
         self.output_shape = self.projection_layer(y).shape
 
-    def forward(self, x, langs=None):
-        h = self.resnet18_base(x)
-
-        h = self.block_1(h)
-        if langs is not None and self.language_fusion != "none":  # FiLM layer
-            B, C, H, W = h.shape
-            beta, gamma = torch.split(
-                self.lang_proj1(langs).reshape(B, C * 2, 1, 1), [C, C], 1
-            )
-            h = (1 + gamma) * h + beta
-
-        h = self.block_2(h)
-        if langs is not None and self.language_fusion != "none":  # FiLM layer
-            B, C, H, W = h.shape
+    def get_film_params(self, langs):
+        """
+        The FiLM (beta, gamma) of each block for the language embeddings
+        langs (B, E), or None without language fusion. They only depend on the
+        task, so get_action computes them once per episode.
+        """
+        if self.language_fusion == "none":
+            return None
+        B = langs.shape[0]
+        film_params = []
+        for lang_proj in [
+            self.lang_proj1,
+            self.lang_proj2,
+            self.lang_proj3,
+            self.lang_proj4,
+        ]:
+            C = lang_proj.out_features // 2
             beta, gamma = torch.split(
-                self.lang_proj2(langs).reshape(B, C * 2, 1, 1), [C, C], 1
+                lang_proj(langs).reshape(B, C * 2, 1, 1), [C, C], 1
             )
-            h = (1 + gamma) * h + beta
+            film_params.append((beta, gamma))
+        return film_params
 
-        h = self.block_3(h)
-        if langs is not None and self.language_fusion != "none":  # FiLM layer
-            B, C, H, W = h.shape
-            beta, gamma = torch.split(
-                self.lang_proj3(langs).reshape(B, C * 2, 1, 1), [C, C], 1
-            )
-            h = (1 + gamma) * h + beta
+    def forward(self, x, langs=None, film_params=None):
+        """
+        Either langs or the precomputed film_params (see get_film_params)
+        condition the blocks on the language.
+        """
+        if film_params is None and langs is not None:
+            film_params = self.get_film_params(langs)
 
-        h = self.block_4(h)
-        if langs is not None and self.language_fusion != "none":  # FiLM layer
-            B, C, H, W = h.shape
-            beta, gamma = torch.split(
-                self.lang_proj4(langs).reshape(B, C * 2, 1, 1), [C, C], 1
-            )
-            h = (1 + gamma) * h + beta
+        h = self.resnet18_base(x)
+        for i, block in enumerate(
+            [self.block_1, self.block_2, self.block_3, self.block_4]
+        ):
+            h = block(h)
+            if film_params is not None:  # FiLM layer
+                beta, gamma = film_params[i]
+                h = (1 + gamma) * h + beta
 
         h = self.projection_layer(h)
         return h
@@ -1,18 +1,18 @@
-import copy
 import json
 import os
+import pickle
 import random
 from pathlib import Path
 
 import numpy as np
-import robomimic.utils.tensor_utils as TensorUtils
 import torch
 import torch.nn as nn
 from hydra.utils import to_absolute_path
-from thop import profile
 from torch.utils.data import DataLoader
 from transformers import AutoModel, AutoTokenizer, logging
 
+from libero.lifelong.datasets import collate_batch
+
 
 def control_seed(seed):
     random.seed(seed)
@@ -22,6 +22,24 @@ def control_seed(seed):
     torch.backends.cudnn.deterministic = True
 
 
+def get_rng_state():
+    """The states of every random number generator used in training."""
+    return {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+        "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+    }
+
+
+def set_rng_state(state):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if state["cuda"] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
 def safe_device(x, device="cpu"):
     if device == "cpu":
         return x.cpu()
@@ -44,10 +62,37 @@ class NpEncoder(json.JSONEncoder):
             return super(NpEncoder, self).default(obj)
 
 
+# Checkpoints written by the CheckpointManager reference the run config stored
+# once in this file of the experiment dir, instead of embedding it
+RUN_CONFIG_FILE = "run_config.pkl"
+# Prefix of the PackNet masks stored next to the weights in safetensors files
+PREVIOUS_MASKS_PREFIX = "__previous_masks__."
+
+_RUN_CONFIGS = {}
+
+
+def get_checkpoint_path(model_path, save_format="pth"):
+    """Replace the extension of model_path by the one of the save format."""
+    root, ext = os.path.splitext(model_path)
+    if ext in [".pth", ".safetensors"]:
+        model_path = root
+    return f"{model_path}.{save_format}"
+
+
+def load_run_config(config_path):
+    """Load (once) a run config stored by the CheckpointManager."""
+    config_path = os.path.abspath(config_path)
+    if config_path not in _RUN_CONFIGS:
+        with open(config_path, "rb") as f:
+            _RUN_CONFIGS[config_path] = pickle.load(f)
+    return _RUN_CONFIGS[config_path]
+
+
 def torch_save_model(model, model_path, cfg=None, previous_masks=None):
+    """model is the module or its state dict."""
     torch.save(
         {
-            "state_dict": model.state_dict(),
+            "state_dict": model if isinstance(model, dict) else model.state_dict(),
             "cfg": cfg,
             "previous_masks": previous_masks,
         },
@@ -56,13 +101,62 @@ def torch_save_model(model, model_path, cfg=None, previous_masks=None):
 
 
 def torch_load_model(model_path, map_location=None):
-    model_dict = torch.load(model_path, map_location=map_location)
+    """
+    Load a checkpoint saved by torch_save_model or by the CheckpointManager, in
+    the pth or safetensors format. A .pth path also finds its .safetensors version.
+    """
+    if not os.path.exists(model_path) and os.path.exists(
+        get_checkpoint_path(model_path, "safetensors")
+    ):
+        model_path = get_checkpoint_path(model_path, "safetensors")
     cfg = None
-    if "cfg" in model_dict:
-        cfg = model_dict["cfg"]
-    if "previous_masks" in model_dict:
-        previous_masks = model_dict["previous_masks"]
-    return model_dict["state_dict"], cfg, previous_masks
+    previous_masks = None
+    cfg_file = None
+    if model_path.endswith(".safetensors"):
+        from safetensors import safe_open
+        from safetensors.torch import load_file
+
+        # safetensors files are memory-mapped rather than unpickled
+        device = "cpu" if map_location is None else str(map_location)
+        tensors = load_file(model_path, device=device)
+        with safe_open(model_path, framework="pt") as f:
+            cfg_file = (f.metadata() or {}).get("cfg_file")
+        state_dict = {}
+        for k, v in tensors.items():
+            if k.startswith(PREVIOUS_MASKS_PREFIX):
+                if previous_masks is None:
+                    previous_masks = {}
+                previous_masks[int(k[len(PREVIOUS_MASKS_PREFIX) :])] = v
+            else:
+                state_dict[k] = v
+    else:
+        model_dict = torch.load(model_path, map_location=map_location)
+        state_dict = model_dict["state_dict"]
+        cfg = model_dict.get("cfg")
+        cfg_file = model_dict.get("cfg_file")
+        previous_masks = model_dict.get("previous_masks")
+    if cfg is None and cfg_file is not None:
+        cfg = load_run_config(os.path.join(os.path.dirname(model_path), cfg_file))
+    return state_dict, cfg, previous_masks
+
+
+# Snapshot of everything needed to resume training, in the experiment dir
+TRAINING_STATE_FILE = "training_state.pt"
+
+
+def save_training_state(experiment_dir, state):
+    """Atomically replace the training state snapshot of the experiment."""
+    state_path = os.path.join(experiment_dir, TRAINING_STATE_FILE)
+    torch.save(state, state_path + ".tmp")
+    os.replace(state_path + ".tmp", state_path)
+
+
+def load_training_state(experiment_dir, map_location=None):
+    """The training state snapshot of the experiment, None if there is none."""
+    state_path = os.path.join(experiment_dir, TRAINING_STATE_FILE)
+    if not os.path.exists(state_path):
+        return None
+    return torch.load(state_path, map_location=map_location)
 
 
 def get_train_test_loader(
@@ -80,12 +174,14 @@ def get_train_test_loader(
         batch_size=train_batch_size,
         num_workers=num_workers[0],
         shuffle=True,
+        collate_fn=collate_batch,
     )
     test_dataloader = DataLoader(
         test_dataset,
         batch_size=test_batch_size,
         num_workers=num_workers[1],
         shuffle=False,
+        collate_fn=collate_batch,
     )
     return train_dataloader, test_dataloader
 
@@ -94,18 +190,6 @@ def confidence_interval(p, n):
     return 1.96 * np.sqrt(p * (1 - p) / n)
 
 
-def compute_flops(algo, dataset, cfg):
-    model = copy.deepcopy(algo.policy)
-    tmp_loader = DataLoader(dataset, batch_size=1, num_workers=0, shuffle=True)
-    data = next(iter(tmp_loader))
-    data = TensorUtils.map_tensor(data, lambda x: safe_device(x, device=cfg.device))
-    macs, params = profile(model, inputs=(data,), verbose=False)
-    GFLOPs = macs * 2 / 1e9
-    MParams = params / 1e6
-    del model
-    return GFLOPs, MParams
-
-
 def create_experiment_dir(cfg):
     prefix = "experiments"
     if cfg.pretrain_model_path != "":
@@ -129,6 +213,16 @@ def create_experiment_dir(cfg):
     if not os.path.exists(experiment_dir):
         os.makedirs(experiment_dir)
 
+    resume = cfg.train.get("resume", False)
+    if resume and cfg.train.get("resume_path", ""):
+        # continue the given run
+        cfg.experiment_dir = cfg.train.resume_path.rstrip("/")
+        cfg.experiment_name = "_".join(cfg.experiment_dir.split("/")[2:])
+        assert os.path.isdir(
+            cfg.experiment_dir
+        ), f"[error] cannot find the run to resume at {cfg.experiment_dir}"
+        return True
+
     # look for the most recent run
     experiment_id = 0
     for path in Path(experiment_dir).glob("run_*"):
@@ -140,7 +234,9 @@ def create_experiment_dir(cfg):
                 experiment_id = folder_id
         except BaseException:
             pass
-    experiment_id += 1
+    # when resuming without a path, continue the most recent run
+    if not resume or experiment_id == 0:
+        experiment_id += 1
 
     experiment_dir += f"/run_{experiment_id:03d}"
     cfg.experiment_dir = experiment_dir
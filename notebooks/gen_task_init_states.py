@@ -6,6 +6,10 @@ import os
 from libero.libero import benchmark
 from libero.libero import get_libero_path
 from libero.libero.envs import OffScreenRenderEnv
+from libero.libero.utils.init_state_utils import write_init_state_store
+from libero.libero.utils.init_state_generation_utils import (
+    generate_init_states as generate_task_init_states,
+)
 
 from IPython.display import display
 from PIL import Image
@@ -115,21 +119,12 @@ def register_custom_libero(suite_name):
 def generate_init_states_for_task(task, suite_name, num_init_states=100, num_pruned_states=50):
     # TODO: allow multiiple tasks to be generated
     # task = "LIVING_ROOM_SCENE2_put_orange_juice_in_the_basket"
-    env_args = {
-        "bddl_file_name": os.path.join(get_libero_path("bddl_files"), suite_name,  task + ".bddl"),
-        "camera_heights": 256,
-        "camera_widths": 256
-    }
-
-    env = OffScreenRenderEnv(**env_args)
-
-    init_states = []
-    for i in tqdm(range(num_init_states), desc=f"Task: {task}\n"[:75], position=1, leave=False):
-        obs = env.reset()
-        init_state = env.sim.get_state().flatten()
-        init_states.append(init_state)
-    
-    init_states = np.array(init_states)
+    # Resets run in a process pool without rendering, and states that violate
+    # the initial predicates or are unstable are filtered out
+    init_states = generate_task_init_states(
+        os.path.join(get_libero_path("bddl_files"), suite_name, task + ".bddl"),
+        num_init_states=num_init_states,
+    )
     pruned_states = init_states[:num_pruned_states]
 
     # data = pickle.dumps(init_states)
@@ -160,10 +155,19 @@ def generate_init_states_for_task(task, suite_name, num_init_states=100, num_pru
 
     torch.save(init_states, save_path + ".init")
     torch.save(pruned_states, save_path + ".pruned_init")
+
+    # Also pack the states into the suite-level memory-mapped store
+    write_init_state_store(
+        os.path.dirname(save_dir),
+        suite_name,
+        {task + ".init": init_states, task + ".pruned_init": pruned_states},
+    )
     
 
     print(f"Saved init files in {save_path}")
 
 
 
-register_custom_libero(suite_name)
\ No newline at end of file
+# Worker processes re-import this file, so only run the generation from the main process
+if __name__ == "__main__":
+    register_custom_libero(suite_name)
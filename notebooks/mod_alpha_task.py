@@ -64,7 +64,7 @@ from libero.libero.envs.objects import get_object_dict, get_object_fn
 from libero.libero.envs.predicates import get_predicate_fn_dict, get_predicate_fn
 from libero.libero.utils.bddl_generation_utils import get_xy_region_kwargs_list_from_regions_info
 from libero.libero.utils.mu_utils import register_mu, InitialSceneTemplates
-from libero.libero.utils.task_generation_utils import register_task_info, get_task_info, generate_bddl_from_task_info
+from libero.libero.utils.task_generation_utils import register_task_info, get_task_info, generate_bddl_suite
 
 def generate_task_bddl(init_state: TaskInitState, task_id: int):
     
@@ -148,7 +148,7 @@ def generate_task_bddl(init_state: TaskInitState, task_id: int):
     )
 
     YOUR_BDDL_FILE_PATH = "/home/leisongao/LIBERO/libero/libero/bddl_files/libero_10_diff_obj"
-    bddl_file_names, failures = generate_bddl_from_task_info(folder=YOUR_BDDL_FILE_PATH)
+    bddl_file_names, failures = generate_bddl_suite(folder=YOUR_BDDL_FILE_PATH)
 
     print(bddl_file_names)
 
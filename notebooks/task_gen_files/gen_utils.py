@@ -10,7 +10,7 @@ from libero.libero.envs.objects import get_object_dict, get_object_fn
 from libero.libero.envs.predicates import get_predicate_fn_dict, get_predicate_fn
 from libero.libero.utils.bddl_generation_utils import get_xy_region_kwargs_list_from_regions_info
 from libero.libero.utils.mu_utils import register_mu, InitialSceneTemplates
-from libero.libero.utils.task_generation_utils import register_task_info, get_task_info, generate_bddl_from_task_info
+from libero.libero.utils.task_generation_utils import register_task_info, get_task_info, generate_bddl_suite
 
 
 BDDL_FILE_PATH = "/home/leisongao/LIBERO/libero/libero/bddl_files/"
@@ -194,7 +194,7 @@ def generate_task_bddl(task_init_state: TaskInitState, task_id: int):
     )
 
     folder = os.path.join(BDDL_FILE_PATH, task_init_state.task_suite)
-    bddl_file_names, failures = generate_bddl_from_task_info(folder=folder)
+    bddl_file_names, failures = generate_bddl_suite(folder=folder)
 
     pprint.pprint(bddl_file_names)
 
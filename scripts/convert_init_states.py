@@ -0,0 +1,82 @@
+"""
+Convert the legacy per-task init state files (``.init`` / ``.pruned_init``,
+saved with ``torch.save``) into the suite-level memory-mapped init state store
+used by ``libero.libero.utils.init_state_utils``.
+
+Example usage:
+
+    # convert every suite under the configured init_states folder
+    python scripts/convert_init_states.py
+
+    # convert a single suite
+    python scripts/convert_init_states.py --suites libero_10
+"""
+import argparse
+import os
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from libero.libero import get_libero_path
+from libero.libero.utils.init_state_utils import (
+    load_init_states,
+    write_init_state_store,
+)
+
+
+def convert_suite(init_states_folder, suite_name, extensions):
+    suite_folder = os.path.join(init_states_folder, suite_name)
+    init_states_dict = {}
+    for extension in extensions:
+        for path in sorted(Path(suite_folder).glob(f"*{extension}")):
+            init_states = np.asarray(
+                torch.load(str(path), weights_only=False), dtype=np.float64
+            )
+            init_states_dict[path.name] = init_states.reshape(init_states.shape[0], -1)
+    if len(init_states_dict) == 0:
+        print(f"[warning] no init state files found in {suite_folder}")
+        return
+
+    index = write_init_state_store(init_states_folder, suite_name, init_states_dict)
+
+    # Check the round trip before reporting success
+    for name, init_states in init_states_dict.items():
+        assert np.array_equal(
+            load_init_states(init_states_folder, suite_name, name), init_states
+        ), f"[error] init states of {name} do not match after conversion"
+    print(f"[info] converted {len(index)} init state files of {suite_name}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--init-states-folder", type=str, default=get_libero_path("init_states")
+    )
+    parser.add_argument(
+        "--suites",
+        type=str,
+        nargs="+",
+        default=None,
+        help="suites to convert, defaults to all sub-folders of the init states folder",
+    )
+    parser.add_argument(
+        "--extensions", type=str, nargs="+", default=[".init", ".pruned_init"]
+    )
+    args = parser.parse_args()
+
+    suites = args.suites
+    if suites is None:
+        suites = sorted(
+            [
+                d
+                for d in os.listdir(args.init_states_folder)
+                if os.path.isdir(os.path.join(args.init_states_folder, d))
+            ]
+        )
+    for suite_name in suites:
+        convert_suite(args.init_states_folder, suite_name, args.extensions)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import argparse
+import multiprocessing
 import os
 from pathlib import Path
 import h5py
@@ -10,6 +11,10 @@ import robosuite.macros as macros
 
 import init_path
 import libero.libero.utils.utils as libero_utils
+from libero.libero.utils.dataset_utils import (
+    IMAGE_ENCODINGS,
+    create_encoded_frames_dataset,
+)
 import cv2
 from PIL import Image
 from robosuite.utils import camera_utils
@@ -17,6 +22,240 @@ from robosuite.utils import camera_utils
 from libero.libero.envs import *
 from libero.libero import get_libero_path
 
+# Number of time steps per HDF5 chunk. Training reads short windows of
+# consecutive frames, so chunks are laid out along the time axis.
+CHUNK_STEPS = 32
+
+
+def create_obs_dataset(grp, name, data, compression=None):
+    """Create a dataset chunked along time and optionally compressed."""
+    data = np.asarray(data)
+    if compression is None:
+        return grp.create_dataset(name, data=data)
+    chunks = (min(CHUNK_STEPS, data.shape[0]),) + data.shape[1:]
+    return grp.create_dataset(
+        name,
+        data=data,
+        chunks=chunks,
+        compression=compression,
+        compression_opts=4 if compression == "gzip" else None,
+        shuffle=compression == "gzip",
+    )
+
+
+def make_env(problem_name, env_kwargs):
+    return TASK_MAPPING[problem_name](
+        **env_kwargs,
+    )
+
+
+def replay_demo(env, f, ep, args, cap_index=5, divergence_threshold=0.01):
+    """
+    Replay one demonstration and collect its observations.
+    Returns the collected data and the playback divergence statistics.
+    """
+    # read the model xml, using the metadata stored in the attribute for this episode
+    model_xml = f["data/{}".format(ep)].attrs["model_file"]
+    reset_success = False
+    while not reset_success:
+        try:
+            env.reset()
+            reset_success = True
+        except:
+            continue
+
+    model_xml = libero_utils.postprocess_model_xml(model_xml, {})
+
+    if not args.use_camera_obs:
+        env.viewer.set_camera(0)
+
+    # load the flattened mujoco states
+    states = f["data/{}/states".format(ep)][()]
+    actions = np.array(f["data/{}/actions".format(ep)][()])
+
+    num_actions = actions.shape[0]
+
+    init_idx = 0
+    env.reset_from_xml_string(model_xml)
+    env.sim.reset()
+    env.sim.set_state_from_flattened(states[init_idx])
+    env.sim.forward()
+    model_xml = env.sim.model.get_xml()
+
+    ee_states = []
+    gripper_states = []
+    joint_states = []
+    robot_states = []
+
+    agentview_images = []
+    eye_in_hand_images = []
+
+    agentview_depths = []
+    eye_in_hand_depths = []
+
+    valid_index = []
+    playback_errors = []
+
+    for j, action in enumerate(actions):
+
+        obs, reward, done, info = env.step(action)
+
+        if j < num_actions - 1:
+            # ensure that the actions deterministically lead to the same recorded states
+            state_playback = env.sim.get_state().flatten()
+            playback_errors.append(np.linalg.norm(states[j + 1] - state_playback))
+
+        # Skip recording because the force sensor is not stable in
+        # the beginning
+        if j < cap_index:
+            continue
+
+        valid_index.append(j)
+
+        if not args.no_proprio:
+            if "robot0_gripper_qpos" in obs:
+                gripper_states.append(obs["robot0_gripper_qpos"])
+
+            joint_states.append(obs["robot0_joint_pos"])
+
+            ee_states.append(
+                np.hstack(
+                    (
+                        obs["robot0_eef_pos"],
+                        T.quat2axisangle(obs["robot0_eef_quat"]),
+                    )
+                )
+            )
+
+        robot_states.append(env.get_robot_state_vector(obs))
+
+        if args.use_camera_obs:
+
+            if args.use_depth:
+                agentview_depths.append(obs["agentview_depth"])
+                eye_in_hand_depths.append(obs["robot0_eye_in_hand_depth"])
+
+            agentview_images.append(obs["agentview_image"])
+            eye_in_hand_images.append(obs["robot0_eye_in_hand_image"])
+        else:
+            env.render()
+
+    # end of one trajectory
+    playback_errors = np.array(playback_errors)
+    diverged_steps = np.nonzero(playback_errors > divergence_threshold)[0]
+    divergence = {
+        "max_error": float(playback_errors.max()) if len(playback_errors) else 0.0,
+        "mean_error": float(playback_errors.mean()) if len(playback_errors) else 0.0,
+        "num_diverged_steps": int(len(diverged_steps)),
+        "first_diverged_step": int(diverged_steps[0]) if len(diverged_steps) else -1,
+    }
+
+    states = states[valid_index]
+    actions = actions[valid_index]
+    dones = np.zeros(len(actions)).astype(np.uint8)
+    dones[-1] = 1
+    rewards = np.zeros(len(actions)).astype(np.uint8)
+    rewards[-1] = 1
+    assert len(actions) == len(agentview_images)
+
+    demo_data = {
+        "obs": {
+            "agentview_rgb": agentview_images,
+            "eye_in_hand_rgb": eye_in_hand_images,
+        },
+        "actions": actions,
+        "states": states,
+        "robot_states": np.stack(robot_states, axis=0),
+        "rewards": rewards,
+        "dones": dones,
+        "model_file": model_xml,
+        "init_state": states[init_idx],
+    }
+    if not args.no_proprio:
+        ee_states = np.stack(ee_states, axis=0)
+        demo_data["obs"].update(
+            {
+                "gripper_states": np.stack(gripper_states, axis=0),
+                "joint_states": np.stack(joint_states, axis=0),
+                "ee_states": ee_states,
+                "ee_pos": ee_states[:, :3],
+                "ee_ori": ee_states[:, 3:],
+            }
+        )
+    if args.use_depth:
+        demo_data["obs"]["agentview_depth"] = agentview_depths
+        demo_data["obs"]["eye_in_hand_depth"] = eye_in_hand_depths
+    return demo_data, divergence
+
+
+def write_demo(
+    grp,
+    demo_name,
+    demo_data,
+    divergence,
+    compression=None,
+    image_encoding=None,
+    image_quality=95,
+):
+    ep_data_grp = grp.create_group(demo_name)
+
+    obs_grp = ep_data_grp.create_group("obs")
+    for obs_name, obs_data in demo_data["obs"].items():
+        if image_encoding is not None and obs_name.endswith("_rgb"):
+            # one encoded buffer per frame, decoded by the training datasets
+            create_encoded_frames_dataset(
+                obs_grp,
+                obs_name,
+                np.stack(obs_data, axis=0),
+                encoding=image_encoding,
+                quality=image_quality,
+            )
+            continue
+        create_obs_dataset(
+            obs_grp, obs_name, np.stack(obs_data, axis=0), compression=compression
+        )
+
+    for key in ["actions", "states", "robot_states", "rewards", "dones"]:
+        create_obs_dataset(ep_data_grp, key, demo_data[key], compression=compression)
+    num_samples = len(demo_data["actions"])
+    ep_data_grp.attrs["num_samples"] = num_samples
+    ep_data_grp.attrs["model_file"] = demo_data["model_file"]
+    ep_data_grp.attrs["init_state"] = demo_data["init_state"]
+    for key, value in divergence.items():
+        ep_data_grp.attrs[f"playback_{key}"] = value
+    return num_samples
+
+
+def create_shard(source_path, shard_path, demo_names, args, problem_name, env_kwargs):
+    """
+    Replay a shard of demonstrations in a separate environment and write them
+    into their own hdf5 file. Returns {demo_name: (num_samples, divergence)}.
+    """
+    f = h5py.File(source_path, "r")
+    env = make_env(problem_name, env_kwargs)
+    shard_f = h5py.File(shard_path, "w")
+    grp = shard_f.create_group("data")
+
+    results = {}
+    for (ep, demo_name) in demo_names:
+        demo_data, divergence = replay_demo(env, f, ep, args)
+        num_samples = write_demo(
+            grp,
+            demo_name,
+            demo_data,
+            divergence,
+            compression=args.compression,
+            image_encoding=args.image_encoding,
+            image_quality=args.image_quality,
+        )
+        results[demo_name] = (num_samples, divergence)
+
+    env.close()
+    shard_f.close()
+    f.close()
+    return results
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--demo-file", default="demo.hdf5")
@@ -45,10 +284,41 @@ def main():
         action="store_true",
     )
 
+    parser.add_argument(
+        "--num-workers",
+        type=int,
+        default=1,
+        help="number of processes replaying demonstrations in parallel. Each worker \
+            writes its own shard file, which are linked into the final dataset",
+    )
+
+    parser.add_argument(
+        "--compression",
+        type=str,
+        default=None,
+        choices=["gzip", "lzf"],
+        help="(optional) compress datasets with time-chunked hdf5 filters",
+    )
+
+    parser.add_argument(
+        "--image-encoding",
+        type=str,
+        default=None,
+        choices=list(IMAGE_ENCODINGS.keys()),
+        help="(optional) store rgb observations as one encoded image per frame",
+    )
+
+    parser.add_argument(
+        "--image-quality",
+        type=int,
+        default=95,
+        help="quality of the jpeg and webp image encodings",
+    )
+
     args = parser.parse_args()
 
-    hdf5_path = args.demo_file
-    f = h5py.File(hdf5_path, "r")
+    source_path = args.demo_file
+    f = h5py.File(source_path, "r")
     env_name = f["data"].attrs["env"]
 
     env_args = f["data"].attrs["env_info"]
@@ -65,7 +335,6 @@ def main():
     bddl_file_name = f["data"].attrs["bddl_file_name"]
 
     bddl_file_dir = os.path.dirname(bddl_file_name)
-    replace_bddl_prefix = "/".join(bddl_file_dir.split("bddl_files/")[:-1] + "bddl_files")
 
     hdf5_path = os.path.join(get_libero_path("datasets"), bddl_file_dir.split("bddl_files/")[-1].replace(".bddl", "_demo.hdf5"))
 
@@ -103,10 +372,6 @@ def main():
     grp.attrs["bddl_file_content"] = open(bddl_file_name, "r").read()
     print(grp.attrs["bddl_file_content"])
 
-    env = TASK_MAPPING[problem_name](
-        **env_kwargs,
-    )
-
     env_args = {
         "type": 1,
         "env_name": env_name,
@@ -118,162 +383,70 @@ def main():
     grp.attrs["env_args"] = json.dumps(env_args)
     print(grp.attrs["env_args"])
     total_len = 0
-    demos = demos
-
-    cap_index = 5
-
-    for (i, ep) in enumerate(demos):
-        print("Playing back random episode... (press ESC to quit)")
-
-        # # select an episode randomly
-        # read the model xml, using the metadata stored in the attribute for this episode
-        model_xml = f["data/{}".format(ep)].attrs["model_file"]
-        reset_success = False
-        while not reset_success:
-            try:
-                env.reset()
-                reset_success = True
-            except:
-                continue
-
-        model_xml = libero_utils.postprocess_model_xml(model_xml, {})
-
-        if not args.use_camera_obs:
-            env.viewer.set_camera(0)
-
-        # load the flattened mujoco states
-        states = f["data/{}/states".format(ep)][()]
-        actions = np.array(f["data/{}/actions".format(ep)][()])
-
-        num_actions = actions.shape[0]
-
-        init_idx = 0
-        env.reset_from_xml_string(model_xml)
-        env.sim.reset()
-        env.sim.set_state_from_flattened(states[init_idx])
-        env.sim.forward()
-        model_xml = env.sim.model.get_xml()
-
-        ee_states = []
-        gripper_states = []
-        joint_states = []
-        robot_states = []
-
-        agentview_images = []
-        eye_in_hand_images = []
-
-        agentview_depths = []
-        eye_in_hand_depths = []
-
-        agentview_seg = {0: [], 1: [], 2: [], 3: [], 4: []}
-
-        rewards = []
-        dones = []
-
-        valid_index = []
-
-        for j, action in enumerate(actions):
-
-            obs, reward, done, info = env.step(action)
-
-            if j < num_actions - 1:
-                # ensure that the actions deterministically lead to the same recorded states
-                state_playback = env.sim.get_state().flatten()
-                # assert(np.all(np.equal(states[j + 1], state_playback)))
-                err = np.linalg.norm(states[j + 1] - state_playback)
-
-                if err > 0.01:
-                    print(
-                        f"[warning] playback diverged by {err:.2f} for ep {ep} at step {j}"
-                    )
-
-            # Skip recording because the force sensor is not stable in
-            # the beginning
-            if j < cap_index:
+    demo_names = [(ep, f"demo_{i}") for (i, ep) in enumerate(demos)]
+    divergences = {}
+
+    if args.num_workers <= 1:
+        env = make_env(problem_name, env_kwargs)
+        for (ep, demo_name) in demo_names:
+            demo_data, divergence = replay_demo(env, f, ep, args)
+            total_len += write_demo(
+                grp,
+                demo_name,
+                demo_data,
+                divergence,
+                compression=args.compression,
+                image_encoding=args.image_encoding,
+                image_quality=args.image_quality,
+            )
+            divergences[demo_name] = divergence
+        env.close()
+    else:
+        # Shard demonstrations across workers, each with its own environment,
+        # and link the shard files into the final dataset
+        shard_args = []
+        for worker_id in range(args.num_workers):
+            shard_demo_names = demo_names[worker_id :: args.num_workers]
+            if len(shard_demo_names) == 0:
                 continue
-
-            valid_index.append(j)
-
-            if not args.no_proprio:
-                if "robot0_gripper_qpos" in obs:
-                    gripper_states.append(obs["robot0_gripper_qpos"])
-
-                joint_states.append(obs["robot0_joint_pos"])
-
-                ee_states.append(
-                    np.hstack(
-                        (
-                            obs["robot0_eef_pos"],
-                            T.quat2axisangle(obs["robot0_eef_quat"]),
-                        )
-                    )
+            shard_path = hdf5_path.replace(".hdf5", "") + f"_shard{worker_id}.hdf5"
+            shard_args.append(
+                (
+                    source_path,
+                    shard_path,
+                    shard_demo_names,
+                    args,
+                    problem_name,
+                    env_kwargs,
                 )
-
-            robot_states.append(env.get_robot_state_vector(obs))
-
-            if args.use_camera_obs:
-
-                if args.use_depth:
-                    agentview_depths.append(obs["agentview_depth"])
-                    eye_in_hand_depths.append(obs["robot0_eye_in_hand_depth"])
-
-                agentview_images.append(obs["agentview_image"])
-                eye_in_hand_images.append(obs["robot0_eye_in_hand_image"])
-            else:
-                env.render()
-
-        # end of one trajectory
-        states = states[valid_index]
-        actions = actions[valid_index]
-        dones = np.zeros(len(actions)).astype(np.uint8)
-        dones[-1] = 1
-        rewards = np.zeros(len(actions)).astype(np.uint8)
-        rewards[-1] = 1
-        print(len(actions), len(agentview_images))
-        assert len(actions) == len(agentview_images)
-        print(len(actions))
-
-        ep_data_grp = grp.create_group(f"demo_{i}")
-
-        obs_grp = ep_data_grp.create_group("obs")
-        if not args.no_proprio:
-            obs_grp.create_dataset(
-                "gripper_states", data=np.stack(gripper_states, axis=0)
-            )
-            obs_grp.create_dataset("joint_states", data=np.stack(joint_states, axis=0))
-            obs_grp.create_dataset("ee_states", data=np.stack(ee_states, axis=0))
-            obs_grp.create_dataset("ee_pos", data=np.stack(ee_states, axis=0)[:, :3])
-            obs_grp.create_dataset("ee_ori", data=np.stack(ee_states, axis=0)[:, 3:])
-
-        obs_grp.create_dataset("agentview_rgb", data=np.stack(agentview_images, axis=0))
-        obs_grp.create_dataset(
-            "eye_in_hand_rgb", data=np.stack(eye_in_hand_images, axis=0)
-        )
-        if args.use_depth:
-            obs_grp.create_dataset(
-                "agentview_depth", data=np.stack(agentview_depths, axis=0)
-            )
-            obs_grp.create_dataset(
-                "eye_in_hand_depth", data=np.stack(eye_in_hand_depths, axis=0)
             )
-
-        ep_data_grp.create_dataset("actions", data=actions)
-        ep_data_grp.create_dataset("states", data=states)
-        ep_data_grp.create_dataset("robot_states", data=np.stack(robot_states, axis=0))
-        ep_data_grp.create_dataset("rewards", data=rewards)
-        ep_data_grp.create_dataset("dones", data=dones)
-        ep_data_grp.attrs["num_samples"] = len(agentview_images)
-        ep_data_grp.attrs["model_file"] = model_xml
-        ep_data_grp.attrs["init_state"] = states[init_idx]
-        total_len += len(agentview_images)
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(len(shard_args)) as pool:
+            shard_results = pool.starmap(create_shard, shard_args)
+        for shard_arg, results in zip(shard_args, shard_results):
+            shard_path = shard_arg[1]
+            for demo_name, (num_samples, divergence) in results.items():
+                grp[demo_name] = h5py.ExternalLink(
+                    os.path.relpath(shard_path, os.path.dirname(hdf5_path)),
+                    f"data/{demo_name}",
+                )
+                total_len += num_samples
+                divergences[demo_name] = divergence
 
     grp.attrs["num_demos"] = len(demos)
     grp.attrs["total"] = total_len
-    env.close()
 
     h5py_f.close()
     f.close()
 
+    # Save the playback divergence of every demonstration instead of printing it
+    stats_path = hdf5_path.replace(".hdf5", "") + "_playback_stats.json"
+    with open(stats_path, "w") as stats_f:
+        json.dump(divergences, stats_f, indent=4)
+    num_diverged = sum([d["num_diverged_steps"] > 0 for d in divergences.values()])
+    print(f"{num_diverged} / {len(demos)} demonstrations diverged during playback")
+    print(f"Playback statistics are saved in {stats_path}")
+
     print("The created dataset is saved in the following path: ")
     print(hdf5_path)
 
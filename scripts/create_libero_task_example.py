@@ -8,7 +8,7 @@ from libero.libero.utils.mu_utils import register_mu, InitialSceneTemplates
 from libero.libero.utils.task_generation_utils import (
     register_task_info,
     get_task_info,
-    generate_bddl_from_task_info,
+    generate_bddl_suite,
 )
 
 
@@ -99,7 +99,7 @@ def main():
             ("In", "akita_black_bowl_1", "wooden_cabinet_1_bottom_region"),
         ],
     )
-    bddl_file_names, failures = generate_bddl_from_task_info()
+    bddl_file_names, failures = generate_bddl_suite()
     print(bddl_file_names)
 
 
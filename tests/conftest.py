@@ -0,0 +1,24 @@
+import os
+import tempfile
+
+import yaml
+
+# Importing libero.libero asks for a dataset path when the config file does not
+# exist, point it to a fresh config so that the tests never prompt
+if "LIBERO_CONFIG_PATH" not in os.environ:
+    libero_config_path = tempfile.mkdtemp(prefix="libero_config_")
+    benchmark_root_path = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "libero", "libero"
+    )
+    with open(os.path.join(libero_config_path, "config.yaml"), "w") as f:
+        yaml.dump(
+            {
+                "benchmark_root": benchmark_root_path,
+                "bddl_files": os.path.join(benchmark_root_path, "bddl_files"),
+                "init_states": os.path.join(benchmark_root_path, "init_files"),
+                "datasets": os.path.join(benchmark_root_path, "../datasets"),
+                "assets": os.path.join(benchmark_root_path, "assets"),
+            },
+            f,
+        )
+    os.environ["LIBERO_CONFIG_PATH"] = libero_config_path
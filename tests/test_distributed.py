@@ -0,0 +1,155 @@
+import os
+import socket
+from types import SimpleNamespace
+
+import pytest
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+from torch.utils.data import ConcatDataset, TensorDataset
+
+WORLD_SIZE = 2
+
+
+def _get_free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _run(worker, *args):
+    port = _get_free_port()
+    mp.spawn(worker, args=(port, *args), nprocs=WORLD_SIZE, join=True)
+
+
+def _init_process_group(rank, port):
+    os.environ["MASTER_ADDR"] = "127.0.0.1"
+    os.environ["MASTER_PORT"] = str(port)
+    dist.init_process_group("gloo", rank=rank, world_size=WORLD_SIZE)
+    torch.manual_seed(0)
+
+
+def _all_gather(tensor):
+    tensors = [torch.empty_like(tensor) for _ in range(WORLD_SIZE)]
+    dist.all_gather(tensors, tensor)
+    return tensors
+
+
+class TinyPolicy(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.linear = nn.Linear(4, 2)
+        # never used by compute_loss, so its gradient stays None
+        self.unused = nn.Linear(2, 2)
+
+    def compute_loss(self, data):
+        return ((self.linear(data["obs"]) - data["actions"]) ** 2).mean()
+
+
+def _make_batch(rank):
+    generator = torch.Generator().manual_seed(rank)
+    return {
+        "obs": torch.randn(8, 4, generator=generator),
+        "actions": torch.randn(8, 2, generator=generator),
+    }
+
+
+def _all_reduce_gradients_worker(rank, port):
+    from libero.lifelong.distributed import all_reduce_gradients
+
+    _init_process_group(rank, port)
+    try:
+        policy = TinyPolicy()
+        policy.compute_loss(_make_batch(rank)).backward()
+        all_reduce_gradients(policy.parameters())
+
+        # the gradient of the mean loss over equal batches is the mean gradient
+        expected = TinyPolicy()
+        expected.load_state_dict(policy.state_dict())
+        batches = [_make_batch(r) for r in range(WORLD_SIZE)]
+        expected.compute_loss(
+            {k: torch.cat([b[k] for b in batches]) for k in batches[0]}
+        ).backward()
+        for p, expected_p in zip(
+            policy.linear.parameters(), expected.linear.parameters()
+        ):
+            torch.testing.assert_close(p.grad, expected_p.grad)
+        for p in policy.unused.parameters():
+            assert p.grad is None
+    finally:
+        dist.destroy_process_group()
+
+
+def _observe_worker(rank, port):
+    from libero.lifelong.algos.base import Sequential
+
+    _init_process_group(rank, port)
+    try:
+        # only the attributes used by observe, the policy is the same in
+        # every process because of the seed
+        algo = Sequential.__new__(Sequential)
+        nn.Module.__init__(algo)
+        algo.cfg = SimpleNamespace(device="cpu", train=SimpleNamespace(grad_clip=1.0))
+        algo.loss_scale = 1.0
+        algo.policy = TinyPolicy()
+        algo.optimizer = torch.optim.SGD(algo.policy.parameters(), lr=0.1)
+        before = torch.cat([p.detach().flatten() for p in algo.policy.parameters()])
+
+        algo.observe(_make_batch(rank))
+
+        after = torch.cat([p.detach().flatten() for p in algo.policy.parameters()])
+        assert not torch.equal(before, after)
+        gathered = _all_gather(after)
+        for other in gathered[1:]:
+            assert torch.equal(gathered[0], other)
+    finally:
+        dist.destroy_process_group()
+
+
+def _sampler_worker(rank, port, task_sizes):
+    from libero.lifelong.datasets import DistributedTaskBalancedSampler
+
+    _init_process_group(rank, port)
+    try:
+        dataset = ConcatDataset(
+            [TensorDataset(torch.zeros(size)) for size in task_sizes]
+        )
+        sampler = DistributedTaskBalancedSampler(
+            dataset, num_replicas=dist.get_world_size(), rank=dist.get_rank()
+        )
+        for epoch in range(3):
+            sampler.set_epoch(epoch)
+            shards = [None] * WORLD_SIZE
+            dist.all_gather_object(shards, list(sampler))
+            assert all([len(shard) == len(sampler) for shard in shards])
+            # shards are only padded when the dataset does not split evenly
+            num_padded = WORLD_SIZE * len(sampler) - len(dataset)
+            all_indices = [i for shard in shards for i in shard]
+            assert set(all_indices) == set(range(len(dataset)))
+            if num_padded == 0:
+                assert len(all_indices) == len(dataset)
+            else:
+                assert len(all_indices) - len(set(all_indices)) == num_padded
+    finally:
+        dist.destroy_process_group()
+
+
+pytestmark = pytest.mark.skipif(
+    not dist.is_available(), reason="torch.distributed is not available"
+)
+
+
+def test_all_reduce_gradients_averages():
+    _run(_all_reduce_gradients_worker)
+
+
+def test_observe_keeps_parameters_identical():
+    pytest.importorskip("robomimic")
+    _run(_observe_worker)
+
+
+@pytest.mark.parametrize("task_sizes", [[5, 7, 4], [5, 7, 3]])
+def test_sampler_shards_are_disjoint_and_cover_the_dataset(task_sizes):
+    pytest.importorskip("robomimic")
+    _run(_sampler_worker, task_sizes)
@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("robosuite")
+
+from libero.libero import benchmark, get_libero_path
+
+
+# KITCHEN_SCENE3_turn_on_the_stove_and_put_the_moka_pot_on_it
+TASK_ID = 2
+
+
+@pytest.fixture(scope="module")
+def task_setup():
+    task_suite = benchmark.get_benchmark_dict()["libero_10"]()
+    bddl_file_name = task_suite.get_task_bddl_file_path(TASK_ID)
+    if not os.path.exists(bddl_file_name) or not os.path.isdir(
+        get_libero_path("assets")
+    ):
+        pytest.skip("libero_10 bddl files or assets are not available")
+    return bddl_file_name, task_suite.get_task_init_states(TASK_ID)[0]
+
+
+def test_physics_only_env_matches_offscreen_render_env(task_setup):
+    from libero.libero.envs.env_wrapper import OffScreenRenderEnv, PhysicsOnlyEnv
+
+    bddl_file_name, init_state = task_setup
+    try:
+        envs = [
+            PhysicsOnlyEnv(bddl_file_name=bddl_file_name),
+            OffScreenRenderEnv(
+                bddl_file_name=bddl_file_name, camera_heights=64, camera_widths=64
+            ),
+        ]
+    except ValueError as e:
+        # mujoco reports meshes and textures missing from the assets folder
+        if "resource not found" not in str(e):
+            raise
+        pytest.skip(f"assets are incomplete: {e}")
+    rng = np.random.RandomState(0)
+    actions = rng.uniform(-1.0, 1.0, size=(20, 7))
+    try:
+        for env in envs:
+            env.seed(0)
+            env.reset()
+            env.set_init_state(init_state)
+        np.testing.assert_array_equal(
+            envs[0].get_sim_state(), envs[1].get_sim_state()
+        )
+        for step, action in enumerate(actions):
+            for env in envs:
+                env.step(action)
+            np.testing.assert_array_equal(
+                envs[0].get_sim_state(),
+                envs[1].get_sim_state(),
+                err_msg=f"sim states differ at step {step}",
+            )
+    finally:
+        for env in envs:
+            env.close()
@@ -0,0 +1,54 @@
+import builtins
+import os
+
+import pytest
+import yaml
+
+import libero.libero as libero_module
+from libero.libero import get_libero_path, get_libero_path_config
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    config_file = tmp_path / "config.yaml"
+    with open(config_file, "w") as f:
+        yaml.dump({"datasets": str(tmp_path), "assets": str(tmp_path)}, f)
+    monkeypatch.setattr(libero_module, "config_file", str(config_file))
+    monkeypatch.setitem(libero_module._path_config_cache, "mtime", None)
+    monkeypatch.setitem(libero_module._path_config_cache, "checked", None)
+    monkeypatch.delenv("LIBERO_DATASETS", raising=False)
+    return config_file
+
+
+def _fail(*args, **kwargs):
+    raise AssertionError("unexpected file system access")
+
+
+def test_repeated_lookups_do_no_file_io(config_file, tmp_path, monkeypatch):
+    assert get_libero_path("datasets") == str(tmp_path)
+
+    monkeypatch.setattr(builtins, "open", _fail)
+    monkeypatch.setattr(os, "stat", _fail)
+    for _ in range(100):
+        assert get_libero_path("datasets") == str(tmp_path)
+        assert get_libero_path("assets") == str(tmp_path)
+
+
+def test_config_changes_are_picked_up(config_file, tmp_path, monkeypatch):
+    assert get_libero_path("datasets") == str(tmp_path)
+    with open(config_file, "w") as f:
+        yaml.dump({"datasets": str(tmp_path / "new"), "assets": str(tmp_path)}, f)
+    # make sure that the modification time changes on coarse file systems
+    os.utime(config_file, ns=(0, 0))
+
+    assert get_libero_path_config(reload=True)["datasets"] == str(tmp_path / "new")
+
+    with open(config_file, "w") as f:
+        yaml.dump({"datasets": str(tmp_path), "assets": str(tmp_path)}, f)
+    monkeypatch.setattr(libero_module, "_PATH_CONFIG_CHECK_INTERVAL", 0.0)
+    assert get_libero_path("datasets") == str(tmp_path)
+
+
+def test_env_override(config_file, monkeypatch):
+    monkeypatch.setenv("LIBERO_DATASETS", "/data/libero")
+    assert get_libero_path("datasets") == "/data/libero"